@@ -0,0 +1,59 @@
+"""
+Bearer-token checks for the admin and bulk-data endpoints.
+
+Each of those endpoints has its own token in the environment. They fail
+closed: while the token is not configured the endpoint answers 403 to
+everyone, instead of being open to anyone who finds it.
+
+Endpoints that act on one stored analysis also accept that analysis's own
+key (returned as analysisKey by the endpoint that stored it) in the
+X-Analysis-Key header, so the browser that uploaded a plan can read and
+correct it without holding a server-wide token.
+"""
+import hmac
+
+ANALYSIS_KEY_HEADER = "X-Analysis-Key"
+
+
+def bearer_matches(headers, token, header_name="Authorization"):
+    """True if token is configured and the request carries it as "Bearer <token>"."""
+    if not token:
+        return False
+    supplied = headers.get(header_name) or ""
+    # Constant time, so the token cannot be guessed byte by byte from response times
+    return hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {token}".encode("utf-8"))
+
+
+def check_access(handler, token, name):
+    """
+    Answers 403 (token not configured) or 401 (missing / wrong token) through
+    handler._send_json and returns False; returns True if the request may go on.
+
+    Args:
+        handler (BaseHTTPRequestHandler): The request being answered.
+        token (str | None): The endpoint's configured token.
+        name (str): Environment variable holding it, for the error message.
+    """
+    if not token:
+        handler._send_json({"error": f"Disabled until {name} is configured"}, 403)
+        return False
+    if not bearer_matches(handler.headers, token):
+        handler._send_json({"error": "Unauthorized"}, 401)
+        return False
+    return True
+
+
+def check_analysis_access(handler, record, token, name):
+    """
+    Like check_access, but for one stored analysis: the endpoint's token or
+    the analysis's key in X-Analysis-Key is accepted, so the endpoint is not
+    disabled while the token is unset. Answers 401 otherwise.
+    """
+    supplied = handler.headers.get(ANALYSIS_KEY_HEADER) or ""
+    key = record.get("access_key")
+    if key and hmac.compare_digest(supplied.encode("utf-8"), key.encode("utf-8")):
+        return True
+    if bearer_matches(handler.headers, token):
+        return True
+    handler._send_json({"error": f"Unauthorized; send {ANALYSIS_KEY_HEADER} or the {name} bearer token"}, 401)
+    return False
@@ -0,0 +1,272 @@
+"""
+Columnar export of stored analyses for portfolio analytics.
+
+Two flat tables are produced from the analysis store:
+
+    rooms - one row per room (region, facility, floor, category, area, shape, bbox)
+    walls - one row per wall segment of a room
+
+Records are read one at a time from iter_analyses() and rows are written in
+chunks of CHUNK_ROWS, so memory stays flat however large the store is.
+Parquet and Arrow IPC need pyarrow (in requirements.txt, but imported
+lazily so CSV exports still work without it).
+
+Incremental exports: pass the watermark returned by the previous export as
+updated_after and only analyses saved or edited since then are exported.
+
+    python backend/api/analysisExport.py --out ./export --format parquet --incremental
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from analysisStore import iter_analyses
+from wallRefinement import room_bbox
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+# --- 1. CONFIGURATION ---
+CHUNK_ROWS = 50000
+WATERMARK_FILE = ".watermark"
+
+# (column, type) - types are "string", "int" or "float"
+ROOM_COLUMNS = [
+    ("analysis_id", "string"),
+    ("analysis_version", "int"),
+    ("kind", "string"),
+    ("region", "string"),
+    ("facility", "string"),
+    ("floor", "string"),
+    ("updated_at", "float"),
+    ("room_id", "int"),
+    ("name", "string"),
+    ("type", "string"),
+    ("category", "string"),
+    ("shape_type", "string"),
+    ("area_sq_ft", "float"),
+    ("wall_count", "int"),
+    ("bbox_x", "float"),
+    ("bbox_y", "float"),
+    ("bbox_w", "float"),
+    ("bbox_h", "float"),
+]
+
+WALL_COLUMNS = [
+    ("analysis_id", "string"),
+    ("analysis_version", "int"),
+    ("region", "string"),
+    ("facility", "string"),
+    ("floor", "string"),
+    ("room_id", "int"),
+    ("room_name", "string"),
+    ("sequence_order", "int"),
+    ("length", "float"),
+    ("unit", "string"),
+    ("note", "string"),
+]
+
+TABLES = {"rooms": ROOM_COLUMNS, "walls": WALL_COLUMNS}
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow", "csv": ".csv"}
+
+
+# --- 2. ROWS ---
+def _number(value, cast):
+    try:
+        return cast(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def room_rows(record):
+    """Flattens one stored analysis into room rows."""
+    labels = record.get("labels") or {}
+    rows = []
+    for room in (record.get("result") or {}).get("rooms", []):
+        bbox = room_bbox(room) or (None, None, None, None)
+        rows.append({
+            "analysis_id": record["id"],
+            "analysis_version": record["version"],
+            "kind": record["kind"],
+            "region": labels.get("region"),
+            "facility": labels.get("facility"),
+            "floor": labels.get("floor"),
+            "updated_at": record["updated_at"],
+            "room_id": _number(room.get("id"), int),
+            "name": room.get("name"),
+            "type": room.get("type"),
+            "category": room.get("category"),
+            "shape_type": room.get("shape_type"),
+            "area_sq_ft": _number(room.get("calculated_area"), float),
+            "wall_count": len(room.get("walls") or []),
+            "bbox_x": _number(bbox[0], float),
+            "bbox_y": _number(bbox[1], float),
+            "bbox_w": _number(bbox[2], float),
+            "bbox_h": _number(bbox[3], float),
+        })
+    return rows
+
+
+def wall_rows(record):
+    """Flattens one stored analysis into wall rows."""
+    labels = record.get("labels") or {}
+    rows = []
+    for room in (record.get("result") or {}).get("rooms", []):
+        for wall in room.get("walls") or []:
+            rows.append({
+                "analysis_id": record["id"],
+                "analysis_version": record["version"],
+                "region": labels.get("region"),
+                "facility": labels.get("facility"),
+                "floor": labels.get("floor"),
+                "room_id": _number(room.get("id"), int),
+                "room_name": room.get("name"),
+                "sequence_order": _number(wall.get("sequence_order"), int),
+                "length": _number(wall.get("length"), float),
+                "unit": wall.get("unit"),
+                "note": wall.get("note"),
+            })
+    return rows
+
+
+_ROW_BUILDERS = {"rooms": room_rows, "walls": wall_rows}
+
+
+# --- 3. WRITERS ---
+class _CsvWriter:
+    def __init__(self, path, columns):
+        self._file = open(path, "w", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=[name for name, _ in columns])
+        self._writer.writeheader()
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _ArrowWriter:
+    _TYPES = {"string": "string", "int": "int64", "float": "float64"}
+
+    def __init__(self, path, columns, fmt):
+        self._schema = pa.schema([(name, getattr(pa, self._TYPES[kind])()) for name, kind in columns])
+        if fmt == "parquet":
+            self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pyarrow.ipc.new_file(path, self._schema)
+
+    def write(self, rows):
+        # One chunk becomes one Parquet row group / one Arrow record batch
+        self._writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt == "csv" or pa is not None]
+
+
+def _open_writer(path, columns, fmt):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {list(FORMATS)}")
+    if fmt == "csv":
+        return _CsvWriter(path, columns)
+    if pa is None:
+        raise ValueError(f"Export format '{fmt}' needs pyarrow (pip install pyarrow); use 'csv' instead")
+    return _ArrowWriter(path, columns, fmt)
+
+
+# --- 4. EXPORT ---
+def export_analyses(paths, fmt, updated_after=None, chunk_rows=CHUNK_ROWS):
+    """
+    Streams stored analyses into one file per table, in a single pass over the store.
+
+    Args:
+        paths (dict): Table name ("rooms", "walls") -> output file path.
+        fmt (str): "parquet", "arrow" or "csv".
+        updated_after (float, optional): Watermark of a previous export; only
+            analyses updated after it are exported.
+        chunk_rows (int): Rows buffered per table before they are written.
+
+    Returns:
+        dict: {"analyses": count, "rows": {table: count}, "watermark": float or None}.
+            Pass the watermark as updated_after next time to export only new work.
+    """
+    for table in paths:
+        if table not in TABLES:
+            raise ValueError(f"Unknown table '{table}', expected one of {list(TABLES)}")
+
+    writers = {}
+    try:
+        for table, path in paths.items():
+            writers[table] = _open_writer(path, TABLES[table], fmt)
+
+        buffers = {table: [] for table in paths}
+        counts = {table: 0 for table in paths}
+        analyses = 0
+        watermark = updated_after
+
+        for record in iter_analyses(updated_after=updated_after):
+            analyses += 1
+            watermark = max(watermark or 0.0, record["updated_at"])
+            for table, buffer in buffers.items():
+                buffer.extend(_ROW_BUILDERS[table](record))
+                if len(buffer) >= chunk_rows:
+                    writers[table].write(buffer)
+                    counts[table] += len(buffer)
+                    buffer.clear()
+
+        for table, buffer in buffers.items():
+            if buffer:
+                writers[table].write(buffer)
+                counts[table] += len(buffer)
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    print(f"Exported {analyses} analyses as {fmt}: {counts}")
+    return {"analyses": analyses, "rows": counts, "watermark": watermark}
+
+
+# --- 5. COMMAND LINE ---
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="Output directory")
+    parser.add_argument("--format", default="parquet" if pa is not None else "csv", choices=list(FORMATS))
+    parser.add_argument("--tables", default="rooms,walls", help="Comma separated tables to export")
+    parser.add_argument("--since", type=float, help="Only export analyses updated after this unix timestamp")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"Read --since from <out>/{WATERMARK_FILE} and update it afterwards")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    watermark_path = os.path.join(args.out, WATERMARK_FILE)
+    since = args.since
+    if args.incremental and since is None and os.path.exists(watermark_path):
+        with open(watermark_path) as f:
+            since = json.load(f)["watermark"]
+
+    # Incremental runs write a new file per run rather than appending to the previous one
+    suffix = f"-{since:.0f}" if since is not None else ""
+    paths = {table: os.path.join(args.out, f"{table}{suffix}{FORMATS[args.format]}")
+             for table in args.tables.split(",")}
+    summary = export_analyses(paths, args.format, updated_after=since)
+
+    if args.incremental and summary["watermark"] is not None:
+        with open(watermark_path, "w") as f:
+            json.dump({"watermark": summary["watermark"]}, f)
+    print(json.dumps(dict(summary, files=paths), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+File-backed store of completed analyses.
+
+Each analysis is one JSON document under ANALYSIS_STORE_DIR:
+
+    {
+      "id": "3f2a...",
+      "kind": "categorizeRooms",
+      "version": 1,
+      "access_key": "...",   # returned once as analysisKey; lets that client read and edit it
+      "created_at": 1730000000.0,
+      "updated_at": 1730000000.0,
+      "image": { "sha256": "...", "phash": "...", "width": 2400, "height": 1800 },
+      "labels": { "region": "West", "facility": "North Campus", "floor": "2" },
+      "result": { "rooms": [...], ... }
+    }
+
+A downsampled grayscale copy of the upload is kept next to it as
+<id>.png, so later revisions of the same plan can be diffed against it.
+
+On Vercel only /tmp is writable, so by default the store lives for the life
+of the instance. Point ANALYSIS_STORE_DIR at a mounted volume to keep it.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+import uuid
+
+from PIL import Image
+
+ANALYSIS_STORE_DIR = os.getenv("ANALYSIS_STORE_DIR", "/tmp/ocelot-analyses")
+REFERENCE_IMAGE_MAX_SIDE = 2000
+LABEL_FIELDS = ("region", "facility", "floor")   # optional form fields accepted by the detection endpoints
+MTIME_SLACK = 2.0   # seconds; file mtimes may trail updated_at a little
+
+_lock = threading.Lock()
+_listeners = []
+_last_commit = 0.0   # updated_at of the latest write, so commit timestamps never go backwards
+
+
+class VersionConflict(Exception):
+    """update_analysis() was given an expected version that is no longer current."""
+
+    def __init__(self, analysis_id, version):
+        super().__init__(f"Analysis {analysis_id} is at version {version}")
+        self.version = version
+
+
+def _path(analysis_id):
+    return os.path.join(ANALYSIS_STORE_DIR, f"{analysis_id}.json")
+
+
+def _commit_time():
+    """
+    Timestamp for a write about to happen. Call with _lock held.
+
+    Taken at commit time rather than when the work started: an analysis that
+    commits after another must not carry an older updated_at, or incremental
+    exports that already moved their watermark past it would skip it.
+    """
+    global _last_commit
+    _last_commit = max(time.time(), _last_commit + 1e-6)
+    return _last_commit
+
+
+def _write(record):
+    os.makedirs(ANALYSIS_STORE_DIR, exist_ok=True)
+    tmp_path = _path(record["id"]) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(record, f)
+    # Atomic on POSIX, so readers never see a half written file
+    os.replace(tmp_path, _path(record["id"]))
+
+
+def add_listener(callback):
+    """
+    Registers callback(record, previous) to run after every save or update.
+    previous is None for new analyses.
+    """
+    _listeners.append(callback)
+
+
+def _notify(record, previous):
+    for callback in _listeners:
+        try:
+            callback(record, previous)
+        except Exception as e:
+            print(f"Analysis store listener error: {e}")
+
+
+def save_analysis(kind, result, image_info, labels=None):
+    """
+    Stores a new analysis.
+
+    Args:
+        kind (str): The endpoint that produced it (e.g. "detectRoomsV2").
+        result (dict): The response body sent to the client.
+        image_info (dict): sha256, phash, width and height of the upload.
+        labels (dict, optional): Region / facility / floor labels supplied with the upload.
+
+    Returns:
+        dict: The stored record, including its new "id".
+    """
+    record = {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "version": 1,
+        "access_key": secrets.token_urlsafe(24),
+        "image": image_info,
+        "labels": labels or {},
+        "result": result
+    }
+    with _lock:
+        record["created_at"] = record["updated_at"] = _commit_time()
+        _write(record)
+    _notify(record, None)
+    return record
+
+
+def update_analysis(analysis_id, result, expected_version=None):
+    """
+    Replaces the result of an existing analysis (e.g. after user edits)
+    and bumps its version.
+
+    Args:
+        expected_version (int, optional): The version the edit was based on.
+            Checked under the store lock, so of two concurrent edits of the
+            same version only the first is saved.
+
+    Returns:
+        dict: The updated record, or None if the id is unknown.
+
+    Raises:
+        VersionConflict: The analysis is no longer at expected_version.
+    """
+    with _lock:
+        previous = load_analysis(analysis_id)
+        if previous is None:
+            return None
+        if expected_version is not None and previous["version"] != expected_version:
+            raise VersionConflict(analysis_id, previous["version"])
+        record = dict(previous, result=result, version=previous["version"] + 1, updated_at=_commit_time())
+        _write(record)
+    _notify(record, previous)
+    return record
+
+
+def load_analysis(analysis_id):
+    """Returns the stored record, or None if it does not exist."""
+    # Ids are hex uuids; anything else could escape the store directory
+    if not analysis_id or not all(c in "0123456789abcdef" for c in analysis_id):
+        return None
+    try:
+        with open(_path(analysis_id)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_reference_image(analysis_id, image):
+    """Stores a grayscale copy of the analysed image, at most REFERENCE_IMAGE_MAX_SIDE px."""
+    reference = image.convert("L")
+    reference.thumbnail((REFERENCE_IMAGE_MAX_SIDE, REFERENCE_IMAGE_MAX_SIDE))
+    os.makedirs(ANALYSIS_STORE_DIR, exist_ok=True)
+    tmp_path = os.path.join(ANALYSIS_STORE_DIR, f"{analysis_id}.png.tmp")
+    reference.save(tmp_path, format="PNG")
+    os.replace(tmp_path, os.path.join(ANALYSIS_STORE_DIR, f"{analysis_id}.png"))
+
+
+def load_reference_image(analysis_id):
+    """Returns the stored reference image (PIL, grayscale), or None."""
+    if load_analysis(analysis_id) is None:
+        return None
+    try:
+        with Image.open(os.path.join(ANALYSIS_STORE_DIR, f"{analysis_id}.png")) as image:
+            image.load()
+            return image
+    except FileNotFoundError:
+        return None
+
+
+def iter_analyses(updated_after=None):
+    """
+    Yields stored records one at a time, oldest update first.
+
+    Args:
+        updated_after (float, optional): Only yield records updated strictly
+            after this unix timestamp.
+    """
+    if not os.path.isdir(ANALYSIS_STORE_DIR):
+        return
+
+    entries = []
+    for name in os.listdir(ANALYSIS_STORE_DIR):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(ANALYSIS_STORE_DIR, name)
+        mtime = os.path.getmtime(path)
+        # mtime is only a prefilter; updated_at in the record is authoritative. File
+        # timestamps come from a coarser clock, so allow for them being a little early
+        if updated_after is not None and mtime < updated_after - MTIME_SLACK:
+            continue
+        entries.append((mtime, name[:-len(".json")]))
+
+    for _mtime, analysis_id in sorted(entries):
+        record = load_analysis(analysis_id)
+        if record is None:
+            continue
+        if updated_after is not None and record["updated_at"] <= updated_after:
+            continue
+        yield record
@@ -0,0 +1,130 @@
+"""
+Local prefilter that rejects obvious non-blueprints before any model call.
+
+Floor plans are line drawings: lots of whitespace, little colour, and edges
+that run mostly horizontally or vertically. Photos, selfies and scanned
+invoices fail at least one of those, and blank pages have almost no edges.
+
+classify_upload() only rejects clear cases. Everything else is "ambiguous"
+or "likely_blueprint" and still goes to the model, which checks for a scale
+and room labels. Thresholds can be re-tuned with
+backend/benchmarks/tunePrefilter.py against a labeled corpus.
+"""
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+ANALYSIS_MAX_SIDE = 512
+EDGE_THRESHOLD = 40           # gradient magnitude counted as an edge
+AXIS_TOLERANCE_DEG = 10       # edges within this many degrees of 0/90 count as axis aligned
+WHITE_LEVEL = 225             # grayscale level counted as paper
+HUE_BINS = 16
+
+THRESHOLDS = {
+    # Blank page (or an image with no drawn lines at all)
+    "blank_max_edge_density": 0.002,
+    # Mostly colourful with many hues, whatever the edges do (classic
+    # cyanotype blueprints are a single hue, so they are not affected)
+    "colour_min_saturated_fraction": 0.5,
+    # Photos: colourful with a spread of hues, and no dominant line orientation
+    "photo_min_saturated_fraction": 0.25,
+    "photo_min_hue_entropy": 2.5,
+    "photo_max_orientation_ratio": 0.35,
+    # Dense non-drawings (e.g. text documents, dark photos)
+    "dense_max_whitespace_fraction": 0.3,
+    # Strong positives
+    "likely_min_orientation_ratio": 0.55,
+    "likely_min_whitespace_fraction": 0.4,
+    "likely_max_saturated_fraction": 0.2,
+}
+
+
+# --- 2. FEATURES ---
+def compute_prefilter_features(image):
+    """
+    Line-drawing signals for one image.
+
+    Args:
+        image (PIL.Image.Image): The upload.
+
+    Returns:
+        dict: edge_density, saturated_fraction, hue_entropy,
+        orientation_ratio and whitespace_fraction, each a float.
+    """
+    rgb = image.convert("RGB")
+    rgb.thumbnail((ANALYSIS_MAX_SIDE, ANALYSIS_MAX_SIDE))
+
+    gray = np.asarray(rgb.convert("L"), dtype=np.float32)
+    hsv = np.asarray(rgb.convert("HSV"), dtype=np.float32) / 255.0
+
+    whitespace_fraction = float((gray > WHITE_LEVEL).mean())
+
+    # Colour: share of clearly coloured pixels and how spread out their hues are
+    saturated = (hsv[..., 1] > 0.25) & (hsv[..., 2] > 0.2)
+    saturated_fraction = float(saturated.mean())
+    hue_entropy = 0.0
+    if saturated.any():
+        counts, _ = np.histogram(hsv[..., 0][saturated], bins=HUE_BINS, range=(0.0, 1.0))
+        p = counts[counts > 0] / counts.sum()
+        hue_entropy = float(-(p * np.log2(p)).sum())
+
+    # Edges and their orientation
+    gx = (gray[:, 1:] - gray[:, :-1])[:-1, :]
+    gy = (gray[1:, :] - gray[:-1, :])[:, :-1]
+    strong = np.hypot(gx, gy) > EDGE_THRESHOLD
+    edge_density = float(strong.mean()) if strong.size else 0.0
+
+    orientation_ratio = 0.0
+    if strong.any():
+        angle = np.degrees(np.arctan2(gy[strong], gx[strong])) % 180
+        axis_aligned = (np.minimum(angle, 180 - angle) < AXIS_TOLERANCE_DEG) | (np.abs(angle - 90) < AXIS_TOLERANCE_DEG)
+        orientation_ratio = float(axis_aligned.mean())
+
+    return {
+        "edge_density": round(edge_density, 4),
+        "saturated_fraction": round(saturated_fraction, 4),
+        "hue_entropy": round(hue_entropy, 3),
+        "orientation_ratio": round(orientation_ratio, 4),
+        "whitespace_fraction": round(whitespace_fraction, 4)
+    }
+
+
+# --- 3. DECISION ---
+def classify_features(features, thresholds=THRESHOLDS):
+    """
+    Returns:
+        tuple: (verdict, reason) where verdict is "reject", "ambiguous" or
+        "likely_blueprint".
+    """
+    t = thresholds
+    if features["edge_density"] < t["blank_max_edge_density"]:
+        return "reject", "blank page or no drawn lines"
+
+    if (features["saturated_fraction"] > t["colour_min_saturated_fraction"] and
+            features["hue_entropy"] > t["photo_min_hue_entropy"]):
+        return "reject", "mostly multi-coloured image"
+
+    if features["orientation_ratio"] < t["photo_max_orientation_ratio"]:
+        if (features["saturated_fraction"] > t["photo_min_saturated_fraction"] and
+                features["hue_entropy"] > t["photo_min_hue_entropy"]):
+            return "reject", "looks like a photograph"
+        if features["whitespace_fraction"] < t["dense_max_whitespace_fraction"]:
+            return "reject", "no line-drawing structure"
+
+    if (features["orientation_ratio"] >= t["likely_min_orientation_ratio"] and
+            features["whitespace_fraction"] >= t["likely_min_whitespace_fraction"] and
+            features["saturated_fraction"] <= t["likely_max_saturated_fraction"]):
+        return "likely_blueprint", "line drawing on a light background"
+
+    return "ambiguous", "needs model review"
+
+
+def classify_upload(image):
+    """
+    Runs the prefilter on a decoded upload.
+
+    Returns:
+        dict: {"verdict": ..., "reason": ..., "features": {...}}
+    """
+    features = compute_prefilter_features(image)
+    verdict, reason = classify_features(features)
+    return {"verdict": verdict, "reason": reason, "features": features}
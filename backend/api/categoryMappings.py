@@ -0,0 +1,209 @@
+"""
+Room type -> category mappings learned from user corrections.
+
+Every accepted correction in the editor counts one vote for (type, category).
+A type's leading candidate stays "pending" until it is approved, either by
+hand through the manageCategoryMappings endpoint or automatically once it has
+AUTO_APPROVE_MIN_VOTES votes and AUTO_APPROVE_MIN_SHARE of them. Only
+approved mappings are used when categorizing rooms.
+
+The mappings are one JSON document:
+
+    {
+      "types": {
+        "lounge": {
+          "status": "approved",          # or "pending" / "rejected"
+          "category": "Shared Space",    # set once approved
+          "votes": { "Shared Space": 7, "Common Space": 1 },
+          "updated_at": 1730000000.0
+        }
+      }
+    }
+
+Approved mappings are held in an in-memory dict and reloaded when the file
+changes on disk, so edits made by another instance are picked up without a
+restart.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from analysisStore import ANALYSIS_STORE_DIR
+
+# --- 1. CONFIGURATION ---
+CATEGORY_MAPPINGS_PATH = os.getenv("CATEGORY_MAPPINGS_PATH", os.path.join(ANALYSIS_STORE_DIR, "category-mappings.json"))
+AUTO_APPROVE_MIN_VOTES = int(os.getenv("CATEGORY_AUTO_APPROVE_MIN_VOTES", "0"))   # 0 = approval by hand only
+AUTO_APPROVE_MIN_SHARE = 0.8
+RELOAD_CHECK_INTERVAL = 2.0   # seconds between mtime checks
+
+# Per-room labels the model uses for rooms it cannot type; never learned
+UNLEARNABLE_TYPES = {"unknown", ""}
+
+_lock = threading.Lock()
+_index = {}          # normalized type -> approved category
+_index_version = ""  # content hash of _index, changes only when an approval does
+_loaded_mtime = None
+_checked_at = 0.0
+
+
+def normalize_type(room_type):
+    """'Lounge2 ' -> 'lounge', so numbered rooms share one mapping."""
+    return re.sub(r"\s+", " ", re.sub(r"\d+$", "", str(room_type or "").strip().lower())).strip()
+
+
+# --- 2. PERSISTENCE ---
+def _read():
+    try:
+        with open(CATEGORY_MAPPINGS_PATH) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"types": {}}
+
+
+def _write(document):
+    os.makedirs(os.path.dirname(CATEGORY_MAPPINGS_PATH), exist_ok=True)
+    tmp_path = CATEGORY_MAPPINGS_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, CATEGORY_MAPPINGS_PATH)
+
+
+def _rebuild_index(document):
+    global _index, _index_version
+    _index = {t: e["category"] for t, e in document["types"].items() if e.get("status") == "approved" and e.get("category")}
+    _index_version = hashlib.sha256(json.dumps(_index, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+def _reload_if_changed():
+    """Hot reload: re-reads the file when its mtime changed. Call with _lock held."""
+    global _loaded_mtime, _checked_at
+    now = time.time()
+    if _loaded_mtime is not None and now - _checked_at < RELOAD_CHECK_INTERVAL:
+        return
+    _checked_at = now
+    try:
+        mtime = os.path.getmtime(CATEGORY_MAPPINGS_PATH)
+    except OSError:
+        mtime = 0.0
+    if mtime != _loaded_mtime:
+        try:
+            _rebuild_index(_read())
+            _loaded_mtime = mtime
+        except ValueError as e:
+            # Keep serving the last good index if the file is mid-edit or corrupt
+            print(f"Could not reload category mappings: {e}")
+
+
+def _update(change):
+    """Applies change(document) and saves it, refreshing the index. Returns change's result."""
+    global _loaded_mtime
+    with _lock:
+        document = _read()
+        result = change(document)
+        _write(document)
+        _rebuild_index(document)
+        _loaded_mtime = os.path.getmtime(CATEGORY_MAPPINGS_PATH)
+    return result
+
+
+# --- 3. LOOKUP ---
+def learned_category(room_type):
+    """Approved category for a room type, or None."""
+    with _lock:
+        _reload_if_changed()
+        return _index.get(normalize_type(room_type))
+
+
+def mappings_version():
+    """Identifies the approved mappings in use, e.g. for cache keys of categorized results."""
+    with _lock:
+        _reload_if_changed()
+        return _index_version
+
+
+# --- 4. LEARNING & APPROVAL ---
+def _leader(entry):
+    votes = entry["votes"]
+    category = max(sorted(votes), key=lambda c: votes[c])
+    return category, votes[category], sum(votes.values())
+
+
+def record_corrections(corrections):
+    """
+    Counts accepted user corrections.
+
+    Args:
+        corrections (list): (room_type, category) pairs.
+
+    Returns:
+        list: Types that were auto-approved by these corrections.
+    """
+    corrections = [(normalize_type(t), c) for t, c in corrections if c and normalize_type(t) not in UNLEARNABLE_TYPES]
+    if not corrections:
+        return []
+
+    def change(document):
+        approved = []
+        for room_type, category in corrections:
+            entry = document["types"].setdefault(room_type, {"status": "pending", "category": None, "votes": {}})
+            entry["votes"][category] = entry["votes"].get(category, 0) + 1
+            entry["updated_at"] = time.time()
+            if entry["status"] == "rejected":
+                entry["status"] = "pending"
+            leader, votes, total = _leader(entry)
+            if (AUTO_APPROVE_MIN_VOTES and entry["status"] == "pending" and votes >= AUTO_APPROVE_MIN_VOTES
+                    and votes / total >= AUTO_APPROVE_MIN_SHARE):
+                entry["status"], entry["category"] = "approved", leader
+                approved.append(room_type)
+        return approved
+
+    return _update(change)
+
+
+def set_mapping_status(room_type, status, category=None):
+    """
+    Approves (optionally overriding the category) or rejects a type's mapping.
+
+    Returns:
+        dict: The updated entry, or None if the type has no mapping.
+
+    Raises:
+        ValueError: If approving without a category a type that has no votes
+            to take the category from (e.g. one seeded by hand).
+    """
+    room_type = normalize_type(room_type)
+
+    def change(document):
+        entry = document["types"].get(room_type)
+        if entry is None:
+            if status != "approved" or not category:
+                return None
+            # Approving a type nobody has corrected yet, e.g. seeding from a spreadsheet
+            entry = document["types"].setdefault(room_type, {"votes": {}})
+        if status == "approved" and not category and not entry.get("votes"):
+            raise ValueError(f"Type '{room_type}' has no votes; pass a category to approve it")
+        entry["status"] = status
+        entry["category"] = (category or _leader(entry)[0]) if status == "approved" else None
+        entry["updated_at"] = time.time()
+        return dict(entry, type=room_type)
+
+    return _update(change)
+
+
+def list_mappings(status=None):
+    """All mappings (optionally of one status), with confidence = leading votes / all votes."""
+    with _lock:
+        document = _read()
+    mappings = []
+    for room_type, entry in sorted(document["types"].items()):
+        if status and entry.get("status") != status:
+            continue
+        votes = entry.get("votes") or {}
+        total = sum(votes.values())
+        leader, leader_votes, _total = _leader(entry) if votes else (None, 0, 0)
+        mappings.append(dict(entry, type=room_type, candidate=leader, total_votes=total,
+                             confidence=round(leader_votes / total, 3) if total else None))
+    return mappings
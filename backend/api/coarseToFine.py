@@ -0,0 +1,293 @@
+"""
+Two-stage (coarse-to-fine) room detection.
+
+One call on the whole plan has to find every room and measure every wall,
+which is slow and imprecise on dense plans. Instead:
+
+1. Coarse: a fast model (COARSE_MODEL) returns only a bounding box, name and
+   type per room, plus the plan scale read off the scale bar.
+2. Fine: every room is cropped from the full-resolution upload (with some
+   margin for its walls) and the crops are sent to the caller's model, which
+   returns the exact vertices and wall lengths of each room. Crops are packed
+   into at most REFINE_MAX_CALLS concurrent calls (never more than the model's
+   burst in requestScheduler), so one plan cannot drain the model's rate
+   limit and the stage takes about as long as one batched call. Plans with
+   more rooms than those calls can hold go to the single call instead.
+3. Merge: crop coordinates are shifted back into the plan and combined with
+   the coarse id / name / type, giving rooms in the usual DETECTION_SCHEMA
+   shape. A room whose refined geometry is malformed, missing or disagrees
+   with its box keeps the coarse box as a rect; the rest of its call is still
+   used. Rooms lost to a failed call are counted as "failed" in the summary;
+   the endpoints return such results as incomplete.
+
+The pipeline is opt-in (COARSE_TO_FINE=1) until benchmarks/evaluateModels.py
+shows it beating the single call; without it the detection endpoints use the
+model router. detect_coarse_to_fine() returns None when the pipeline is
+switched off, the coarse stage found nothing or the plan has too many rooms,
+so callers fall back to the single call.
+"""
+import io
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from geminiService import call_gemini_api, build_image_part
+from requestScheduler import AdmissionRejected, DEFAULT_RATE_LIMIT, MODEL_RATE_LIMITS
+from requestDeadline import DeadlineExceeded
+from responseCache import prompt_version
+from responseSchemas import ROOM_BOXES_SCHEMA, ROOM_GEOMETRIES_SCHEMA
+from revisionDiff import transform_room
+from wallRefinement import bbox_iou, room_bbox
+
+# --- 1. CONFIGURATION ---
+COARSE_TO_FINE_ENABLED = os.getenv("COARSE_TO_FINE", "0") == "1"
+COARSE_MODEL = "gemini-2.5-flash"
+REFINE_MAX_CALLS = 2             # per plan, further capped by the refine model's burst
+MAX_ROOMS_PER_REFINE_CALL = 10   # crops in one call; larger plans use the single call
+CROP_MARGIN_FRACTION = 0.15      # of the room's larger side, added on every side of the crop
+CROP_MARGIN_MIN_PX = 24
+MIN_REFINED_IOU = 0.3            # refined geometry must overlap the coarse box at least this much
+REFINE_MIN_SECONDS = 10          # with less of the deadline left, coarse boxes are returned as they are
+
+COARSE_PROMPT = (
+    "Role: You are an architectural image analysis AI.\n"
+    "Task: Locate every distinct room in the provided floor plan image. Do not measure walls.\n\n"
+    "For each room return:\n"
+    "- 'bbox': the axis-aligned bounding box of the room's walls in pixels (x, y, w, h).\n"
+    "- 'name': the label written in the room. Number repeated types (Lounge1, Lounge2, ...); "
+    "unlabelled rooms are Unknown1, Unknown2, ...\n"
+    "- 'type': the normalized room type (e.g., 'Gymnasium' -> 'gym', 'Restroom' -> 'bathroom').\n"
+    "Also return 'feet_per_pixel' from the scale shown in the picture, if there is one.\n\n"
+    "IMPORTANT: (0,0) is the TOP-LEFT corner of the image.\n"
+    "X increases going RIGHT, Y increases going DOWN."
+)
+
+REFINE_PROMPT = (
+    "Role: You are an architectural image analysis AI.\n"
+    "Task: Each image is a crop of a floor plan around ONE room, introduced by its crop number. "
+    "Measure that room only, once per crop, and return it with the crop number.\n\n"
+    "Steps for each crop:\n"
+    "1. Determine if the room is rectangular, circular, or irregular.\n"
+    "2. Extract vertex coordinates (x,y pixel positions of this crop) for each room corner.\n"
+    "3. Calculate wall dimensions between consecutive vertices.\n"
+    "4. Calculate the total area (square footage) of the room.\n\n"
+    "IMPORTANT: (0,0) is the TOP-LEFT corner of the crop.\n"
+    "X increases going RIGHT, Y increases going DOWN.\n\n"
+    "Shape Types:\n"
+    "- 'rect': Use 'coords' with x, y, w, h\n"
+    "- 'circle': Use 'coords' with cx, cy, r\n"
+    "- 'polygon': Use 'points' array of [x, y] coordinates.\n"
+    "- Circular rooms have a single wall whose length is the circumference, with note 'circumference'."
+)
+
+# Results of this pipeline change when any of this does
+COARSE_TO_FINE_VERSION = prompt_version(COARSE_MODEL, COARSE_PROMPT, REFINE_PROMPT, MIN_REFINED_IOU,
+                                        MAX_ROOMS_PER_REFINE_CALL)
+# Part of the detection endpoints' cache keys
+PIPELINE_VERSION = COARSE_TO_FINE_VERSION if COARSE_TO_FINE_ENABLED else "single-call"
+
+
+# --- 2. STAGES ---
+def _coarse_boxes(image, image_part, timeout):
+    messages_payload = [{"role": "user", "content": [{ "type": "text", "text": COARSE_PROMPT }, image_part]}]
+    response = call_gemini_api(
+        model=COARSE_MODEL,
+        messages=messages_payload,
+        response_schema=ROOM_BOXES_SCHEMA,
+        schema_name="room_boxes",
+        timeout=timeout
+    )
+    data = json.loads(response)
+
+    boxes = []
+    for room in data.get("rooms", []):
+        b = room["bbox"]
+        x, y = max(0.0, b["x"]), max(0.0, b["y"])
+        w, h = min(image.width - x, b["w"]), min(image.height - y, b["h"])
+        if w > 1 and h > 1:
+            boxes.append(dict(room, bbox=(x, y, w, h)))
+    return boxes, data.get("feet_per_pixel")
+
+
+def _crop_window(image, bbox):
+    x, y, w, h = bbox
+    margin = max(CROP_MARGIN_MIN_PX, CROP_MARGIN_FRACTION * max(w, h))
+    return (max(0, int(x - margin)), max(0, int(y - margin)),
+            min(image.width, int(x + w + margin) + 1), min(image.height, int(y + h + margin) + 1))
+
+
+def _crop_parts(image, index, box, feet_per_pixel):
+    """Message parts introducing one crop: a note locating the room, then the crop itself."""
+    left, top, right, bottom = _crop_window(image, box["bbox"])
+    x, y, w, h = box["bbox"]
+
+    note = (f"Crop {index}: the room to measure is '{box['name']}' ({box['type']}). It spans roughly "
+            f"x {x - left:.0f}-{x - left + w:.0f}, y {y - top:.0f}-{y - top + h:.0f} of this crop.")
+    # The crop rarely shows the scale bar, so pass on the one read from the full plan
+    if feet_per_pixel:
+        note += f" Use this scale, measured on the full plan: 1 pixel = {feet_per_pixel:.4f} ft."
+
+    buffer = io.BytesIO()
+    image.crop((left, top, right, bottom)).save(buffer, format="PNG")
+    return [{ "type": "text", "text": note }, build_image_part(buffer.getvalue(), "image/png")], (left, top)
+
+
+def _refine_batch(image, model, boxes, feet_per_pixel, timeout):
+    """Exact geometry of each room in plan coordinates; None where the model's answer is unusable."""
+    # REFINE_PROMPT stays a part of its own so it can be served from the prompt cache
+    content = [{ "type": "text", "text": REFINE_PROMPT }]
+    offsets = []
+    for index, box in enumerate(boxes, start=1):
+        parts, offset = _crop_parts(image, index, box, feet_per_pixel)
+        content.extend(parts)
+        offsets.append(offset)
+
+    response = call_gemini_api(
+        model=model,
+        messages=[{"role": "user", "content": content}],
+        response_schema=ROOM_GEOMETRIES_SCHEMA,
+        schema_name="room_geometries",
+        timeout=timeout
+    )
+    by_crop = {room["crop"]: room for room in json.loads(response).get("rooms", [])
+               if isinstance(room, dict) and isinstance(room.get("crop"), int)}
+
+    geometries = []
+    for index, (box, (left, top)) in enumerate(zip(boxes, offsets), start=1):
+        room = by_crop.get(index)
+        if room is None:
+            geometries.append(None)
+            continue
+        room = {k: v for k, v in room.items() if k != "crop"}
+        # One malformed room (e.g. a point without two coordinates) falls back to its box, not the whole call
+        try:
+            geometry = transform_room(room, lambda px, py, left=left, top=top: (px + left, py + top), 1, 1)
+            refined_box = room_bbox(geometry)
+            ok = refined_box is not None and bbox_iou(refined_box, box["bbox"]) >= MIN_REFINED_IOU
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"Discarding refined geometry of crop {index} ('{box['name']}'): {e!r}")
+            ok = False
+        geometries.append(geometry if ok else None)
+    return geometries
+
+
+def _coarse_room(box, feet_per_pixel):
+    """The coarse box as a rect room, for rooms whose refinement failed. Sizes are unknown without a scale."""
+    x, y, w, h = box["bbox"]
+    if feet_per_pixel:
+        walls = [{"sequence_order": i + 1, "length": round(length * feet_per_pixel, 2), "unit": "ft"}
+                 for i, length in enumerate((w, h, w, h))]
+        area = round(w * h * feet_per_pixel * feet_per_pixel, 1)
+    else:
+        walls, area = [], None
+    return {
+        "shape_type": "rect",
+        "coords": {"x": round(x, 1), "y": round(y, 1), "w": round(w, 1), "h": round(h, 1)},
+        "walls": walls,
+        "calculated_area": area
+    }
+
+
+def _batches(boxes, model):
+    """Splits rooms over the refinement calls, or returns None if they do not fit."""
+    burst = MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_LIMIT)["burst"]
+    calls = max(1, min(REFINE_MAX_CALLS, burst, len(boxes)))
+    if len(boxes) > calls * MAX_ROOMS_PER_REFINE_CALL:
+        return None
+    size = -(-len(boxes) // calls)
+    return [boxes[i:i + size] for i in range(0, len(boxes), size)]
+
+
+# --- 3. ENTRY POINT ---
+def detect_coarse_to_fine(image, image_part, model, deadline=None, enabled=None):
+    """
+    Detects rooms with a coarse pass on the whole plan and a fine pass per room.
+
+    Args:
+        image (PIL.Image): The uploaded plan, used for the crops.
+        image_part (dict): Message part for the whole plan (see build_image_part).
+        model (str): Model for the batched refinement calls.
+        deadline (requestDeadline.Deadline, optional): Bounds every call. The
+            fine pass is skipped when less than REFINE_MIN_SECONDS is left.
+        enabled (bool, optional): Overrides COARSE_TO_FINE_ENABLED (the evaluation runs it either way).
+
+    Returns:
+        dict | None: {"rooms": [...], "coarseToFine": timing summary}, or None if
+        the pipeline is disabled, the coarse stage failed or found no rooms, or
+        there are more rooms than the refinement calls hold.
+
+    Raises:
+        AdmissionRejected: If the scheduler turned away the coarse call.
+        DeadlineExceeded: If the deadline ran out before or during the coarse call.
+    """
+    if not (COARSE_TO_FINE_ENABLED if enabled is None else enabled):
+        return None
+    timeout = (lambda stage: deadline.timeout(stage)) if deadline else (lambda stage: None)
+
+    start = time.perf_counter()
+    try:
+        boxes, feet_per_pixel = _coarse_boxes(image, image_part, timeout("coarse room detection"))
+    except (AdmissionRejected, DeadlineExceeded):
+        raise
+    except Exception as e:
+        if deadline and deadline.expired():
+            raise DeadlineExceeded("coarse room detection", deadline)
+        print(f"Coarse room detection failed: {e}")
+        return None
+    coarse_seconds = time.perf_counter() - start
+    if not boxes:
+        return None
+
+    batches = _batches(boxes, model)
+    if batches is None:
+        print(f"Coarse-to-fine: {len(boxes)} rooms is more than the refinement calls hold; using the single call")
+        return None
+
+    def refine(batch):
+        call_start = time.perf_counter()
+        try:
+            geometries = _refine_batch(image, model, batch, feet_per_pixel, timeout("room refinement"))
+            failed = 0
+        except Exception as e:
+            # AdmissionRejected included: one refused call should not discard the whole plan
+            print(f"Refinement of {len(batch)} rooms failed: {e}")
+            geometries, failed = [None] * len(batch), len(batch)
+        return geometries, failed, time.perf_counter() - call_start
+
+    fine_start = time.perf_counter()
+    skip_refinement = deadline is not None and not deadline.allows("per-room refinement", REFINE_MIN_SECONDS)
+    if skip_refinement:
+        results = [([None] * len(batch), 0, 0.0) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=len(batches)) as pool:
+            results = list(pool.map(refine, batches))
+    fine_seconds = time.perf_counter() - fine_start
+    geometries = [geometry for batch_geometries, _failed, _seconds in results for geometry in batch_geometries]
+    failed = sum(batch_failed for _geometries, batch_failed, _seconds in results)
+
+    rooms = []
+    for box, geometry in zip(boxes, geometries):
+        room = {"id": box["id"], "name": box["name"], "type": box["type"]}
+        room.update(geometry or _coarse_room(box, feet_per_pixel))
+        room["refined"] = geometry is not None
+        rooms.append(room)
+
+    refined = sum(1 for geometry in geometries if geometry is not None)
+    if deadline and not skip_refinement and failed and deadline.expired():
+        deadline.skip(f"refinement of {failed} rooms", "deadline reached during refinement")
+    summary = {
+        "coarse_model": COARSE_MODEL,
+        "refine_model": model,
+        "rooms": len(rooms),
+        "refined": refined,
+        "coarse_only": len(rooms) - refined,
+        "failed": failed,
+        "refine_calls": 0 if skip_refinement else len(batches),
+        "feet_per_pixel": feet_per_pixel,
+        "coarse_ms": round(coarse_seconds * 1000),
+        "refine_ms": round(fine_seconds * 1000),
+        "slowest_call_ms": round(max(seconds for _g, _f, seconds in results) * 1000)
+    }
+    print(f"Coarse-to-fine: {summary}")
+    return {"rooms": rooms, "coarseToFine": summary}
@@ -0,0 +1,133 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from accessTokens import check_analysis_access
+from analysisStore import VersionConflict, load_analysis, update_analysis
+from categoryMappings import record_corrections
+from roomCategories import CATEGORIES, summarize_categories
+from requestProfiler import profiled
+
+load_dotenv()
+
+# --- 2. CONFIGURATION ---
+# Server-to-server callers may correct any analysis; browsers use the analysis's own key
+CORRECTIONS_TOKEN = os.getenv("CORRECTIONS_TOKEN")
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    Saves the rooms a user accepted in the editor.
+
+    POST JSON {"analysisId": ..., "rooms": [...], "version": <optional, for conflict checks>}
+
+    The stored analysis is updated (bumping its version), and every room whose
+    category the user changed counts as a correction for its room type in the
+    learned category mappings. Changed categories are marked
+    category_source "user", so reusing this analysis for a re-upload keeps them.
+
+    The review step of the app calls it with the analysis's key in
+    X-Analysis-Key when the user accepts the rooms; other servers may send
+    "Authorization: Bearer <CORRECTIONS_TOKEN>" instead. An edit based on an
+    older version than the stored one answers 409 with the current version.
+    Without "version" the edit is checked against the version it was diffed
+    against.
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- POST REQUEST ---
+    @profiled
+    def do_POST(self):
+        try:
+            # 1. Parse Input
+            content_length = int(self.headers.get('Content-Length', 0))
+            if content_length == 0:
+                self.send_error(400, "No data received")
+                return
+            try:
+                body = json.loads(self.rfile.read(content_length))
+                analysis_id, rooms = body["analysisId"], body["rooms"]
+            except (ValueError, KeyError, TypeError):
+                self._send_json({"error": "Expected JSON with 'analysisId' and 'rooms'"}, 400)
+                return
+            if not isinstance(rooms, list) or not all(isinstance(r, dict) for r in rooms):
+                self._send_json({"error": "'rooms' must be a list of room objects"}, 400)
+                return
+
+            invalid = sorted(set(r.get("category") for r in rooms if r.get("category") and r.get("category") not in CATEGORIES))
+            if invalid:
+                self._send_json({"error": f"Unknown categories {invalid}, expected one of {CATEGORIES}"}, 400)
+                return
+
+            # 2. Load the analysis being edited, and check the caller may edit it
+            record = load_analysis(analysis_id)
+            if record is None:
+                self._send_json({"error": f"Unknown analysis {analysis_id}"}, 404)
+                return
+            if not check_analysis_access(self, record, CORRECTIONS_TOKEN, "CORRECTIONS_TOKEN"):
+                return
+
+            # 3. Collect category corrections
+            previous = {r.get("id"): r for r in record["result"].get("rooms", [])}
+            corrections = []
+            rooms = [dict(room) for room in rooms]
+            for room in rooms:
+                before = previous.get(room.get("id")) or {}
+                room.pop("category_source", None)
+                if room.get("category") and before.get("category") != room["category"]:
+                    corrections.append((room.get("type"), room["category"]))
+                    room["category_source"] = "user"
+                elif room.get("category") and before.get("category_source") == "user":
+                    room["category_source"] = "user"
+
+            # 4. Save the edited analysis; the version check runs under the store lock
+            result = summarize_categories(dict(record["result"], rooms=rooms))
+            expected_version = body.get("version", record["version"])
+            try:
+                updated = update_analysis(analysis_id, result, expected_version)
+            except VersionConflict as e:
+                self._send_json({"error": "Analysis was changed by someone else", "version": e.version}, 409)
+                return
+            if updated is None:
+                self._send_json({"error": f"Unknown analysis {analysis_id}"}, 404)
+                return
+
+            # 5. Count the corrections only once the edit is saved
+            auto_approved = record_corrections(corrections)
+
+            self._send_json({
+                "analysisId": analysis_id,
+                "version": updated["version"],
+                "corrections": len(corrections),
+                "autoApproved": auto_approved,
+                "category_summary": result["category_summary"]
+            }, 200)
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _send_json(self, data, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
+
+    def do_GET(self):
+        self._send_json({"status": "Room Correction API is online"}, 200)
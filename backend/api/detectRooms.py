@@ -1,9 +1,9 @@
 from http.server import BaseHTTPRequestHandler
 import json
 import os
-import base64
 import email
 import sys
+import hashlib
 from email.policy import default
 from dotenv import load_dotenv
 
@@ -11,7 +11,12 @@ from dotenv import load_dotenv
 # This ensures we can import geminiService regardless of where this runs
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
-from geminiService import call_gemini_api
+from geminiService import call_gemini_api, build_image_part, get_coalescing_metrics, get_scheduler_metrics
+from requestScheduler import AdmissionRejected
+from responseCache import (cache_response, get_cached_response, get_response_cache_metrics, make_cache_key,
+                           prompt_version, send_cacheable_json, send_json_body)
+from requestProfiler import profiled
+from requestDeadline import Deadline, DeadlineExceeded
 
 load_dotenv()
 
@@ -58,6 +63,9 @@ USER_PROMPT = (
     "}"
 )
 
+# Part of the cache key: cached results are only valid for the prompt that produced them
+PROMPT_VERSION = prompt_version(USER_PROMPT)
+
 class handler(BaseHTTPRequestHandler):
 
     # --- CORS SUPPORT ---
@@ -69,7 +77,10 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     # --- POST REQUEST ---
+    @profiled
     def do_POST(self):
+        # Time budget from X-Request-Timeout-Ms or the platform limit
+        deadline = Deadline.from_headers(self.headers)
         try:
             # 1. Parse Input
             content_length = int(self.headers.get('Content-Length', 0))
@@ -97,8 +108,17 @@ class handler(BaseHTTPRequestHandler):
                 self._send_json({"error": "No file found in request"}, 400)
                 return
 
-            # 2. Encode Image
-            base64_image = base64.b64encode(file_content).decode('utf-8')
+            # Repeat uploads are answered from the server-side copy
+            force = self.headers.get('X-Force-Analysis') == '1'
+            cache_key = make_cache_key(hashlib.sha256(file_content).hexdigest(), "detectRooms", MODEL_TYPE, PROMPT_VERSION)
+            if not force:
+                cached = get_cached_response(cache_key)
+                if cached is not None:
+                    send_json_body(self, cached)
+                    return
+
+            # 2. Encode Image (uploaded-file handle, or inline base64 as fallback)
+            image_part = build_image_part(file_content, mime_type)
 
             # 3. Construct Messages
             messages_payload = [
@@ -106,10 +126,7 @@ class handler(BaseHTTPRequestHandler):
                     "role": "user",
                     "content": [
                         { "type": "text", "text": USER_PROMPT },
-                        { 
-                            "type": "image_url", 
-                            "image_url": { "url": f"data:{mime_type};base64,{base64_image}" } 
-                        }
+                        image_part
                     ]
                 }
             ]
@@ -117,28 +134,55 @@ class handler(BaseHTTPRequestHandler):
             # 4. Call Gemini Service
             gemini_response = call_gemini_api(
                 model=MODEL_TYPE, 
-                messages=messages_payload
+                messages=messages_payload,
+                timeout=deadline.timeout("room detection")
             )
             
             # 5. Parse and Return
             try:
                 data = json.loads(gemini_response)
-                self._send_json(data, 200)
+                self._send_result(data, cache_key)
             except json.JSONDecodeError:
                 print(f"Invalid JSON from Gemini: {gemini_response}")
                 self._send_json({"error": "Failed to generate valid JSON", "raw_response": gemini_response}, 500)
 
+        except DeadlineExceeded as e:
+            self._send_deadline_exceeded(e)
+
+        except AdmissionRejected as e:
+            print(f"Admission rejected: {e}")
+            self._send_json({"error": str(e), "retry_after": e.retry_after}, 429,
+                            {"Retry-After": str(e.retry_after), "Access-Control-Expose-Headers": "Retry-After"})
+
         except Exception as e:
+            if deadline.expired():
+                # Most likely the model call cut off by its timeout; answer now rather than late
+                print(f"Error at deadline: {e}")
+                self._send_deadline_exceeded(DeadlineExceeded("room detection", deadline))
+                return
             print(f"Server Error: {e}")
             self._send_json({"error": str(e)}, 500)
 
     # --- HELPERS ---
-    def _send_json(self, data, status_code):
+    def _send_deadline_exceeded(self, e):
+        print(f"Deadline exceeded: {e}")
+        self._send_json({"error": str(e), "incomplete": True, "deadline": e.deadline.summary()}, 504,
+                        {"Cache-Control": "no-store"})
+
+    def _send_result(self, data, cache_key):
+        body = json.dumps(data).encode('utf-8')
+        cache_response(cache_key, body)
+        send_json_body(self, body)
+
+    def _send_json(self, data, status_code, extra_headers=None):
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(json.dumps(data).encode('utf-8'))
 
     def do_GET(self):
-        self._send_json({"status": "Room Detection API is online"}, 200)
\ No newline at end of file
+        send_cacheable_json(self, {"status": "Room Detection API is online", "coalescing": get_coalescing_metrics(),
+                                   "scheduler": get_scheduler_metrics(), "response_cache": get_response_cache_metrics()}, None, "health")
\ No newline at end of file
@@ -0,0 +1,280 @@
+"""
+Request pipeline shared by the whole-plan detection endpoints.
+
+detectRoomsV2 and categorizeRooms run the same steps on an uploaded plan:
+
+1. Parse the multipart upload and its region / facility / floor labels.
+2. Answer repeat uploads from the response cache.
+3. Reuse a near-duplicate analysis of the same plan (perceptualHashIndex).
+4. Detect rooms: coarse-to-fine when enabled, else one routed model call.
+5. Snap the geometry to the plan's walls (wallRefinement).
+6. Store, cache and send the result; partial results under the request
+   deadline are sent uncached, admission rejections answer 429.
+
+Each endpoint's `handler` subclasses DetectionHandler, sets ANALYSIS_KIND and
+overrides cache_key_parts / process for what it adds on top (categorizeRooms:
+the approved category mappings and the category assignment).
+"""
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import email
+import sys
+import traceback
+from email.policy import default
+from PIL import Image
+import io
+import hashlib
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from geminiService import build_image_part, get_coalescing_metrics, get_scheduler_metrics
+from requestScheduler import AdmissionRejected
+from responseSchemas import DETECTION_SCHEMA
+from detectionPrompts import MODEL_TYPE, USER_PROMPT
+from modelRouter import call_with_routing
+from analysisStore import LABEL_FIELDS, save_analysis, save_reference_image
+from perceptualHashIndex import compute_dhash, find_reusable_analysis
+from wallRefinement import refine_rooms
+from coarseToFine import PIPELINE_VERSION, detect_coarse_to_fine
+from responseCache import (cache_response, get_cached_response, get_response_cache_metrics, make_cache_key,
+                           prompt_version, send_cacheable_json, send_json_body)
+from requestProfiler import profiled
+from requestDeadline import Deadline, DeadlineExceeded
+
+# --- 1. CONFIGURATION ---
+# Wall snapping is skipped when less than this is left of the request's deadline
+GEOMETRY_REFINEMENT_SECONDS = 2
+
+# Near-duplicate uploads can reuse rooms detected by any of these endpoints
+REUSE_KINDS = ["detectRoomsV2", "categorizeRooms", "reviseRooms"]
+
+# Part of the cache key: cached results are only valid for the prompts that produced them
+PROMPT_VERSION = prompt_version(USER_PROMPT, PIPELINE_VERSION)
+
+
+# --- 2. HANDLER ---
+class DetectionHandler(BaseHTTPRequestHandler):
+    ANALYSIS_KIND = None
+
+    def cache_key_parts(self):
+        """Extra inputs the endpoint's result depends on, beyond the upload, labels, model and prompts."""
+        return ()
+
+    def process(self, data):
+        """Endpoint-specific post-processing of detected (or reused) rooms."""
+        return data
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- POST REQUEST ---
+    @profiled
+    def do_POST(self):
+        # Time budget from X-Request-Timeout-Ms or the platform limit, checked by every stage
+        deadline = Deadline.from_headers(self.headers)
+        try:
+            # 1. Parse Input
+            content_length = int(self.headers.get('Content-Length', 0))
+            if content_length == 0:
+                self.send_error(400, "No data received")
+                return
+
+            body = self.rfile.read(content_length)
+            content_type = self.headers.get('Content-Type', '')
+
+            # Helper to create valid email message for parsing
+            headers = b'Content-Type: ' + content_type.encode('utf-8') + b'\r\n'
+            msg = email.message_from_bytes(headers + b'\r\n' + body, policy=default)
+
+            file_content = None
+            mime_type = "image/jpeg"
+            labels = {}
+
+            for part in msg.walk():
+                field = part.get_param('name', header='content-disposition')
+                if part.get_filename():
+                    if file_content is None:
+                        file_content = part.get_payload(decode=True)
+                        mime_type = part.get_content_type() or "image/jpeg"
+                elif field in LABEL_FIELDS:
+                    # Optional region / facility / floor labels, used by exports and rollups
+                    labels[field] = part.get_content().strip()
+
+            if not file_content:
+                self._send_json({"error": "No file found in request"}, 400)
+                return
+
+            # Repeat uploads are answered from the server-side copy.
+            # The key covers the blueprint, labels, model, prompts and the endpoint's own inputs.
+            force = self.headers.get('X-Force-Analysis') == '1'
+            file_sha256 = hashlib.sha256(file_content).hexdigest()
+            cache_key = make_cache_key(file_sha256, self.ANALYSIS_KIND, MODEL_TYPE, PROMPT_VERSION, labels,
+                                       *self.cache_key_parts())
+            if not force:
+                cached = get_cached_response(cache_key)
+                if cached is not None:
+                    send_json_body(self, cached)
+                    return
+
+            # 2. Get Image Dimensions
+            try:
+                image = Image.open(io.BytesIO(file_content))
+                image_width, image_height = image.size
+                print(f"Image dimensions: {image_width} x {image_height}")
+            except Exception as e:
+                print(f"Error reading image dimensions: {e}")
+                image = None
+                image_width, image_height = None, None
+
+            # 3. Reuse a previous analysis of the same plan (re-scan / re-export) unless forced
+            image_info = {
+                "sha256": file_sha256,
+                "phash": None,
+                "width": image_width,
+                "height": image_height
+            }
+            if image is not None:
+                image_info["phash"] = compute_dhash(image)
+                if not force:
+                    reused = find_reusable_analysis(image_info["phash"], image, labels, kinds=REUSE_KINDS)
+                    if reused:
+                        print(f"Reusing analysis {reused['reuse']['source_analysis_id']} ({reused['reuse']})")
+                        data = {
+                            "rooms": reused["rooms"],
+                            "reuse": reused["reuse"],
+                            "imageMetadata": {'width': image_width, 'height': image_height}
+                        }
+                        data = self.process(data)
+                        self._send_result(self._store_analysis(data, image_info, image, labels), cache_key)
+                        return
+
+            # 4. Encode Image (uploaded-file handle, or inline base64 as fallback)
+            image_part = build_image_part(file_content, mime_type)
+
+            # 5. Call Gemini Service: room boxes from a fast model, then the rooms refined on their crops
+            coarse_to_fine = detect_coarse_to_fine(image, image_part, MODEL_TYPE, deadline) if image is not None else None
+            if coarse_to_fine is None:
+                # One call on the whole plan (simple plans start on a cheaper tier, MODEL_TYPE is the top tier)
+                messages_payload = [
+                    {
+                        "role": "user",
+                        "content": [
+                            { "type": "text", "text": USER_PROMPT },
+                            image_part
+                        ]
+                    }
+                ]
+                gemini_response = call_with_routing(
+                    image=image,
+                    messages=messages_payload,
+                    top_model=MODEL_TYPE,
+                    response_schema=DETECTION_SCHEMA,
+                    schema_name="room_detection",
+                    deadline=deadline
+                )
+
+            # 6. Parse Response
+            try:
+                data = coarse_to_fine or json.loads(gemini_response)
+
+                # Add image metadata to the response
+                if image_width and image_height:
+                    data['imageMetadata'] = {
+                        'width': image_width,
+                        'height': image_height
+                    }
+
+                # Snap model geometry to the walls actually drawn in the plan
+                if image is not None and data.get("rooms") and deadline.allows("geometry refinement", GEOMETRY_REFINEMENT_SECONDS):
+                    try:
+                        data['geometryRefinement'] = refine_rooms(image, data["rooms"])
+                    except Exception as e:
+                        print(f"Geometry refinement failed: {e}")
+
+                data = self.process(data)
+
+                # Rooms left as coarse boxes because a refinement call failed are partial too
+                if deadline.skipped or data.get("coarseToFine", {}).get("failed"):
+                    self._send_incomplete(data, deadline)
+                    return
+
+                data = self._store_analysis(data, image_info, image, labels)
+
+                self._send_result(data, cache_key)
+
+            except json.JSONDecodeError as e:
+                print(f"Invalid JSON from Gemini: {gemini_response[:500]}")
+                self._send_json({
+                    "error": "Failed to parse response",
+                    "details": str(e),
+                    "raw_response": gemini_response[:1000]
+                }, 500)
+
+        except DeadlineExceeded as e:
+            self._send_deadline_exceeded(e)
+
+        except AdmissionRejected as e:
+            print(f"Admission rejected: {e}")
+            self._send_json({"error": str(e), "retry_after": e.retry_after}, 429,
+                            {"Retry-After": str(e.retry_after), "Access-Control-Expose-Headers": "Retry-After"})
+
+        except Exception as e:
+            if deadline.expired():
+                # Most likely a model call cut off by its timeout; answer now rather than late
+                print(f"Error at deadline: {e}")
+                self._send_deadline_exceeded(DeadlineExceeded("room detection", deadline))
+                return
+            print(f"Server Error: {e}")
+            traceback.print_exc()
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _store_analysis(self, data, image_info, image=None, labels=None):
+        # Storing is best effort; the client still gets its result if the disk is unavailable
+        try:
+            record = save_analysis(self.ANALYSIS_KIND, data, image_info, labels)
+            data["analysisId"] = record["id"]
+            # Lets this client read (getAnalysis) and correct (correctRooms) what it uploaded
+            data["analysisKey"] = record["access_key"]
+            data["version"] = record["version"]
+            # Kept so later revisions of this plan can be diffed against it
+            if image is not None:
+                save_reference_image(record["id"], image)
+        except OSError as e:
+            print(f"Could not store analysis: {e}")
+        return data
+
+    def _send_incomplete(self, data, deadline):
+        # Partial results are neither stored nor cached; a retry (with more time) gets the full analysis
+        data["incomplete"] = True
+        data["deadline"] = deadline.summary()
+        self._send_json(data, 200, {"Cache-Control": "no-store"})
+
+    def _send_deadline_exceeded(self, e):
+        print(f"Deadline exceeded: {e}")
+        self._send_json({"error": str(e), "incomplete": True, "rooms": [], "deadline": e.deadline.summary()}, 504,
+                        {"Cache-Control": "no-store"})
+
+    def _send_result(self, data, cache_key):
+        body = json.dumps(data).encode('utf-8')
+        cache_response(cache_key, body, data.get("analysisId"))
+        send_json_body(self, body)
+
+    def _send_json(self, data, status_code, extra_headers=None):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
+
+    def do_GET(self):
+        send_cacheable_json(self, {"status": "Room Detection API is online", "coalescing": get_coalescing_metrics(),
+                                   "scheduler": get_scheduler_metrics(), "response_cache": get_response_cache_metrics()}, None, "health")
@@ -0,0 +1,33 @@
+"""
+Model and prompt shared by the room detection endpoints (detectRoomsV2,
+categorizeRooms, reviseRooms) and the benchmarks that measure them.
+
+Kept apart from the handlers so importing the prompt does not import a
+Vercel handler module with its caches and store listeners.
+"""
+
+# The top tier for detection; the model router may start simple plans on a cheaper one
+MODEL_TYPE = "gemini-3-pro-preview"
+
+# Instructions only - the output shape is enforced by DETECTION_SCHEMA (see responseSchemas.py)
+USER_PROMPT = (
+    "Role: You are an architectural image analysis AI.\n"
+    "Task: Analyze the provided floor plan image and extract data about the distinct rooms.\n\n"
+    "Steps:\n"
+    "1. Identify all distinct rooms in the floor plan.\n"
+    "2. For each room, determine if it's rectangular, circular, or irregular.\n"
+    "3. Extract vertex coordinates (x,y pixel positions) for each room corner.\n"
+    "4. Calculate wall dimensions between consecutive vertices. Use the scale present in the picture.\n"
+    "5. Calculate the total area (square footage) for each room. Use the scale present in the picture.\n"
+    "6. Normalize room types (e.g., 'Gymnasium' -> 'gym', 'Restroom' -> 'bathroom'). There should be a list of room types in the picture\n"
+    "7. There may be some rooms in the picture not listed in the room types. Add an Unknown room type to them. If more than one Unknown then label Unknown1, Unknown2, etc."
+    "8. Some room types may have more than one room. All of the rooms of a room type should be identified \n"
+    " and annotated with a number to distinguish between rooms (e.g. Lounge1, Lounge2, etc) \n\n"
+    "IMPORTANT: (0,0) is the TOP-LEFT corner of the image.\n"
+    "X increases going RIGHT, Y increases going DOWN.\n\n"
+    "Shape Types:\n"
+    "- 'rect': Use 'coords' with x, y, w, h\n"
+    "- 'circle': Use 'coords' with cx, cy, r\n"
+    "- 'polygon': Use 'points' array of [x, y] coordinates.\n"
+    "- Circular rooms have a single wall whose length is the circumference, with note 'circumference'."
+)
@@ -0,0 +1,125 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import sys
+import tempfile
+from dotenv import load_dotenv
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from accessTokens import check_access
+from analysisExport import FORMATS, TABLES, available_formats, export_analyses
+from requestProfiler import profiled
+
+load_dotenv()
+
+# --- 2. CONFIGURATION ---
+# Exports contain every stored analysis; disabled until a token is configured
+EXPORT_TOKEN = os.getenv("EXPORT_TOKEN")
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+CONTENT_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+    "csv": "text/csv"
+}
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    Bulk export of stored analyses as one flat table.
+
+    GET ?table=rooms|walls&format=parquet|arrow|csv&since=<watermark>
+
+    format defaults to parquet. Parquet and Arrow answer 501 if pyarrow is
+    not installed.
+
+    The X-Export-Watermark response header is the value to pass as 'since'
+    on the next call to fetch only analyses added or edited after this one.
+    Without a 'table' parameter the request is a health check.
+
+    Exports require "Authorization: Bearer <EXPORT_TOKEN>" and answer 403
+    while no token is configured.
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- GET REQUEST ---
+    @profiled
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        table = query.get("table", [None])[0]
+        if table is None:
+            self._send_json({"status": "Export API is online", "tables": list(TABLES), "formats": available_formats()}, 200)
+            return
+
+        tmp_path = None
+        try:
+            # 1. Check access
+            if not check_access(self, EXPORT_TOKEN, "EXPORT_TOKEN"):
+                return
+
+            # 2. Parse parameters
+            fmt = query.get("format", ["parquet"])[0]
+            if table not in TABLES or fmt not in FORMATS:
+                self._send_json({"error": f"table must be one of {list(TABLES)}, format one of {list(FORMATS)}"}, 400)
+                return
+            if fmt not in available_formats():
+                # pyarrow is in requirements.txt; this only happens on an install without it
+                self._send_json({"error": f"Format '{fmt}' needs pyarrow, which this server lacks; "
+                                          f"use one of {available_formats()}"}, 501)
+                return
+            try:
+                since = float(query["since"][0]) if "since" in query else None
+            except ValueError:
+                self._send_json({"error": "since must be a unix timestamp"}, 400)
+                return
+
+            # 3. Export to a temp file (Parquet/Arrow footers need the whole file), then stream it
+            fd, tmp_path = tempfile.mkstemp(suffix=FORMATS[fmt])
+            os.close(fd)
+            summary = export_analyses({table: tmp_path}, fmt, updated_after=since)
+
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPES[fmt])
+            self.send_header('Content-Length', str(os.path.getsize(tmp_path)))
+            self.send_header('Content-Disposition', f'attachment; filename="{table}{FORMATS[fmt]}"')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Access-Control-Expose-Headers', 'X-Export-Watermark, X-Export-Rows')
+            self.send_header('X-Export-Rows', str(summary["rows"][table]))
+            if summary["watermark"] is not None:
+                self.send_header('X-Export-Watermark', repr(summary["watermark"]))
+            self.end_headers()
+
+            with open(tmp_path, "rb") as f:
+                while True:
+                    chunk = f.read(STREAM_CHUNK_BYTES)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send_json({"error": str(e)}, 500)
+
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # --- HELPERS ---
+    def _send_json(self, data, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
@@ -1,43 +1,423 @@
 import os
+import json
+import base64
+import hashlib
+import threading
+import time
+import urllib.request
+import uuid
 from openai import OpenAI
 from dotenv import load_dotenv
+from singleFlight import SingleFlight
+from requestScheduler import RequestScheduler, PRIORITY_BATCH
 
 # Load environment variables
 load_dotenv()
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    raise ValueError("GEMINI_API_KEY is missing from environment variables.")
+# Client is created on first use, so modules that only need prompts or
+# schemas (e.g. the benchmarks) can be imported without an API key.
+client = None
 
-# Initialize Client
-client = OpenAI(
-    api_key=GEMINI_API_KEY,
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+def _get_client():
+    global client
+    if client is None:
+        if not GEMINI_API_KEY:
+            raise ValueError("GEMINI_API_KEY is missing from environment variables.")
 
-def call_gemini_api(model, messages):
+        client = OpenAI(
+            api_key=GEMINI_API_KEY,
+            base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
+        )
+    return client
+
+# --- IMAGE UPLOADS ---
+# "inline" sends every image as a base64 data URL. "gemini" uploads it once
+# through the Gemini Files API and sends the file URI afterwards. "local"
+# stores it on disk and sends a local:// handle; it is only meant for
+# benchmarks and tests against a local stand-in model.
+IMAGE_UPLOAD_MODE = os.getenv("IMAGE_UPLOAD_MODE", "inline")
+GEMINI_UPLOAD_URL = "https://generativelanguage.googleapis.com/upload/v1beta/files"
+LOCAL_UPLOAD_DIR = os.getenv("LOCAL_UPLOAD_DIR", "/tmp/ocelot-uploads")
+
+# Gemini keeps uploaded files for 48 hours; forget handles a little earlier
+UPLOAD_HANDLE_TTL = 47 * 3600
+
+_upload_handles = {}  # sha256 -> {"uri": ..., "expires_at": ...}
+_upload_lock = threading.Lock()
+
+def _upload_to_gemini(file_content, mime_type):
+    request = urllib.request.Request(
+        f"{GEMINI_UPLOAD_URL}?uploadType=media&key={GEMINI_API_KEY}",
+        data=file_content,
+        headers={"Content-Type": mime_type, "X-Goog-Upload-Protocol": "raw"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        return json.loads(response.read())["file"]["uri"]
+
+def _upload_to_local(file_content, sha256):
+    os.makedirs(LOCAL_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(LOCAL_UPLOAD_DIR, sha256)
+    if not os.path.exists(path):
+        with open(path, "wb") as f:
+            f.write(file_content)
+    return f"local://{sha256}"
+
+def upload_image(file_content, mime_type):
+    """
+    Uploads an image once and returns a handle URI, cached by content hash.
+
+    Returns:
+        str: The handle URI, or None if uploads are off or the upload failed.
+    """
+    if IMAGE_UPLOAD_MODE not in ("gemini", "local"):
+        return None
+
+    sha256 = hashlib.sha256(file_content).hexdigest()
+    now = time.time()
+    with _upload_lock:
+        cached = _upload_handles.get(sha256)
+        if cached and cached["expires_at"] > now:
+            return cached["uri"]
+
+    try:
+        if IMAGE_UPLOAD_MODE == "gemini":
+            uri = _upload_to_gemini(file_content, mime_type)
+        else:
+            uri = _upload_to_local(file_content, sha256)
+    except Exception as e:
+        print(f"Image upload failed, sending inline instead: {e}")
+        return None
+
+    with _upload_lock:
+        _upload_handles[sha256] = {"uri": uri, "expires_at": now + UPLOAD_HANDLE_TTL}
+        # Drop expired handles so the cache does not grow forever
+        for key in [k for k, v in _upload_handles.items() if v["expires_at"] <= now]:
+            del _upload_handles[key]
+    return uri
+
+def forget_uploaded_image(file_content):
+    """Drops the cached handle, e.g. after the provider reported it missing."""
+    with _upload_lock:
+        _upload_handles.pop(hashlib.sha256(file_content).hexdigest(), None)
+
+class _ImagePart(dict):
+    """An image content part that remembers its bytes, so a rejected handle can be resent inline."""
+    source = None  # (file_content, mime_type) when the part is an uploaded-file handle
+
+def _inline_url(file_content, mime_type):
+    return "data:" + mime_type + ";base64," + base64.b64encode(file_content).decode('ascii')
+
+def build_image_part(file_content, mime_type):
+    """
+    Message content part for an image: an uploaded-file handle when uploads
+    are enabled, otherwise (or if the upload fails) an inline base64 data URL.
+    """
+    uri = upload_image(file_content, mime_type)
+    if uri is None:
+        return _ImagePart(type="image_url", image_url={"url": _inline_url(file_content, mime_type)})
+    part = _ImagePart(type="image_url", image_url={"url": uri})
+    part.source = (file_content, mime_type)
+    return part
+
+def _inline_uploaded_images(messages):
+    """
+    Copy of messages with every uploaded-file handle replaced by inline base64,
+    forgetting those handles. None if the messages reference no uploads.
+    """
+    replaced = False
+    inlined = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            parts = []
+            for part in content:
+                if getattr(part, "source", None) is not None:
+                    forget_uploaded_image(part.source[0])
+                    part = {"type": "image_url", "image_url": {"url": _inline_url(*part.source)}}
+                    replaced = True
+                parts.append(part)
+            message = dict(message, content=parts)
+        inlined.append(message)
+    return inlined if replaced else None
+
+# --- PROMPT CACHING ---
+# "gemini" registers the long static instruction text of a request (e.g.
+# USER_PROMPT) once as a Gemini cachedContents entry and sends its handle
+# instead of the text on later calls. "local" only hands out local-cache/
+# handles, for benchmarks against a local stand-in model. "off" sends the
+# prompt inline every time.
+PROMPT_CACHE_MODE = os.getenv("PROMPT_CACHE_MODE", "off")
+GEMINI_CACHE_URL = "https://generativelanguage.googleapis.com/v1beta/cachedContents"
+PROMPT_CACHE_TTL = 3600             # seconds the provider keeps a cache entry
+PROMPT_CACHE_REFRESH_MARGIN = 300   # extend the TTL when less than this is left
+PROMPT_CACHE_RETRY_AFTER = 600      # after a failed registration, send inline for this long
+PROMPT_CACHE_MIN_CHARS = 1000       # shorter prompts are not worth a cache entry
+
+_prompt_caches = {}  # (model, sha256 of text) -> {"name": ..., "expires_at": ..., "text": ...}
+_prompt_cache_lock = threading.Lock()
+
+def _gemini_cache_request(method, url, body):
+    request = urllib.request.Request(
+        f"{url}{'&' if '?' in url else '?'}key={GEMINI_API_KEY}",
+        data=json.dumps(body).encode('utf-8'),
+        headers={"Content-Type": "application/json"},
+        method=method
+    )
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.loads(response.read())
+
+def _register_prompt_cache(model, text, sha256):
+    if PROMPT_CACHE_MODE == "local":
+        return f"local-cache/{sha256[:12]}-{uuid.uuid4().hex[:8]}"
+    created = _gemini_cache_request("POST", GEMINI_CACHE_URL, {
+        "model": f"models/{model}",
+        "contents": [{"role": "user", "parts": [{"text": text}]}],
+        "ttl": f"{PROMPT_CACHE_TTL}s"
+    })
+    return created["name"]
+
+def _refresh_prompt_cache(name):
+    if PROMPT_CACHE_MODE == "local":
+        return
+    _gemini_cache_request("PATCH", f"https://generativelanguage.googleapis.com/v1beta/{name}?updateMask=ttl",
+                          {"ttl": f"{PROMPT_CACHE_TTL}s"})
+
+def get_prompt_cache(model, text):
+    """
+    Cache handle for a static prompt, registering or refreshing it as needed.
+
+    Returns:
+        str: The cachedContents name, or None if caching is off, the text is
+            too short, or registration failed recently.
+    """
+    if PROMPT_CACHE_MODE not in ("gemini", "local") or len(text) < PROMPT_CACHE_MIN_CHARS:
+        return None
+
+    sha256 = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    key = (model, sha256)
+    now = time.time()
+    with _prompt_cache_lock:
+        cached = _prompt_caches.get(key)
+    if cached and cached["expires_at"] - now > PROMPT_CACHE_REFRESH_MARGIN:
+        return cached["name"]
+
+    if cached and cached["name"] and cached["expires_at"] > now:
+        try:
+            _refresh_prompt_cache(cached["name"])
+            with _prompt_cache_lock:
+                cached["expires_at"] = now + PROMPT_CACHE_TTL
+            return cached["name"]
+        except Exception as e:
+            print(f"Prompt cache refresh failed, registering again: {e}")
+    elif cached and cached["name"] is None and cached["expires_at"] > now:
+        return None
+
+    try:
+        name = _register_prompt_cache(model, text, sha256)
+        entry = {"name": name, "expires_at": now + PROMPT_CACHE_TTL, "text": text}
+        print(f"Registered prompt cache {name} for {model}")
+    except Exception as e:
+        # e.g. below the model's minimum cacheable size; retry later
+        print(f"Prompt cache registration failed, sending prompt inline: {e}")
+        entry = {"name": None, "expires_at": now + PROMPT_CACHE_RETRY_AFTER, "text": text}
+    with _prompt_cache_lock:
+        _prompt_caches[key] = entry
+    return entry["name"]
+
+def forget_prompt_cache(name):
+    """Drops a handle the provider no longer knows, so the next call registers again."""
+    with _prompt_cache_lock:
+        for key in [k for k, v in _prompt_caches.items() if v["name"] == name]:
+            del _prompt_caches[key]
+
+def _apply_prompt_cache(model, messages):
+    """
+    Replaces the leading static text part of the first user message with a
+    cache handle. Returns (messages to send, handle or None).
+    """
+    if PROMPT_CACHE_MODE not in ("gemini", "local") or not messages:
+        return messages, None
+    first = messages[0]
+    content = first.get("content")
+    if first.get("role") != "user" or not isinstance(content, list) or not content or content[0].get("type") != "text":
+        return messages, None
+
+    name = get_prompt_cache(model, content[0]["text"])
+    if name is None:
+        return messages, None
+    return [dict(first, content=content[1:])] + list(messages[1:]), name
+
+# Identical concurrent calls (same image, model and prompt) share one upstream request
+COALESCE_WAIT_TIMEOUT = 180
+
+# Calls with a deadline keep the SDK's automatic retries only when at least this much time is left
+SDK_RETRY_MIN_TIMEOUT = 30
+_single_flight = SingleFlight()
+
+def _coalesce_key(model, messages, response_schema):
+    """
+    Key for single-flight: image hash + model + prompt version, where the
+    prompt version covers every non-image part of the request and the schema.
+    """
+    image_hash = hashlib.sha256()
+    prompt_hash = hashlib.sha256()
+
+    for message in messages:
+        content = message.get("content")
+        parts = content if isinstance(content, list) else [{"type": "text", "text": content}]
+        prompt_hash.update(str(message.get("role")).encode('utf-8'))
+        for part in parts:
+            if part.get("type") == "image_url":
+                image_hash.update(part["image_url"]["url"].encode('utf-8'))
+            else:
+                prompt_hash.update(json.dumps(part, sort_keys=True).encode('utf-8'))
+
+    prompt_hash.update(json.dumps(response_schema, sort_keys=True).encode('utf-8'))
+    return f"{image_hash.hexdigest()[:16]}:{model}:{prompt_hash.hexdigest()[:12]}"
+
+# Rate limits and priority queues shared by every upstream call in this instance
+_scheduler = RequestScheduler()
+
+def get_scheduler_metrics():
+    """Admission counters and queue-wait times for this instance."""
+    return _scheduler.metrics()
+
+def get_coalescing_metrics():
+    """Single-flight counters for this instance (how many calls were coalesced)."""
+    return _single_flight.metrics()
+
+def _build_response_format(response_schema, schema_name):
+    """
+    Builds the response_format argument for the chat completion call.
+
+    With a schema we ask for structured output, so the model is constrained to
+    that exact shape. Without one we fall back to plain JSON object mode.
+    """
+    if response_schema is None:
+        return {"type": "json_object"}
+
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": schema_name,
+            "schema": response_schema
+        }
+    }
+
+def _create_completion(model, messages, response_schema, schema_name, cache_name, timeout=None):
+    extra_body = None
+    if cache_name is not None:
+        extra_body = {"extra_body": {"google": {"cached_content": cache_name}}}
+    api = _get_client()
+    if timeout is not None:
+        # The SDK's own retries only fit when the budget is large; a late answer is no answer
+        api = api.with_options(timeout=timeout, max_retries=2 if timeout >= SDK_RETRY_MIN_TIMEOUT else 0)
+    return api.chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format=_build_response_format(response_schema, schema_name),
+        extra_body=extra_body
+    )
+
+def call_gemini_api_with_usage(model, messages, response_schema=None, schema_name="response", timeout=None):
+    """
+    Same as call_gemini_api, but also returns token usage for benchmarking.
+
+    Returns:
+        tuple: (content string, usage dict with prompt/completion/total tokens,
+            plus cached_tokens when the provider reports them)
+    """
+    try:
+        start = time.monotonic()
+        request_messages, cache_name = _apply_prompt_cache(model, messages)
+        try:
+            response = _create_completion(model, request_messages, response_schema, schema_name, cache_name, timeout)
+        except Exception as e:
+            # Prompt cache and file handles can disappear early (expired, deleted, other
+            # project); resend the prompt and images inline, once
+            if getattr(e, "status_code", None) not in (400, 403, 404):
+                raise
+            inline_messages = _inline_uploaded_images(messages)
+            if cache_name is None and inline_messages is None:
+                raise
+            if cache_name is not None:
+                print(f"Prompt cache {cache_name} rejected, sending prompt inline: {e}")
+                forget_prompt_cache(cache_name)
+            if inline_messages is not None:
+                print(f"Uploaded image rejected, sending it inline: {e}")
+                messages = inline_messages
+            if timeout is not None:
+                timeout -= time.monotonic() - start
+                if timeout <= 0:
+                    raise
+            response = _create_completion(model, messages, response_schema, schema_name, None, timeout)
+
+        usage = {}
+        if response.usage:
+            usage = {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            }
+            details = getattr(response.usage, "prompt_tokens_details", None)
+            if details is not None and getattr(details, "cached_tokens", None) is not None:
+                usage["cached_tokens"] = details.cached_tokens
+
+        return response.choices[0].message.content, usage
+
+    except Exception as e:
+        print(f"Gemini API Error: {e}")
+        raise e
+
+def call_gemini_api(model, messages, response_schema=None, schema_name="response", priority=PRIORITY_BATCH,
+                    timeout=None):
     """
     Generic function to call Gemini via OpenAI SDK.
+
+    Concurrent calls with the same image, model and prompt are coalesced into
+    a single upstream request; waiters give up after COALESCE_WAIT_TIMEOUT.
+    The upstream request itself waits its turn in the request scheduler.
     
     Args:
         model (str): The model name (e.g., "gemini-1.5-flash")
         messages (list): The list of message dictionaries (role, content).
+        response_schema (dict, optional): JSON schema for structured output
+            (see responseSchemas.py). If omitted, plain JSON mode is used.
+        schema_name (str, optional): Name reported to the API for the schema.
+        priority (int, optional): PRIORITY_INTERACTIVE for calls the UI blocks
+            on, PRIORITY_BATCH (default) for everything else.
+        timeout (float, optional): Seconds left in the caller's deadline (see
+            requestDeadline.py). Bounds the queue wait, the wait on a coalesced
+            call and the upstream request itself.
         
     Returns:
         str: The content string from the response.
+
+    Raises:
+        AdmissionRejected: If the scheduler has no capacity; callers should
+            answer 429 with Retry-After.
     """
-    try:
-        response = client.chat.completions.create(
+    start = time.monotonic()
+
+    def scheduled_call():
+        waited = _scheduler.acquire(model, priority, max_wait=timeout)
+        if waited > 0.1:
+            print(f"Queue wait for {model}: {waited * 1000:.0f} ms")
+        remaining = None if timeout is None else timeout - (time.monotonic() - start)
+        if remaining is not None and remaining <= 0:
+            raise TimeoutError(f"Deadline passed while queued for {model}")
+        return call_gemini_api_with_usage(
             model=model,
             messages=messages,
-            # We keep JSON object enforcement here since your prompt relies on it,
-            # but you could also make this a parameter if you wanted.
-            response_format={"type": "json_object"} 
+            response_schema=response_schema,
+            schema_name=schema_name,
+            timeout=remaining
         )
-        
-        return response.choices[0].message.content
 
-    except Exception as e:
-        print(f"Gemini API Error: {e}")
-        raise e
\ No newline at end of file
+    key = _coalesce_key(model, messages, response_schema)
+    wait_timeout = COALESCE_WAIT_TIMEOUT if timeout is None else min(COALESCE_WAIT_TIMEOUT, timeout)
+    content, _usage = _single_flight.do(key, scheduled_call, timeout=wait_timeout)
+    return content
@@ -1,7 +1,13 @@
 from http.server import BaseHTTPRequestHandler
 import json
+import os
+import sys
 from datetime import datetime
 
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from responseCache import send_cacheable_json
+
 ALLOWED_ORIGIN = 'https://ocelot-compliance-app-ux.vercel.app'
 
 class handler(BaseHTTPRequestHandler):
@@ -171,8 +177,4 @@ class handler(BaseHTTPRequestHandler):
 
     # Keep GET active for simple health checks
     def do_GET(self):
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.end_headers()
-        self.wfile.write(json.dumps({"status": "API is online. Use POST to upload files."}).encode('utf-8'))
\ No newline at end of file
+        send_cacheable_json(self, {"status": "API is online. Use POST to upload files."}, None, "health")
\ No newline at end of file
@@ -0,0 +1,80 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from accessTokens import check_analysis_access
+from analysisStore import load_analysis
+from requestProfiler import profiled
+from responseCache import get_response_cache_metrics, make_etag, send_cacheable_json
+
+load_dotenv()
+
+# --- 2. CONFIGURATION ---
+# Lets a server read any analysis; clients use the analysisKey returned with their own
+ANALYSIS_READ_TOKEN = os.getenv("ANALYSIS_READ_TOKEN")
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    A stored analysis, by the analysisId the detection endpoints return.
+
+    GET ?analysisId=<id>  -> the analysis result plus analysisId and version
+
+    The ETag changes with the analysis version (every saved edit), so a
+    client that sends it back as If-None-Match gets 304 until the analysis
+    is edited. Without analysisId the request is a health check.
+
+    Requires the analysis's key in X-Analysis-Key (returned as analysisKey
+    when it was stored) or "Authorization: Bearer <ANALYSIS_READ_TOKEN>";
+    answers 401 otherwise. The browser app does not call it yet; it is for
+    server integrations and clients that keep the analysis key.
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- GET REQUEST ---
+    @profiled
+    def do_GET(self):
+        try:
+            # 1. Parse parameters
+            analysis_id = parse_qs(urlparse(self.path).query).get("analysisId", [None])[0]
+            if analysis_id is None:
+                send_cacheable_json(self, {"status": "Analysis API is online",
+                                           "response_cache": get_response_cache_metrics()}, None, "health")
+                return
+
+            # 2. Load the analysis
+            record = load_analysis(analysis_id)
+            if record is None:
+                self._send_json({"error": f"Unknown analysis {analysis_id}"}, 404)
+                return
+            if not check_analysis_access(self, record, ANALYSIS_READ_TOKEN, "ANALYSIS_READ_TOKEN"):
+                return
+
+            # 3. Send it, or 304 if the client has this version
+            data = dict(record["result"], analysisId=record["id"], version=record["version"])
+            send_cacheable_json(self, data, make_etag(record["id"], record["version"]), "analysis")
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _send_json(self, data, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
@@ -0,0 +1,82 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from requestProfiler import is_authorized, list_profiles, load_profile
+
+load_dotenv()
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    Retrieves request profiles recorded by requestProfiler.
+
+    GET                      -> recent profiles (id, endpoint, wall time)
+    GET ?id=<X-Profile-Id>   -> summary: time per package, top functions, top allocations
+    GET ?id=...&format=prof  -> raw cProfile stats for pstats / snakeviz
+
+    Requires "Authorization: Bearer <PROFILE_TOKEN>"; without PROFILE_TOKEN
+    profiling is off and this endpoint always answers 401.
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- GET REQUEST ---
+    def do_GET(self):
+        try:
+            # 1. Check access
+            if not is_authorized(self.headers):
+                self._send_json({"error": "Unauthorized"}, 401)
+                return
+
+            # 2. Parse Input
+            query = parse_qs(urlparse(self.path).query)
+            request_id = query.get("id", [None])[0]
+            fmt = query.get("format", ["json"])[0]
+            if fmt not in ("json", "prof"):
+                self._send_json({"error": "format must be json or prof"}, 400)
+                return
+            if request_id is None:
+                self._send_json({"profiles": list_profiles()}, 200)
+                return
+
+            # 3. Load the profile
+            profile = load_profile(request_id, fmt)
+            if profile is None:
+                self._send_json({"error": f"Unknown profile {request_id}"}, 404)
+                return
+            if fmt == "json":
+                self._send_json(profile, 200)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Disposition', f'attachment; filename="{request_id}.prof"')
+            self.send_header('Content-Length', str(len(profile)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.end_headers()
+            self.wfile.write(profile)
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _send_json(self, data, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
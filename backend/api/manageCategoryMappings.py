@@ -0,0 +1,99 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from accessTokens import check_access
+from categoryMappings import list_mappings, set_mapping_status
+from roomCategories import CATEGORIES
+
+load_dotenv()
+
+# --- 2. CONFIGURATION ---
+# Approving a mapping changes every future categorization; disabled until a token is configured
+MAPPING_ADMIN_TOKEN = os.getenv("MAPPING_ADMIN_TOKEN")
+STATUSES = ("pending", "approved", "rejected")
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    Review queue for learned room type -> category mappings.
+
+    GET  ?status=pending                                   -> mappings with vote counts and confidence
+    POST {"type": "lounge", "action": "approve"|"reject", "category": <optional override>}
+
+    POST requires "Authorization: Bearer <MAPPING_ADMIN_TOKEN>" and answers
+    403 while no token is configured.
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- GET REQUEST ---
+    def do_GET(self):
+        try:
+            status = parse_qs(urlparse(self.path).query).get("status", [None])[0]
+            if status is not None and status not in STATUSES:
+                self._send_json({"error": f"status must be one of {list(STATUSES)}"}, 400)
+                return
+            self._send_json({"mappings": list_mappings(status)}, 200)
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            self._send_json({"error": str(e)}, 500)
+
+    # --- POST REQUEST ---
+    def do_POST(self):
+        try:
+            # 1. Check access
+            if not check_access(self, MAPPING_ADMIN_TOKEN, "MAPPING_ADMIN_TOKEN"):
+                return
+
+            # 2. Parse Input
+            content_length = int(self.headers.get('Content-Length', 0))
+            try:
+                body = json.loads(self.rfile.read(content_length))
+                room_type, action = body["type"], body["action"]
+            except (ValueError, KeyError, TypeError):
+                self._send_json({"error": "Expected JSON with 'type' and 'action'"}, 400)
+                return
+            category = body.get("category")
+            if action not in ("approve", "reject") or (category and category not in CATEGORIES):
+                self._send_json({"error": f"action must be approve or reject; category one of {CATEGORIES}"}, 400)
+                return
+
+            # 3. Apply
+            try:
+                entry = set_mapping_status(room_type, "approved" if action == "approve" else "rejected", category)
+            except ValueError as e:
+                self._send_json({"error": str(e)}, 400)
+                return
+            if entry is None:
+                self._send_json({"error": f"No corrections recorded for type '{room_type}'; pass a category to approve it"}, 404)
+                return
+            print(f"Category mapping {entry['type']} -> {entry['category']} ({entry['status']})")
+            self._send_json(entry, 200)
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _send_json(self, data, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
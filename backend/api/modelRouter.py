@@ -0,0 +1,271 @@
+"""
+Complexity-based model routing for room detection.
+
+Simple plans start on a cheaper model tier. A result only escalates to the
+next (larger) tier when it fails the schema or geometry sanity checks.
+
+Every routing decision and its outcome is printed as a single JSON line
+prefixed with [ModelRouter], and also appended to ROUTING_LOG_PATH if set,
+so the thresholds below can be tuned from real traffic.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from geminiService import call_gemini_api
+from responseSchemas import DETECTION_SCHEMA, validate_response
+from requestScheduler import AdmissionRejected
+from requestDeadline import DeadlineExceeded
+
+# --- 1. CONFIGURATION ---
+# Cheaper tiers, in escalation order. The caller's own model is always the last tier.
+CHEAP_MODEL_TIERS = ["gemini-2.5-flash"]
+
+# Upper complexity score (0..1) for starting on each cheap tier, same order as above.
+# Plans scoring above every threshold go straight to the caller's model.
+TIER_MAX_SCORES = [0.35]
+
+# Features are computed on a downsampled copy, so cost is independent of scan size.
+ANALYSIS_MAX_SIDE = 1024
+EDGE_THRESHOLD = 40          # grayscale gradient magnitude counted as an edge
+TEXT_CELL_SIZE = 16          # px, cell size for the text-region heuristic
+
+# Normalisation points for the complexity score
+MAX_MEGAPIXELS = 12.0
+MAX_EDGE_DENSITY = 0.15
+MAX_TEXT_REGIONS = 150
+
+# Escalating is skipped when less than this is left of the request's deadline
+ESCALATION_MIN_SECONDS = 20
+
+ROUTING_LOG_PATH = os.getenv("ROUTING_LOG_PATH")
+
+
+# --- 2. COMPLEXITY FEATURES ---
+def _to_analysis_array(image):
+    """Grayscale float array, downsampled so the longest side is ANALYSIS_MAX_SIDE."""
+    gray = image.convert("L")
+    gray.thumbnail((ANALYSIS_MAX_SIDE, ANALYSIS_MAX_SIDE))
+    return np.asarray(gray, dtype=np.float32)
+
+
+def _count_text_regions(pixels):
+    """
+    Counts text-like regions: cells with a moderate amount of ink and many
+    light/dark transitions (glyphs), merged into horizontal runs.
+    """
+    rows = (pixels.shape[0] // TEXT_CELL_SIZE) * TEXT_CELL_SIZE
+    cols = (pixels.shape[1] // TEXT_CELL_SIZE) * TEXT_CELL_SIZE
+    if rows == 0 or cols == 0:
+        return 0
+
+    ink = pixels[:rows, :cols] < 128
+    transitions = np.abs(np.diff(ink.astype(np.int8), axis=1))
+
+    cells = ink.reshape(rows // TEXT_CELL_SIZE, TEXT_CELL_SIZE, cols // TEXT_CELL_SIZE, TEXT_CELL_SIZE)
+    ink_ratio = cells.mean(axis=(1, 3))
+
+    padded = np.pad(transitions, ((0, 0), (0, 1)))
+    cell_transitions = padded.reshape(
+        rows // TEXT_CELL_SIZE, TEXT_CELL_SIZE, cols // TEXT_CELL_SIZE, TEXT_CELL_SIZE
+    ).sum(axis=(1, 3))
+
+    text_cells = (ink_ratio > 0.05) & (ink_ratio < 0.5) & (cell_transitions > 2 * TEXT_CELL_SIZE)
+
+    # A region starts wherever a text cell has no text cell to its left
+    starts = text_cells & ~np.pad(text_cells, ((0, 0), (1, 0)))[:, :-1]
+    return int(starts.sum())
+
+
+def compute_complexity_features(image):
+    """
+    Cheap local image features used to estimate how hard a plan is.
+
+    Args:
+        image (PIL.Image.Image): The uploaded blueprint.
+
+    Returns:
+        dict: width, height, megapixels, edge_density, text_regions
+    """
+    width, height = image.size
+    pixels = _to_analysis_array(image)
+
+    grad_x = np.abs(np.diff(pixels, axis=1))[:-1, :]
+    grad_y = np.abs(np.diff(pixels, axis=0))[:, :-1]
+    edges = (grad_x + grad_y) > EDGE_THRESHOLD
+    edge_density = float(edges.mean()) if edges.size else 0.0
+
+    return {
+        "width": width,
+        "height": height,
+        "megapixels": round(width * height / 1_000_000, 2),
+        "edge_density": round(edge_density, 4),
+        "text_regions": _count_text_regions(pixels)
+    }
+
+
+def score_complexity(features):
+    """Combines the features into a single 0..1 complexity score."""
+    resolution = min(features["megapixels"] / MAX_MEGAPIXELS, 1.0)
+    edges = min(features["edge_density"] / MAX_EDGE_DENSITY, 1.0)
+    text = min(features["text_regions"] / MAX_TEXT_REGIONS, 1.0)
+    return round(0.2 * resolution + 0.4 * edges + 0.4 * text, 3)
+
+
+# --- 3. RESULT CHECKS ---
+def check_detection_result(data, image_width=None, image_height=None):
+    """
+    Schema and geometry sanity checks for a parsed detection response.
+
+    Returns:
+        list: Problems found. Empty if the result looks usable.
+    """
+    problems = validate_response(data, DETECTION_SCHEMA)
+    if problems:
+        return problems
+
+    rooms = data["rooms"]
+    if not rooms:
+        return ["no rooms detected"]
+
+    for room in rooms:
+        label = f"room {room.get('id')}"
+        shape = room["shape_type"]
+        coords = room.get("coords") or {}
+
+        if room["calculated_area"] <= 0:
+            problems.append(f"{label}: non-positive area")
+
+        if shape == "rect":
+            if not all(k in coords for k in ("x", "y", "w", "h")):
+                problems.append(f"{label}: rect without x/y/w/h")
+                continue
+            if coords["w"] <= 0 or coords["h"] <= 0:
+                problems.append(f"{label}: empty rect")
+            xs, ys = [coords["x"], coords["x"] + coords["w"]], [coords["y"], coords["y"] + coords["h"]]
+        elif shape == "circle":
+            if not all(k in coords for k in ("cx", "cy", "r")):
+                problems.append(f"{label}: circle without cx/cy/r")
+                continue
+            if coords["r"] <= 0:
+                problems.append(f"{label}: non-positive radius")
+            xs, ys = [coords["cx"]], [coords["cy"]]
+        else:
+            points = room.get("points") or []
+            if len(points) < 3 or any(len(p) != 2 for p in points):
+                problems.append(f"{label}: polygon needs at least 3 [x, y] points")
+                continue
+            xs, ys = [p[0] for p in points], [p[1] for p in points]
+
+        if image_width and image_height:
+            # Allow a small margin for rooms drawn right up to the image border
+            margin_x, margin_y = image_width * 0.02, image_height * 0.02
+            if (min(xs) < -margin_x or max(xs) > image_width + margin_x or
+                    min(ys) < -margin_y or max(ys) > image_height + margin_y):
+                problems.append(f"{label}: coordinates outside the image")
+
+    return problems
+
+
+# --- 4. ROUTING ---
+def _log_decision(record):
+    line = json.dumps(record)
+    print(f"[ModelRouter] {line}")
+    if ROUTING_LOG_PATH:
+        try:
+            with open(ROUTING_LOG_PATH, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Could not write routing log: {e}")
+
+
+def select_tiers(score, top_model):
+    """Model tiers to try, cheapest first, for a given complexity score."""
+    for i, max_score in enumerate(TIER_MAX_SCORES):
+        if score <= max_score:
+            return CHEAP_MODEL_TIERS[i:] + [top_model]
+    return [top_model]
+
+
+def call_with_routing(image, messages, top_model, response_schema=DETECTION_SCHEMA, schema_name="response",
+                      deadline=None):
+    """
+    Calls Gemini starting at the cheapest tier suited to the plan's complexity,
+    escalating to larger tiers when a result fails check_detection_result.
+
+    Args:
+        image (PIL.Image.Image or None): The decoded upload. If None, routing
+            is skipped and top_model is called directly.
+        messages (list): The messages payload for call_gemini_api.
+        top_model (str): The caller's MODEL_TYPE, used as the final tier.
+        response_schema (dict): Passed through to call_gemini_api.
+        schema_name (str): Passed through to call_gemini_api.
+        deadline (requestDeadline.Deadline, optional): Bounds every call; a
+            failed result is returned as is when escalating would not fit.
+
+    Returns:
+        str: The content string from the accepted (or last) response.
+
+    Raises:
+        DeadlineExceeded: If there was no time left for the first call.
+    """
+    timeout = (lambda: deadline.timeout("room detection")) if deadline else (lambda: None)
+    if image is None:
+        return call_gemini_api(model=top_model, messages=messages,
+                               response_schema=response_schema, schema_name=schema_name, timeout=timeout())
+
+    start = time.perf_counter()
+    features = compute_complexity_features(image)
+    score = score_complexity(features)
+    tiers = select_tiers(score, top_model)
+    feature_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    record = {"features": features, "score": score, "feature_ms": feature_ms, "tiers": tiers, "attempts": []}
+
+    content = None
+    for attempt, model in enumerate(tiers):
+        is_last = attempt == len(tiers) - 1
+        if attempt > 0 and deadline and not deadline.allows(f"escalation to {model}", ESCALATION_MIN_SECONDS):
+            record["attempts"].append({"model": model, "outcome": "skipped_deadline"})
+            if content is None:
+                _log_decision(record)
+                raise DeadlineExceeded("room detection", deadline)
+            break
+        call_timeout = timeout()
+        call_start = time.perf_counter()
+        try:
+            content = call_gemini_api(model=model, messages=messages,
+                                      response_schema=response_schema, schema_name=schema_name, timeout=call_timeout)
+        except AdmissionRejected:
+            # Out of capacity; escalating to a bigger model would only make it worse
+            record["attempts"].append({"model": model, "outcome": "rejected"})
+            _log_decision(record)
+            raise
+        except Exception as e:
+            record["attempts"].append({"model": model, "outcome": "error", "error": str(e),
+                                       "latency_s": round(time.perf_counter() - call_start, 2)})
+            if is_last:
+                record["final_model"] = model
+                _log_decision(record)
+                raise
+            continue
+
+        try:
+            problems = check_detection_result(json.loads(content), features["width"], features["height"])
+        except json.JSONDecodeError as e:
+            problems = [f"invalid JSON: {e}"]
+
+        if not problems:
+            outcome = "accepted"
+        else:
+            outcome = "failed_checks" if is_last else "escalated"
+        record["attempts"].append({"model": model, "outcome": outcome, "problems": problems[:5],
+                                   "latency_s": round(time.perf_counter() - call_start, 2)})
+        if outcome != "escalated":
+            break
+
+    record["final_model"] = next(a["model"] for a in reversed(record["attempts"]) if a["outcome"] != "skipped_deadline")
+    _log_decision(record)
+    return content
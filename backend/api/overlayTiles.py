@@ -0,0 +1,285 @@
+"""
+Server-side rendered category overlays, served as an XYZ tile pyramid.
+
+Zoom maxZoom shows the plan at the resolution of the analysed upload; each
+lower zoom halves it, down to a single TILE_SIZE tile at zoom 0. Tiles are
+rendered lazily from the stored analysis (and its reference image for the
+'composite' layer) and kept in an LRU cache keyed by
+(analysis id, version, layer, z, x, y).
+
+When an analysis is edited, only cached tiles that overlap a changed room
+are dropped; the rest are carried over to the new version.
+"""
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+
+from analysisStore import add_listener, load_reference_image
+from wallRefinement import room_bbox
+
+# --- 1. CONFIGURATION ---
+TILE_SIZE = 256
+TILE_CACHE_MAX_BYTES = int(os.getenv("TILE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REFERENCE_CACHE_SIZE = 4        # decoded reference images kept for composite tiles
+LAYERS = ("overlay", "composite")
+FILL_ALPHA = 153                # 0.6, same as the frontend views
+OUTLINE_WIDTH = 2               # tile px
+LABEL_MIN_SCALE = 0.5           # draw room names from this zoom scale up
+
+# Same palette as the frontend CategoryAnnotatedView
+CATEGORY_COLORS = {
+    "PFSA Space": (59, 130, 246),
+    "Non Qualified Space": (16, 185, 129),
+    "Common Space": (245, 158, 11),
+    "Shared Space": (139, 92, 246),
+}
+UNKNOWN_COLOR = (156, 163, 175)
+
+
+# --- 2. PYRAMID GEOMETRY ---
+def pyramid_info(record):
+    """Size and zoom levels of the tile pyramid for a stored analysis."""
+    width, height = record["image"].get("width"), record["image"].get("height")
+    if not width or not height:
+        metadata = record["result"].get("imageMetadata") or {}
+        width, height = metadata.get("width"), metadata.get("height")
+    if not width or not height:
+        return None
+    max_zoom = max(0, math.ceil(math.log2(max(width, height) / TILE_SIZE)))
+    return {
+        "width": width,
+        "height": height,
+        "tileSize": TILE_SIZE,
+        "minZoom": 0,
+        "maxZoom": max_zoom,
+        "layers": list(LAYERS),
+        "legend": {name: "#%02x%02x%02x" % color for name, color in CATEGORY_COLORS.items()}
+    }
+
+
+def tile_bounds(info, z, x, y):
+    """Image-pixel box (x0, y0, x1, y1) covered by a tile, and the tile's image->tile scale."""
+    scale = 2.0 ** (z - info["maxZoom"])
+    span = TILE_SIZE / scale
+    return (x * span, y * span, (x + 1) * span, (y + 1) * span), scale
+
+
+def tile_exists(info, z, x, y):
+    if not 0 <= z <= info["maxZoom"] or x < 0 or y < 0:
+        return False
+    (x0, y0, _x1, _y1), _scale = tile_bounds(info, z, x, y)
+    return x0 < info["width"] and y0 < info["height"]
+
+
+def _intersects(box, bbox, margin):
+    x0, y0, x1, y1 = box
+    bx, by, bw, bh = bbox
+    return bx - margin < x1 and x0 < bx + bw + margin and by - margin < y1 and y0 < by + bh + margin
+
+
+# --- 3. RENDERING ---
+def _draw_room(draw, room, to_tile, color, scale):
+    fill = color + (FILL_ALPHA,)
+    outline = color + (255,)
+    coords = room.get("coords") or {}
+    if room.get("points"):
+        draw.polygon([to_tile(px, py) for px, py in room["points"]], fill=fill, outline=outline, width=OUTLINE_WIDTH)
+    elif "cx" in coords and "r" in coords:
+        cx, cy = to_tile(coords["cx"], coords["cy"])
+        r = abs(coords["r"]) * scale
+        draw.ellipse((cx - r, cy - r, cx + r, cy + r), fill=fill, outline=outline, width=OUTLINE_WIDTH)
+    elif "x" in coords and "w" in coords:
+        # Models sometimes return a negative w / h; Pillow needs x0 <= x1 and y0 <= y1
+        x0, y0 = to_tile(coords["x"], coords["y"])
+        x1, y1 = x0 + coords["w"] * scale, y0 + coords["h"] * scale
+        draw.rectangle((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1)), fill=fill, outline=outline, width=OUTLINE_WIDTH)
+
+
+def render_tile(record, info, layer, z, x, y, reference=None):
+    """
+    Renders one tile as PNG bytes.
+
+    Args:
+        record (dict): Stored analysis.
+        info (dict): pyramid_info(record).
+        layer (str): 'overlay' (transparent rooms only) or 'composite' (rooms over the plan).
+        reference (PIL.Image.Image, optional): Reference image for the composite layer.
+    """
+    box, scale = tile_bounds(info, z, x, y)
+    to_tile = lambda px, py: ((px - box[0]) * scale, (py - box[1]) * scale)
+
+    overlay = Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(overlay)
+    labels = []
+    for room in record["result"].get("rooms", []):
+        try:
+            bbox = room_bbox(room)
+            if not bbox or not _intersects(box, bbox, OUTLINE_WIDTH / scale):
+                continue
+            _draw_room(draw, room, to_tile, CATEGORY_COLORS.get(room.get("category"), UNKNOWN_COLOR), scale)
+        except (IndexError, KeyError, TypeError, ValueError) as e:
+            # One malformed room (e.g. a point without two coordinates) must not fail the whole tile
+            print(f"Skipping room {room.get('id')} on tile {z}/{x}/{y}: {e!r}")
+            continue
+        if scale >= LABEL_MIN_SCALE and room.get("name"):
+            labels.append((to_tile(bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2), room["name"]))
+    for (tx, ty), name in labels:
+        draw.text((tx, ty), name, fill=(0, 0, 0, 255), anchor="mm", stroke_width=2, stroke_fill=(255, 255, 255, 255))
+
+    tile = overlay
+    if layer == "composite":
+        tile = Image.new("RGBA", (TILE_SIZE, TILE_SIZE), (255, 255, 255, 255))
+        if reference is not None:
+            # The reference is a downsampled copy; map the tile box (clipped to the plan) into its pixels
+            x0, y0 = box[0], box[1]
+            x1, y1 = min(box[2], info["width"]), min(box[3], info["height"])
+            ref_scale = reference.width / info["width"]
+            crop = reference.crop(tuple(round(v * ref_scale) for v in (x0, y0, x1, y1)))
+            size = (max(1, round((x1 - x0) * scale)), max(1, round((y1 - y0) * scale)))
+            tile.paste(crop.resize(size, Image.BILINEAR).convert("RGBA"), (0, 0))
+        tile = Image.alpha_composite(tile, overlay)
+
+    buffer = io.BytesIO()
+    tile.save(buffer, format="PNG", optimize=False)
+    return buffer.getvalue()
+
+
+# --- 4. CACHES ---
+class TileCache:
+    """Byte-bounded LRU of rendered tiles."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._tiles = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is None:
+                self.misses += 1
+                return None
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+    def put(self, key, tile):
+        with self._lock:
+            if key in self._tiles:
+                self._bytes -= len(self._tiles.pop(key))
+            self._tiles[key] = tile
+            self._bytes += len(tile)
+            while self._bytes > self.max_bytes and self._tiles:
+                _key, evicted = self._tiles.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def carry_over(self, analysis_id, old_version, new_version, keep):
+        """Re-keys tiles of an edited analysis to its new version if keep(layer, z, x, y), else drops them."""
+        kept = dropped = 0
+        with self._lock:
+            tiles = OrderedDict()
+            for key, tile in self._tiles.items():
+                if key[0] == analysis_id and key[1] == old_version:
+                    if keep(*key[2:]):
+                        key = (analysis_id, new_version) + key[2:]
+                        kept += 1
+                    else:
+                        self._bytes -= len(tile)
+                        dropped += 1
+                        continue
+                tiles[key] = tile
+            self._tiles = tiles
+        return kept, dropped
+
+    def metrics(self):
+        with self._lock:
+            return {"tiles": len(self._tiles), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_tile_cache = TileCache(TILE_CACHE_MAX_BYTES)
+_references = OrderedDict()
+_references_lock = threading.Lock()
+
+
+def _get_reference(analysis_id):
+    with _references_lock:
+        if analysis_id in _references:
+            _references.move_to_end(analysis_id)
+            return _references[analysis_id]
+    reference = load_reference_image(analysis_id)
+    with _references_lock:
+        _references[analysis_id] = reference
+        while len(_references) > REFERENCE_CACHE_SIZE:
+            _references.popitem(last=False)
+    return reference
+
+
+def get_tile(record, layer, z, x, y):
+    """
+    Cached tile for a stored analysis.
+
+    Returns:
+        tuple: (png bytes, cache hit bool), or (None, False) if the tile is outside the pyramid.
+    """
+    info = pyramid_info(record)
+    if info is None or layer not in LAYERS or not tile_exists(info, z, x, y):
+        return None, False
+    key = (record["id"], record["version"], layer, z, x, y)
+    tile = _tile_cache.get(key)
+    if tile is not None:
+        return tile, True
+    reference = _get_reference(record["id"]) if layer == "composite" else None
+    tile = render_tile(record, info, layer, z, x, y, reference)
+    _tile_cache.put(key, tile)
+    return tile, False
+
+
+def get_tile_cache_metrics():
+    return _tile_cache.metrics()
+
+
+# --- 5. EDIT INVALIDATION ---
+def _changed_boxes(previous_rooms, rooms):
+    """Bounding boxes of rooms that were added, removed or changed in any drawn property."""
+    before = {r.get("id"): r for r in previous_rooms}
+    after = {r.get("id"): r for r in rooms}
+    boxes = []
+    for room_id in set(before) | set(after):
+        old, new = before.get(room_id), after.get(room_id)
+        if old == new:
+            continue
+        for room in (old, new):
+            bbox = room_bbox(room) if room else None
+            if bbox:
+                boxes.append(bbox)
+    return boxes
+
+
+def _on_analysis_saved(record, previous):
+    if previous is None:
+        return
+    info = pyramid_info(record)
+    if info is None:
+        return
+    boxes = _changed_boxes(previous["result"].get("rooms", []), record["result"].get("rooms", []))
+
+    def keep(layer, z, x, y):
+        box, scale = tile_bounds(info, z, x, y)
+        # Labels can spill outside a room's box, so give changed rooms some extra margin
+        margin = (OUTLINE_WIDTH + TILE_SIZE / 8) / scale
+        return not any(_intersects(box, bbox, margin) for bbox in boxes)
+
+    kept, dropped = _tile_cache.carry_over(record["id"], previous["version"], record["version"], keep)
+    if kept or dropped:
+        print(f"Tile cache for {record['id']} v{record['version']}: kept {kept}, invalidated {dropped}")
+
+
+add_listener(_on_analysis_saved)
@@ -0,0 +1,235 @@
+"""
+Near-duplicate lookup for re-scanned or re-exported blueprints.
+
+A new scan, a different JPEG quality or a PNG export of the same plan has
+different bytes but almost the same difference hash (dHash). Hashes of stored
+analyses are kept in a BK-tree so we can find every previous analysis within
+a Hamming distance without comparing against all of them.
+
+The hash only nominates candidates: a plan with one extra wall, or the same
+layout on another floor, hashes within a few bits. A candidate is reused only
+if it carries the same region / facility / floor labels and a pixel diff
+against its stored reference image (revisionDiff) finds no changed region.
+Its rooms are then rescaled to the new image size and returned instead of
+paying for a fresh Gemini analysis.
+
+The tree is built from the store on first use and then kept up to date by
+this instance's store listener plus, every CATCH_UP_INTERVAL seconds, the
+analyses other instances stored since the last check (as the portfolio
+rollups do).
+"""
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from analysisStore import LABEL_FIELDS, add_listener, iter_analyses, load_analysis, load_reference_image
+from revisionDiff import align_revision, changed_regions
+
+# --- 1. CONFIGURATION ---
+HASH_SIZE = 16                  # 16x16 gradient grid -> 256 bit hash
+REUSE_MAX_DISTANCE = 3          # bits; re-encodes land here, one added wall already moves 4-9
+MAX_ASPECT_RATIO_DRIFT = 0.02   # reject matches whose aspect ratio differs by more than 2%
+MAX_CANDIDATES = 3              # pixel diffs tried per upload, closest hashes first
+CATCH_UP_INTERVAL = 5.0         # seconds between checks for analyses saved by other instances
+
+
+# --- 2. HASHING ---
+def compute_dhash(image):
+    """
+    Difference hash of an image.
+
+    Args:
+        image (PIL.Image.Image): The uploaded blueprint.
+
+    Returns:
+        str: Hex string of HASH_SIZE * HASH_SIZE bits.
+    """
+    gray = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    value = int("".join("1" if b else "0" for b in bits), 2)
+    return f"{value:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+# --- 3. BK-TREE ---
+class BKTree:
+    """BK-tree over hex hashes using Hamming distance. Each node is [hash, ids, children]."""
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, phash, analysis_id):
+        self.size += 1
+        if self.root is None:
+            self.root = [phash, [analysis_id], {}]
+            return
+
+        node = self.root
+        while True:
+            distance = hamming_distance(phash, node[0])
+            if distance == 0:
+                node[1].append(analysis_id)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [phash, [analysis_id], {}]
+                return
+            node = child
+
+    def search(self, phash, max_distance):
+        """Returns [(distance, analysis_id)] within max_distance, closest first."""
+        matches = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(phash, node[0])
+            if distance <= max_distance:
+                matches.extend((distance, analysis_id) for analysis_id in node[1])
+            # Triangle inequality: only children in this band can be within range
+            for child_distance, child in node[2].items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+
+# --- 4. INDEX ---
+class PhashIndex:
+    """The BK-tree plus what it has seen: indexed ids and the store watermark of the last catch-up."""
+
+    def __init__(self):
+        self.tree = BKTree()
+        self.indexed = set()
+        self.watermark = None
+        self.checked_at = 0.0
+
+    def add(self, record):
+        # Edits bump updated_at but keep the image, so an analysis is only ever added once
+        if record["id"] in self.indexed or not record["image"].get("phash"):
+            return
+        self.tree.add(record["image"]["phash"], record["id"])
+        self.indexed.add(record["id"])
+
+    def catch_up(self):
+        for record in iter_analyses(updated_after=self.watermark):
+            self.add(record)
+            self.watermark = max(self.watermark or 0.0, record["updated_at"])
+        self.checked_at = time.time()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _on_analysis_saved(record, previous):
+    if previous is None and _index is not None:
+        with _index_lock:
+            _index.add(record)
+
+
+add_listener(_on_analysis_saved)
+
+
+def _get_index():
+    """Builds the BK-tree from the analysis store on first use, and catches up with other instances."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PhashIndex()
+            _index.catch_up()
+        elif time.time() - _index.checked_at > CATCH_UP_INTERVAL:
+            _index.catch_up()
+        return _index.tree
+
+
+def _scale_room(room, scale_x, scale_y):
+    room = dict(room)
+    coords = room.get("coords")
+    if coords:
+        coords = dict(coords)
+        for key in ("x", "w", "cx"):
+            if key in coords:
+                coords[key] = round(coords[key] * scale_x, 1)
+        for key in ("y", "h", "cy"):
+            if key in coords:
+                coords[key] = round(coords[key] * scale_y, 1)
+        if "r" in coords:
+            coords["r"] = round(coords["r"] * (scale_x + scale_y) / 2, 1)
+        room["coords"] = coords
+    if room.get("points"):
+        room["points"] = [[round(x * scale_x, 1), round(y * scale_y, 1)] for x, y in room["points"]]
+    # calculated_area and walls are in real-world units, so they carry over unchanged
+    return room
+
+
+def _same_labels(record, labels):
+    stored = record.get("labels") or {}
+    return all((stored.get(field) or None) == ((labels or {}).get(field) or None) for field in LABEL_FIELDS)
+
+
+def _pixels_match(analysis_id, image):
+    """True if the stored reference image and the upload differ in no region (see revisionDiff)."""
+    reference = load_reference_image(analysis_id)
+    if reference is None:
+        return False
+    alignment = align_revision(reference, image)
+    return alignment is not None and not changed_regions(reference, alignment["aligned"])
+
+
+def find_reusable_analysis(phash, image, labels=None, kinds=None):
+    """
+    Looks for a previous analysis of the same plan.
+
+    Reuse policy: the match must be within REUSE_MAX_DISTANCE bits and
+    MAX_ASPECT_RATIO_DRIFT, carry the same labels, and its reference image
+    must show no changed region after alignment. At most MAX_CANDIDATES
+    candidates are diffed.
+
+    Args:
+        phash (str): compute_dhash() of the new upload.
+        image (PIL.Image.Image): The new upload.
+        labels (dict, optional): Region / facility / floor labels of the new upload.
+        kinds (list, optional): Only reuse analyses produced by these endpoints.
+
+    Returns:
+        dict: {"rooms": [...], "reuse": {...}} with rooms rescaled to the new
+        image, or None if nothing qualifies.
+    """
+    width, height = image.size
+    candidates = 0
+    for distance, analysis_id in _get_index().search(phash, REUSE_MAX_DISTANCE):
+        record = load_analysis(analysis_id)
+        if record is None or (kinds and record["kind"] not in kinds) or not _same_labels(record, labels):
+            continue
+
+        source = record["image"]
+        if not source.get("width") or not source.get("height"):
+            continue
+        drift = abs((width / height) / (source["width"] / source["height"]) - 1)
+        if drift > MAX_ASPECT_RATIO_DRIFT:
+            continue
+
+        if candidates >= MAX_CANDIDATES:
+            break
+        candidates += 1
+        if not _pixels_match(analysis_id, image):
+            continue
+
+        scale_x, scale_y = width / source["width"], height / source["height"]
+        return {
+            "rooms": [_scale_room(room, scale_x, scale_y) for room in record["result"].get("rooms", [])],
+            "reuse": {
+                "source_analysis_id": analysis_id,
+                "hamming_distance": distance,
+                "aspect_ratio_drift": round(drift, 4),
+                "verified": "pixel_diff"
+            }
+        }
+
+    return None
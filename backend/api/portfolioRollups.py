@@ -0,0 +1,337 @@
+"""
+Materialized square-footage rollups across the portfolio.
+
+Every categorized analysis contributes (area, room count) to cells keyed by
+region, facility, floor, category and period (month the analysis was made).
+The cells live in NumPy arrays, so range and group-by queries are a few
+vectorised passes over a table with one row per cell, not a rescan of every
+stored analysis.
+
+Only categorized analyses (results with a category_summary) that carry a
+facility label count; detection-only results and unlabeled uploads are left
+out, since nothing ties an unlabeled re-scan to the floor it shows.
+Revisions inherit their source's labels. Each (region, facility, floor)
+counts once per period: a newer categorized analysis of the same floor in the
+same month replaces the older one's contribution, while analyses from
+earlier months keep theirs, so grouping by period shows the floor over time.
+Editing an analysis swaps its old contribution for the new one. A total over
+several months adds each month's figures; filter or group by period for a
+point-in-time view.
+
+Updates arrive through the analysis store listener; queries also pick up
+analyses written by other instances since the last watermark. Changed slots
+are appended to a journal next to the snapshot, which is only rewritten
+(and the journal emptied) every JOURNAL_COMPACT_LINES changes.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from analysisStore import ANALYSIS_STORE_DIR, add_listener, iter_analyses
+
+# --- 1. CONFIGURATION ---
+DIMENSIONS = ("region", "facility", "floor", "category", "period")
+SNAPSHOT_PATH = os.path.join(ANALYSIS_STORE_DIR, "rollups.snapshot")
+JOURNAL_PATH = SNAPSHOT_PATH + ".journal"
+JOURNAL_COMPACT_LINES = 500
+# Bumped when slot keys change; a snapshot or journal of another format is discarded and rebuilt
+ROLLUP_FORMAT = 2
+CATCH_UP_INTERVAL = 5.0   # seconds between checks for analyses saved by other instances
+INITIAL_CAPACITY = 1024
+
+
+def _period(timestamp):
+    """Months since year 0, so period ranges are plain integer comparisons."""
+    date = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    return date.year * 12 + date.month - 1
+
+
+def period_label(period):
+    return f"{period // 12:04d}-{period % 12 + 1:02d}"
+
+
+def parse_period(label):
+    """'2026-03' -> period index. Raises ValueError for anything else."""
+    year, month = label.split("-")
+    if not 1 <= int(month) <= 12:
+        raise ValueError(f"Invalid month in period '{label}'")
+    return int(year) * 12 + int(month) - 1
+
+
+# --- 2. CELL TABLE ---
+class RollupTable:
+    """Cells of (region, facility, floor, category, period) -> area and room count."""
+
+    def __init__(self):
+        self._values = {d: [] for d in DIMENSIONS if d != "period"}   # code -> label
+        self._codes = {d: {} for d in DIMENSIONS if d != "period"}    # label -> code
+        self._rows = {}
+        self._size = 0
+        self._columns = {d: np.zeros(INITIAL_CAPACITY, dtype=np.int32) for d in DIMENSIONS}
+        self._area = np.zeros(INITIAL_CAPACITY, dtype=np.float64)
+        self._rooms = np.zeros(INITIAL_CAPACITY, dtype=np.int64)
+
+    def _code(self, dimension, value):
+        codes = self._codes[dimension]
+        if value not in codes:
+            codes[value] = len(self._values[dimension])
+            self._values[dimension].append(value)
+        return codes[value]
+
+    def add(self, key, area, rooms):
+        """key is (region, facility, floor, category, period); negative values subtract."""
+        codes = tuple(self._code(d, v) for d, v in zip(DIMENSIONS[:-1], key[:-1])) + (key[-1],)
+        row = self._rows.get(codes)
+        if row is None:
+            if self._size == len(self._area):
+                self._grow()
+            row = self._size
+            self._size += 1
+            self._rows[codes] = row
+            for dimension, code in zip(DIMENSIONS, codes):
+                self._columns[dimension][row] = code
+        self._area[row] += area
+        self._rooms[row] += rooms
+
+    def _grow(self):
+        capacity = len(self._area) * 2
+        self._columns = {d: np.resize(c, capacity) for d, c in self._columns.items()}
+        self._area = np.concatenate([self._area, np.zeros(capacity - len(self._area))])
+        self._rooms = np.concatenate([self._rooms, np.zeros(capacity - len(self._rooms), dtype=np.int64)])
+
+    def query(self, group_by, filters=None, period_from=None, period_to=None):
+        """
+        Sums area and rooms over the matching cells, grouped by the given dimensions.
+
+        Args:
+            group_by (list): Dimensions to group by (subset of DIMENSIONS). Empty for a grand total.
+            filters (dict, optional): Dimension -> list of accepted labels.
+            period_from / period_to (int, optional): Inclusive period range.
+
+        Returns:
+            list: {<dimension>: label, ..., "area_sq_ft", "rooms"} sorted by area, largest first.
+        """
+        n = self._size
+        mask = self._rooms[:n] > 0
+        for dimension, accepted in (filters or {}).items():
+            codes = [self._codes[dimension][v] for v in accepted if v in self._codes[dimension]]
+            mask &= np.isin(self._columns[dimension][:n], codes)
+        if period_from is not None:
+            mask &= self._columns["period"][:n] >= period_from
+        if period_to is not None:
+            mask &= self._columns["period"][:n] <= period_to
+
+        rows = np.nonzero(mask)[0]
+        if len(rows) == 0:
+            return []
+        if group_by:
+            keys = np.stack([self._columns[d][rows] for d in group_by], axis=1)
+            groups, inverse = np.unique(keys, axis=0, return_inverse=True)
+            inverse = inverse.reshape(-1)
+        else:
+            groups, inverse = np.zeros((1, 0), dtype=np.int32), np.zeros(len(rows), dtype=np.int64)
+        areas = np.bincount(inverse, weights=self._area[rows], minlength=len(groups))
+        rooms = np.bincount(inverse, weights=self._rooms[rows], minlength=len(groups))
+
+        results = []
+        for group, area, count in zip(groups, areas, rooms):
+            entry = {}
+            for dimension, code in zip(group_by, group):
+                entry[dimension] = period_label(int(code)) if dimension == "period" else self._values[dimension][code]
+            entry["area_sq_ft"] = round(float(area), 2)
+            entry["rooms"] = int(count)
+            results.append(entry)
+        return sorted(results, key=lambda e: -e["area_sq_ft"])
+
+
+# --- 3. INCREMENTAL MAINTENANCE ---
+def _contribution(record):
+    """Cells one analysis adds to: [[region, facility, floor, category, period, area, rooms], ...]."""
+    labels = record.get("labels") or {}
+    period = _period(record["created_at"])
+    totals = {}
+    for room in (record.get("result") or {}).get("rooms", []):
+        category = room.get("category")
+        if not category:
+            continue
+        area, count = totals.get(category, (0.0, 0))
+        totals[category] = (area + float(room.get("calculated_area") or 0), count + 1)
+    return [[labels.get("region") or "", labels.get("facility") or "", labels.get("floor") or "", category, period, area, count]
+            for category, (area, count) in totals.items()]
+
+
+def _slot_of(record):
+    """JSON [region, facility, floor, period] of the slot a record counts in, or None if it does not count."""
+    labels = record.get("labels") or {}
+    if not labels.get("facility") or "category_summary" not in (record.get("result") or {}):
+        return None
+    return json.dumps([labels.get("region") or "", labels["facility"], labels.get("floor") or "",
+                       _period(record["created_at"])])
+
+
+class PortfolioRollups:
+    def __init__(self):
+        self.table = RollupTable()
+        self.slots = {}              # _slot_of() key -> {"analysis_id", "created_at", "cells"}
+        self.watermark = None
+        self.checked_at = 0.0
+        self.journal_lines = 0
+        self._changed = []           # slots applied since the last persist()
+
+    def _set_slot(self, slot, state):
+        current = self.slots.get(slot)
+        if current:
+            for *key, area, rooms in current["cells"]:
+                self.table.add(tuple(key), -area, -rooms)
+        for *key, area, rooms in state["cells"]:
+            self.table.add(tuple(key), area, rooms)
+        self.slots[slot] = state
+
+    def apply(self, record):
+        self.watermark = max(self.watermark or 0.0, record["updated_at"])
+        slot = _slot_of(record)
+        if slot is None:
+            return
+        current = self.slots.get(slot)
+        if current and current["analysis_id"] != record["id"] and current["created_at"] > record["created_at"]:
+            # An older plan of a floor that was re-analysed later in the same month
+            return
+        self._set_slot(slot, {"analysis_id": record["id"], "created_at": record["created_at"],
+                              "cells": _contribution(record)})
+        self._changed.append(slot)
+
+    def catch_up(self):
+        for record in iter_analyses(updated_after=self.watermark):
+            self.apply(record)
+        self.checked_at = time.time()
+
+    # --- Persistence: snapshot + append-only journal of changed slots ---
+    def persist(self):
+        """Appends the slots changed since the last call to the journal; compacts it when long."""
+        if not self._changed:
+            return
+        os.makedirs(os.path.dirname(JOURNAL_PATH), exist_ok=True)
+        with open(JOURNAL_PATH, "a") as f:
+            for slot in dict.fromkeys(self._changed):
+                f.write(json.dumps({"format": ROLLUP_FORMAT, "slot": slot, "state": self.slots[slot],
+                                    "watermark": self.watermark}) + "\n")
+                self.journal_lines += 1
+        self._changed = []
+        if self.journal_lines >= JOURNAL_COMPACT_LINES:
+            self.save_snapshot()
+
+    def save_snapshot(self):
+        os.makedirs(os.path.dirname(SNAPSHOT_PATH), exist_ok=True)
+        tmp_path = SNAPSHOT_PATH + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"format": ROLLUP_FORMAT, "watermark": self.watermark, "slots": self.slots}, f)
+        os.replace(tmp_path, SNAPSHOT_PATH)
+        # Journal lines are whole slot states, so replaying some of them over this snapshot is harmless
+        try:
+            os.remove(JOURNAL_PATH)
+        except FileNotFoundError:
+            pass
+        self.journal_lines = 0
+        self._changed = []
+
+    @classmethod
+    def load(cls):
+        """Restores from the snapshot and journal (if any), then applies analyses newer than them."""
+        rollups = cls()
+        slots, watermark = {}, None
+        try:
+            with open(SNAPSHOT_PATH) as f:
+                snapshot = json.load(f)
+            if snapshot.get("format") == ROLLUP_FORMAT:
+                slots, watermark = snapshot["slots"], snapshot["watermark"]
+        except (FileNotFoundError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Ignoring unreadable rollup snapshot: {e}")
+        try:
+            with open(JOURNAL_PATH) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue   # a line cut short by a crash
+                    if entry.get("format") != ROLLUP_FORMAT:
+                        continue
+                    slots[entry["slot"]] = entry["state"]
+                    watermark = max(watermark or 0.0, entry["watermark"] or 0.0)
+                    rollups.journal_lines += 1
+        except FileNotFoundError:
+            pass
+
+        for slot, state in slots.items():
+            rollups._set_slot(slot, state)
+        rollups.watermark = watermark
+        rollups.catch_up()
+        return rollups
+
+
+_rollups = None
+_rollups_lock = threading.Lock()
+
+
+def _persist():
+    try:
+        _rollups.persist()
+    except OSError as e:
+        print(f"Could not save rollups: {e}")
+
+
+def _on_analysis_saved(record, previous):
+    if _rollups is not None:
+        with _rollups_lock:
+            _rollups.apply(record)
+            _persist()
+
+
+add_listener(_on_analysis_saved)
+
+
+def _get_rollups():
+    """Loads the rollups on first use, and catches up with other instances every few seconds."""
+    global _rollups
+    with _rollups_lock:
+        if _rollups is None:
+            _rollups = PortfolioRollups.load()
+            _persist()
+        elif time.time() - _rollups.checked_at > CATCH_UP_INTERVAL:
+            _rollups.catch_up()
+            _persist()
+        return _rollups
+
+
+# --- 4. QUERIES ---
+def query_rollups(group_by=("category",), filters=None, period_from=None, period_to=None):
+    """
+    Category square footage across the portfolio.
+
+    Args:
+        group_by (tuple): Dimensions to group by, from DIMENSIONS.
+        filters (dict, optional): Dimension -> list of labels to keep.
+        period_from / period_to (str, optional): Inclusive "YYYY-MM" range of
+            when the counted analyses were made.
+
+    Returns:
+        dict: {"groups": [...], "total": {"area_sq_ft", "rooms"}}
+    """
+    for dimension in group_by:
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension '{dimension}', expected one of {list(DIMENSIONS)}")
+    for dimension in filters or {}:
+        if dimension not in DIMENSIONS or dimension == "period":
+            raise ValueError(f"Cannot filter on '{dimension}'; filter periods with period_from / period_to")
+    period_from = parse_period(period_from) if period_from else None
+    period_to = parse_period(period_to) if period_to else None
+
+    rollups = _get_rollups()
+    with _rollups_lock:
+        groups = rollups.table.query(list(group_by), filters, period_from, period_to)
+        total = rollups.table.query([], filters, period_from, period_to)
+    return {"groups": groups, "total": total[0] if total else {"area_sq_ft": 0.0, "rooms": 0}}
@@ -0,0 +1,81 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import sys
+import time
+from dotenv import load_dotenv
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from accessTokens import check_access
+from portfolioRollups import DIMENSIONS, query_rollups
+from requestProfiler import profiled
+
+load_dotenv()
+
+# --- 2. CONFIGURATION ---
+# Totals span every labeled facility; disabled until a token is configured
+ROLLUPS_TOKEN = os.getenv("ROLLUPS_TOKEN")
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    Portfolio square footage by category.
+
+    GET ?groupBy=region,category&facility=HQ&facility=Annex&from=2026-01&to=2026-06
+
+    groupBy defaults to category. region / facility / floor / category
+    parameters filter (repeat them for several values); from / to limit the
+    months in which the counted analyses were made.
+
+    Requires "Authorization: Bearer <ROLLUPS_TOKEN>" and answers 403 while
+    no token is configured.
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- GET REQUEST ---
+    @profiled
+    def do_GET(self):
+        try:
+            # 1. Check access
+            if not check_access(self, ROLLUPS_TOKEN, "ROLLUPS_TOKEN"):
+                return
+
+            # 2. Parse parameters
+            query = parse_qs(urlparse(self.path).query)
+            group_by = [d for d in query.get("groupBy", ["category"])[0].split(",") if d]
+            filters = {d: query[d] for d in DIMENSIONS if d != "period" and d in query}
+
+            # 3. Query the materialized rollups
+            start = time.perf_counter()
+            try:
+                data = query_rollups(group_by, filters, query.get("from", [None])[0], query.get("to", [None])[0])
+            except ValueError as e:
+                self._send_json({"error": str(e)}, 400)
+                return
+            data["query_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+            self._send_json(data, 200)
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _send_json(self, data, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
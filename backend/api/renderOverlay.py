@@ -0,0 +1,105 @@
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import json
+import os
+import sys
+from dotenv import load_dotenv
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from analysisStore import load_analysis
+from overlayTiles import get_tile, get_tile_cache_metrics, pyramid_info
+from requestProfiler import profiled
+
+load_dotenv()
+
+# --- 2. CONFIGURATION ---
+# Tile URLs carry the analysis version, so a versioned tile never changes
+VERSIONED_CACHE_CONTROL = "public, max-age=86400, immutable"
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    Category overlay tiles for a stored analysis.
+
+    GET ?analysisId=<id>                      -> pyramid info and tile URL template
+    GET ?analysisId=<id>&v=<version>&layer=overlay|composite&z=&x=&y=  -> PNG tile
+
+    'overlay' tiles are transparent rooms to draw over the blueprint the
+    client already has; 'composite' tiles include the plan itself.
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- GET REQUEST ---
+    @profiled
+    def do_GET(self):
+        try:
+            # 1. Parse parameters
+            query = parse_qs(urlparse(self.path).query)
+            analysis_id = query.get("analysisId", [None])[0]
+            if analysis_id is None:
+                self._send_json({"status": "Overlay Tile API is online", "tileCache": get_tile_cache_metrics()}, 200)
+                return
+
+            record = load_analysis(analysis_id)
+            if record is None:
+                self._send_json({"error": f"Unknown analysis {analysis_id}"}, 404)
+                return
+            info = pyramid_info(record)
+            if info is None:
+                self._send_json({"error": "Analysis has no image dimensions"}, 409)
+                return
+
+            # 2. Pyramid info
+            if "z" not in query:
+                info["version"] = record["version"]
+                info["tileUrl"] = (f"/api/renderOverlay?analysisId={analysis_id}&v={record['version']}"
+                                   "&layer={layer}&z={z}&x={x}&y={y}")
+                self._send_json(info, 200)
+                return
+
+            # 3. Tile
+            try:
+                z, x, y = (int(query[k][0]) for k in ("z", "x", "y"))
+            except (KeyError, ValueError):
+                self._send_json({"error": "z, x and y must be integers"}, 400)
+                return
+            layer = query.get("layer", ["overlay"])[0]
+
+            tile, hit = get_tile(record, layer, z, x, y)
+            if tile is None:
+                self._send_json({"error": "Tile out of range"}, 404)
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(tile)))
+            self.send_header('Access-Control-Allow-Origin', '*')
+            # An old version in the URL still gets the current tile, which must not be cached as that version
+            versioned = query.get("v", [None])[0] == str(record["version"])
+            self.send_header('Cache-Control', VERSIONED_CACHE_CONTROL if versioned else 'no-cache')
+            self.send_header('X-Tile-Cache', 'hit' if hit else 'miss')
+            self.end_headers()
+            self.wfile.write(tile)
+
+        except Exception as e:
+            print(f"Server Error: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _send_json(self, data, status_code):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
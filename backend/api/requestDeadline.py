@@ -0,0 +1,103 @@
+"""
+Per-request deadlines.
+
+Each request gets a Deadline when its handler starts. The budget is the
+client's X-Request-Timeout-Ms header (how long it will wait), capped at the
+platform limit PLATFORM_TIMEOUT, minus RESPONSE_MARGIN to write the answer.
+PLATFORM_TIMEOUT is only known when FUNCTION_MAX_DURATION is set; without it
+and without the header the deadline is unbounded and model calls get no
+timeout, as before deadlines existed.
+
+Pipeline stages use it in three ways:
+
+- deadline.timeout() is passed to call_gemini_api, so no model call outlives
+  the request. It raises DeadlineExceeded when too little time is left to
+  start one.
+- deadline.check(stage) before a required stage raises DeadlineExceeded.
+- deadline.allows(stage, estimate) before an optional stage (refinement,
+  escalation retries) says whether it fits, and records the skip.
+
+Endpoints catch DeadlineExceeded and answer with what they have, marked
+"incomplete", instead of a late 500 nobody receives.
+"""
+import math
+import os
+import time
+
+# --- 1. CONFIGURATION ---
+# The function's maxDuration on the platform; the request is killed after this. Unset: no limit
+PLATFORM_TIMEOUT = float(os.getenv("FUNCTION_MAX_DURATION")) if os.getenv("FUNCTION_MAX_DURATION") else None
+RESPONSE_MARGIN = 1.5       # seconds kept back to serialize and send the response
+MIN_CALL_TIMEOUT = 2.0      # a model call with less time than this cannot finish; don't start it
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before `stage` could run."""
+
+    def __init__(self, stage, deadline=None):
+        super().__init__(f"Deadline reached before {stage}")
+        self.stage = stage
+        self.deadline = deadline
+
+
+class Deadline:
+    def __init__(self, budget, source):
+        self.budget = budget    # None: unbounded
+        self.source = source
+        self.expires_at = None if budget is None else time.monotonic() + budget - RESPONSE_MARGIN
+        self.skipped = []
+
+    @classmethod
+    def from_headers(cls, headers):
+        """Budget from the client header if it is shorter than the platform limit (if one is set)."""
+        try:
+            requested = float(headers.get(DEADLINE_HEADER)) / 1000
+        except (TypeError, ValueError):
+            requested = None
+        if requested is not None and 0 < requested and (PLATFORM_TIMEOUT is None or requested < PLATFORM_TIMEOUT):
+            return cls(requested, "client")
+        if PLATFORM_TIMEOUT is not None:
+            return cls(PLATFORM_TIMEOUT, "platform")
+        return cls(None, "none")
+
+    def remaining(self):
+        if self.expires_at is None:
+            return math.inf
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def check(self, stage):
+        if self.expired():
+            raise DeadlineExceeded(stage, self)
+
+    def timeout(self, stage="model call"):
+        """Seconds a model call may take, for call_gemini_api(timeout=...). None when unbounded."""
+        if self.expires_at is None:
+            return None
+        remaining = self.remaining()
+        if remaining < MIN_CALL_TIMEOUT:
+            raise DeadlineExceeded(stage, self)
+        return remaining
+
+    def allows(self, stage, estimate):
+        """True if an optional stage expected to take `estimate` seconds still fits."""
+        if self.remaining() >= estimate:
+            return True
+        self.skip(stage, f"{self.remaining():.1f}s left, needs ~{estimate:.1f}s")
+        return False
+
+    def skip(self, stage, reason="deadline"):
+        """Records a stage that was left out (or cut short) for lack of time."""
+        print(f"Skipping {stage}: {reason}")
+        self.skipped.append(stage)
+
+    def summary(self):
+        return {
+            "budget_ms": None if self.budget is None else round(self.budget * 1000),
+            "source": self.source,
+            "remaining_ms": None if self.expires_at is None else round(max(0.0, self.remaining()) * 1000),
+            "skipped_stages": list(self.skipped)
+        }
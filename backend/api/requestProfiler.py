@@ -0,0 +1,224 @@
+"""
+Opt-in profiling of individual production requests.
+
+Decorate a handler method with @profiled. When PROFILE_TOKEN is not set the
+decorator returns the method unchanged, so there is no overhead at all.
+When it is set, a request is profiled if it sends the header
+"X-Profile: <PROFILE_TOKEN>", or at random with probability
+PROFILE_SAMPLE_RATE.
+
+A profiled request runs under cProfile and tracemalloc. Its artifacts are
+stored under PROFILE_DIR, keyed by a request id that is returned in the
+X-Profile-Id response header:
+
+    <id>.prof   raw cProfile stats (open with pstats or snakeviz)
+    <id>.json   summary: wall time, time per package (email, PIL, base64,
+                openai, json, ...), top functions and top allocation sites
+
+Fetch them through the getProfile endpoint. cProfile only sees the request
+thread; work done in helper threads shows up as time spent waiting on them.
+Allocations are traced process wide, so requests running at the same time
+show up in each other's allocation lists. Only one request per process is
+profiled at a time (from Python 3.12 a second cProfile cannot be enabled
+while one is active); a request that asks while another is being profiled
+runs unprofiled and gets no X-Profile-Id.
+"""
+import cProfile
+import functools
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+from accessTokens import bearer_matches
+
+# --- 1. CONFIGURATION ---
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/ocelot-profiles")
+PROFILE_MAX_ARTIFACTS = 200     # oldest profiles are deleted beyond this
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 5
+
+# tracemalloc is process wide; it stays on while any profiled request is running
+_tracing_lock = threading.Lock()
+_tracing_requests = 0
+# Held while a request runs under cProfile
+_profiling_lock = threading.Lock()
+
+
+def is_authorized(headers, header_name="Authorization"):
+    """True if PROFILE_TOKEN is configured and the request carries it as a bearer token."""
+    return bearer_matches(headers, PROFILE_TOKEN, header_name)
+
+
+def _should_profile(headers):
+    supplied = headers.get("X-Profile")
+    if supplied and hmac.compare_digest(supplied.encode("utf-8"), PROFILE_TOKEN.encode("utf-8")):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+# --- 2. ARTIFACTS ---
+def _package_of(filename):
+    """Groups a code location into something readable: a library, a stdlib module or one of our files."""
+    path = filename.replace("\\", "/")
+    if "site-packages/" in path:
+        return path.split("site-packages/", 1)[1].split("/", 1)[0].split(".", 1)[0]
+    if path.startswith("~") or path.startswith("<"):
+        return "builtins"
+    name = os.path.basename(path)
+    if "/lib/python" in path:
+        parts = path.split("/lib/python", 1)[1].split("/")
+        return parts[1].split(".")[0] if len(parts) > 1 else name
+    return name
+
+
+def _summarize(profiler, snapshot, peak, request_id, endpoint, path, started_at, wall_time):
+    stats = pstats.Stats(profiler)
+
+    by_package = {}
+    for (filename, _line, _name), (_cc, _nc, tottime, _cumtime, _callers) in stats.stats.items():
+        package = _package_of(filename)
+        by_package[package] = by_package.get(package, 0.0) + tottime
+
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+
+    allocations = []
+    for stat in snapshot.statistics("traceback")[:TOP_ALLOCATIONS]:
+        frame = stat.traceback[0]
+        allocations.append({"file": frame.filename, "line": frame.lineno, "size_kib": round(stat.size / 1024, 1),
+                            "count": stat.count, "traceback": stat.traceback.format()})
+
+    return {
+        "id": request_id,
+        "endpoint": endpoint,
+        "path": path,
+        "started_at": started_at,
+        "wall_time_s": round(wall_time, 4),
+        "cpu_time_by_package_s": {k: round(v, 4) for k, v in sorted(by_package.items(), key=lambda kv: -kv[1])},
+        "peak_traced_memory_kib": round(peak / 1024, 1),
+        "top_allocations": allocations,
+        "top_functions": text.getvalue()
+    }
+
+
+def _prune():
+    entries = sorted((os.path.getmtime(os.path.join(PROFILE_DIR, n)), n)
+                     for n in os.listdir(PROFILE_DIR) if n.endswith(".json"))
+    for _mtime, name in entries[:-PROFILE_MAX_ARTIFACTS]:
+        for suffix in (".json", ".prof"):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name[:-len(".json")] + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def load_profile(request_id, kind="json"):
+    """Returns the stored summary (dict) or raw .prof bytes, or None if unknown."""
+    if not request_id or not all(c in "0123456789abcdef" for c in request_id):
+        return None
+    try:
+        if kind == "prof":
+            with open(os.path.join(PROFILE_DIR, f"{request_id}.prof"), "rb") as f:
+                return f.read()
+        with open(os.path.join(PROFILE_DIR, f"{request_id}.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    """Most recent profiles first: id, endpoint, wall time."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        if name.endswith(".json"):
+            summary = load_profile(name[:-len(".json")])
+            if summary:
+                profiles.append({k: summary[k] for k in ("id", "endpoint", "path", "started_at", "wall_time_s")})
+    return sorted(profiles, key=lambda p: -p["started_at"])
+
+
+# --- 3. DECORATOR ---
+def _start_tracing():
+    global _tracing_requests
+    with _tracing_lock:
+        if _tracing_requests == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        _tracing_requests += 1
+
+
+def _stop_tracing():
+    global _tracing_requests
+    with _tracing_lock:
+        snapshot = tracemalloc.take_snapshot()
+        _current, peak = tracemalloc.get_traced_memory()
+        _tracing_requests -= 1
+        if _tracing_requests == 0:
+            tracemalloc.stop()
+    return snapshot, peak
+
+
+def profiled(method):
+    """Profiles a BaseHTTPRequestHandler do_GET / do_POST when the request asks for it."""
+    if not PROFILE_TOKEN:
+        return method
+
+    @functools.wraps(method)
+    def wrapper(self):
+        if not _should_profile(self.headers):
+            return method(self)
+        if not _profiling_lock.acquire(blocking=False):
+            print("Not profiling: another request is being profiled")
+            return method(self)
+        try:
+            return _profile(self, method)
+        finally:
+            _profiling_lock.release()
+
+    return wrapper
+
+
+def _profile(handler, method):
+    """Runs method(handler) under cProfile and tracemalloc and stores the artifacts."""
+    request_id = uuid.uuid4().hex
+    send_response = handler.send_response
+
+    def send_response_with_id(code, message=None):
+        send_response(code, message)
+        handler.send_header('X-Profile-Id', request_id)
+        handler.send_header('Access-Control-Expose-Headers', 'X-Profile-Id')
+    handler.send_response = send_response_with_id
+
+    profiler = cProfile.Profile()
+    _start_tracing()
+    started_at, start = time.time(), time.perf_counter()
+    try:
+        profiler.enable()
+        return method(handler)
+    finally:
+        profiler.disable()
+        wall_time = time.perf_counter() - start
+        snapshot, peak = _stop_tracing()
+        del handler.send_response
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, f"{request_id}.prof"))
+            summary = _summarize(profiler, snapshot, peak, request_id, type(handler).__module__,
+                                 handler.path, started_at, wall_time)
+            with open(os.path.join(PROFILE_DIR, f"{request_id}.json"), "w") as f:
+                json.dump(summary, f)
+            _prune()
+            print(f"Profiled request {request_id} ({wall_time:.2f}s)")
+        except OSError as e:
+            print(f"Could not store profile {request_id}: {e}")
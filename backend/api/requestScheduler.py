@@ -0,0 +1,197 @@
+"""
+Priority scheduling and admission control for upstream Gemini calls.
+
+Every model has its own token bucket, and all models also draw from a shared
+project-wide bucket, since they share one Gemini quota. Waiting calls are
+served in priority order, so interactive validation (PRIORITY_INTERACTIVE)
+gets ahead of batch detection (PRIORITY_BATCH) when the quota is tight.
+
+A call is rejected up front with AdmissionRejected (the endpoints answer
+429 + Retry-After) when the queue is too deep or its estimated wait is
+longer than the limit for its priority.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+
+# --- 1. CONFIGURATION ---
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BATCH: "batch"}
+
+# Requests per second and burst size per model
+MODEL_RATE_LIMITS = {
+    "gemini-2.5-flash-lite": {"rate": 4.0, "burst": 8},
+    "gemini-2.5-flash": {"rate": 2.0, "burst": 4},
+    "gemini-3-pro-preview": {"rate": 0.5, "burst": 2},
+}
+DEFAULT_RATE_LIMIT = {"rate": 1.0, "burst": 2}
+
+# Shared across all models (project quota)
+GLOBAL_RATE_LIMIT = {"rate": 5.0, "burst": 10}
+
+MAX_QUEUE_DEPTH = 50
+
+# Longest estimated queue wait (seconds) we accept before answering 429
+MAX_ESTIMATED_WAIT = {
+    PRIORITY_INTERACTIVE: 10,
+    PRIORITY_BATCH: 60,
+}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a call is not admitted. retry_after is in whole seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, tokens_needed):
+        missing = tokens_needed - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+
+class RequestScheduler:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._buckets = {}
+        self._global_bucket = _TokenBucket(**GLOBAL_RATE_LIMIT)
+        self._queue = []  # heap of (priority, seq, model)
+        self._seq = itertools.count()
+        self._metrics = {
+            "admitted": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "queue_wait_ms": {PRIORITY_INTERACTIVE: [], PRIORITY_BATCH: []}
+        }
+
+    def _bucket(self, model):
+        if model not in self._buckets:
+            self._buckets[model] = _TokenBucket(**MODEL_RATE_LIMITS.get(model, DEFAULT_RATE_LIMIT))
+        return self._buckets[model]
+
+    def _refill(self, now):
+        self._global_bucket.refill(now)
+        for bucket in self._buckets.values():
+            bucket.refill(now)
+
+    def _estimate_wait(self, model, priority):
+        """Seconds until a new call would be served, counting only calls ahead of it."""
+        ahead_model = sum(1 for p, _, m in self._queue if m == model and p <= priority)
+        ahead_global = sum(1 for p, _, _m in self._queue if p <= priority)
+        return max(
+            self._bucket(model).seconds_until(ahead_model + 1),
+            self._global_bucket.seconds_until(ahead_global + 1)
+        )
+
+    def _next_runnable(self):
+        """Highest-priority queued entry whose model bucket has a token."""
+        for entry in sorted(self._queue):
+            if self._buckets[entry[2]].tokens >= 1:
+                return entry
+        return None
+
+    def acquire(self, model, priority=PRIORITY_BATCH, max_wait=None):
+        """
+        Blocks until the call may go upstream.
+
+        Args:
+            max_wait (float, optional): Caller's remaining deadline; a shorter
+                limit than the priority's MAX_ESTIMATED_WAIT.
+
+        Returns:
+            float: Seconds spent waiting in the queue.
+
+        Raises:
+            AdmissionRejected: If the queue is full or the wait would be too
+                long, estimated up front or measured while waiting (calls of
+                higher priority can keep overtaking a queued one).
+            TimeoutError: If the caller's max_wait ran out in the queue.
+        """
+        start = time.monotonic()
+        with self._cond:
+            self._refill(start)
+            estimated_wait = self._estimate_wait(model, priority)
+            priority_max_wait = MAX_ESTIMATED_WAIT.get(priority, MAX_ESTIMATED_WAIT[PRIORITY_BATCH])
+            caller_limited = max_wait is not None and max_wait < priority_max_wait
+            max_wait = priority_max_wait if max_wait is None else min(priority_max_wait, max_wait)
+
+            if len(self._queue) >= MAX_QUEUE_DEPTH or estimated_wait > max_wait:
+                self._metrics["rejected"] += 1
+                retry_after = max(1, math.ceil(estimated_wait))
+                raise AdmissionRejected(
+                    f"Upstream capacity exhausted for {model} "
+                    f"(queue depth {len(self._queue)}, estimated wait {estimated_wait:.1f}s)",
+                    retry_after
+                )
+
+            entry = (priority, next(self._seq), model)
+            heapq.heappush(self._queue, entry)
+
+            give_up_at = start + max_wait
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._global_bucket.tokens >= 1 and self._next_runnable() == entry:
+                    break
+                if now >= give_up_at:
+                    self._leave_queue(entry)
+                    self._metrics["timed_out"] += 1
+                    message = f"Waited {now - start:.1f}s in the queue for {model}"
+                    if caller_limited:
+                        raise TimeoutError(message)
+                    raise AdmissionRejected(message, max(1, math.ceil(self._estimate_wait(model, priority))))
+                wait = max(self._bucket(model).seconds_until(1), self._global_bucket.seconds_until(1), 0.01)
+                self._cond.wait(timeout=min(wait, give_up_at - now))
+
+            self._leave_queue(entry)
+            self._bucket(model).tokens -= 1
+            self._global_bucket.tokens -= 1
+
+            waited = time.monotonic() - start
+            self._metrics["admitted"] += 1
+            waits = self._metrics["queue_wait_ms"].setdefault(priority, [])
+            waits.append(round(waited * 1000, 1))
+            del waits[:-1000]  # keep a rolling window
+
+        return waited
+
+    def _leave_queue(self, entry):
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        # The next entry may be runnable now
+        self._cond.notify_all()
+
+    def metrics(self):
+        """Admission counters, current queue depth and queue-wait percentiles per priority."""
+        with self._cond:
+            waits = {}
+            for priority, samples in self._metrics["queue_wait_ms"].items():
+                ordered = sorted(samples)
+                waits[PRIORITY_NAMES.get(priority, str(priority))] = {
+                    "count": len(ordered),
+                    "p50_ms": ordered[len(ordered) // 2] if ordered else None,
+                    "p95_ms": ordered[int(len(ordered) * 0.95)] if ordered else None,
+                    "max_ms": ordered[-1] if ordered else None
+                }
+            return {
+                "admitted": self._metrics["admitted"],
+                "rejected": self._metrics["rejected"],
+                "timed_out": self._metrics["timed_out"],
+                "queue_depth": len(self._queue),
+                "queue_wait": waits
+            }
@@ -0,0 +1,187 @@
+"""
+Response caching for API results.
+
+- Analysis POSTs (detection, validation) are answered from a byte-bounded
+  in-memory LRU keyed by make_cache_key(): the SHA-256 of the uploaded
+  blueprint, the model, a hash of the prompts (prompt_version) and any
+  request options. A repeat upload is answered without calling the model
+  again. Entries that point at a stored analysis are dropped when that
+  analysis is edited (see analysisStore.add_listener). POST responses carry
+  no HTTP validators: browsers never revalidate a POST.
+- GETs (stored analyses through getAnalysis, health checks) carry a strong
+  ETag and Cache-Control from CACHE_POLICIES, and a request whose
+  If-None-Match holds the current ETag gets 304.
+
+X-Force-Analysis: 1 bypasses the server-side cache, as it does for
+near-duplicate reuse.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from analysisStore import add_listener
+
+# --- 1. CONFIGURATION ---
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# For GET responses
+CACHE_POLICIES = {
+    # Stored analyses: the browser keeps the body but must revalidate, since edits change it
+    "analysis": "private, no-cache",
+    # Metrics move all the time; revalidating is still cheaper than re-sending
+    "health": "no-cache",
+}
+
+
+# --- 2. KEYS & ETAGS ---
+def prompt_version(*parts):
+    """Short hash of prompt texts (and other pipeline settings), to put in cache keys."""
+    return hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:12]
+
+
+def make_cache_key(*parts):
+    """Key of a response fully determined by parts (JSON-serializable)."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def make_etag(*parts):
+    """Strong ETag for a GET response fully determined by parts."""
+    return f'"{make_cache_key(*parts)}"'
+
+
+def body_etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(headers, etag):
+    """True if the request's If-None-Match covers etag (weak comparison, as RFC 9110 asks for)."""
+    header = headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [c.strip() for c in header.split(",")]
+    return any((c[2:] if c.startswith("W/") else c) == etag for c in candidates)
+
+
+# --- 3. SERVER-SIDE CACHE ---
+class ResponseCache:
+    """Byte-bounded LRU of response bodies, keyed by make_cache_key()."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._bodies = OrderedDict()   # key -> (body, analysis id or None)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._bodies.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._bodies.move_to_end(etag)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, etag, body, analysis_id=None):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if etag in self._bodies:
+                self._bytes -= len(self._bodies.pop(etag)[0])
+            self._bodies[etag] = (body, analysis_id)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _etag, (evicted, _id) = self._bodies.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def drop_analysis(self, analysis_id):
+        with self._lock:
+            for etag in [e for e, (_body, aid) in self._bodies.items() if aid == analysis_id]:
+                self._bytes -= len(self._bodies.pop(etag)[0])
+
+    def metrics(self):
+        with self._lock:
+            return {"entries": len(self._bodies), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+_response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+
+def _on_analysis_saved(record, previous):
+    # An edited analysis must not be served from its pre-edit response
+    if previous is not None:
+        _response_cache.drop_analysis(record["id"])
+
+
+add_listener(_on_analysis_saved)
+
+
+def get_cached_response(key):
+    return _response_cache.get(key)
+
+
+def cache_response(key, body, analysis_id=None):
+    _response_cache.put(key, body, analysis_id)
+
+
+def get_response_cache_metrics():
+    return _response_cache.metrics()
+
+
+# --- 4. SENDING ---
+def _send_cache_headers(handler, etag, policy, extra_headers):
+    handler.send_header('ETag', etag)
+    handler.send_header('Cache-Control', CACHE_POLICIES[policy])
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    handler.send_header('Access-Control-Expose-Headers', 'ETag')
+    for name, value in (extra_headers or {}).items():
+        handler.send_header(name, value)
+
+
+def send_not_modified(handler, etag, policy, extra_headers=None):
+    handler.send_response(304)
+    _send_cache_headers(handler, etag, policy, extra_headers)
+    handler.end_headers()
+
+
+def send_json_body(handler, body):
+    """Sends an already serialized JSON body (e.g. a POST result from the cache) as a plain 200."""
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.send_header('Access-Control-Allow-Origin', '*')
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def send_cacheable_json(handler, body, etag, policy, extra_headers=None):
+    """
+    Answers a GET with a 200 JSON body, ETag and Cache-Control, or a bare 304
+    if the client's If-None-Match already has it.
+
+    Args:
+        handler (BaseHTTPRequestHandler): The request being answered.
+        body (bytes | dict): Serialized JSON, or data to serialize.
+        etag (str | None): Validator from make_etag(); None hashes the body.
+        policy (str): Key into CACHE_POLICIES.
+    """
+    if not isinstance(body, bytes):
+        body = json.dumps(body).encode('utf-8')
+    etag = etag or body_etag(body)
+    if etag_matches(handler.headers, etag):
+        send_not_modified(handler, etag, policy, extra_headers)
+        return
+
+    handler.send_response(200)
+    _send_cache_headers(handler, etag, policy, extra_headers)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
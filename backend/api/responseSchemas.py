@@ -0,0 +1,176 @@
+"""
+JSON schemas for Gemini structured output.
+
+These are passed to call_gemini_api(..., response_schema=...) so the model is
+constrained to the exact shape the frontend expects, instead of us spending
+prompt tokens on a hand-written JSON example.
+"""
+
+# --- 1. BUILDING BLOCKS ---
+WALL_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "sequence_order": {"type": "integer"},
+        "length": {"type": "number"},
+        "unit": {"type": "string"},
+        "note": {"type": "string"}
+    },
+    "required": ["sequence_order", "length", "unit"]
+}
+
+# 'rect' uses x/y/w/h, 'circle' uses cx/cy/r. 'polygon' rooms use 'points' instead.
+COORDS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "x": {"type": "number"},
+        "y": {"type": "number"},
+        "w": {"type": "number"},
+        "h": {"type": "number"},
+        "cx": {"type": "number"},
+        "cy": {"type": "number"},
+        "r": {"type": "number"}
+    }
+}
+
+POINT_SCHEMA = {
+    "type": "array",
+    "items": {"type": "number"}
+}
+
+ROOM_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer"},
+        "name": {"type": "string"},
+        "type": {"type": "string"},
+        "calculated_area": {"type": "number"},
+        "shape_type": {"type": "string", "enum": ["rect", "circle", "polygon"]},
+        "coords": COORDS_SCHEMA,
+        "points": {"type": "array", "items": POINT_SCHEMA},
+        "walls": {"type": "array", "items": WALL_SCHEMA}
+    },
+    "required": ["id", "name", "type", "calculated_area", "shape_type", "walls"]
+}
+
+# --- 2. RESPONSE SCHEMAS ---
+DETECTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rooms": {"type": "array", "items": ROOM_SCHEMA}
+    },
+    "required": ["rooms"]
+}
+
+# Coarse stage of coarse-to-fine detection: where the rooms are, not their exact shape
+BOX_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "x": {"type": "number"},
+        "y": {"type": "number"},
+        "w": {"type": "number"},
+        "h": {"type": "number"}
+    },
+    "required": ["x", "y", "w", "h"]
+}
+
+ROOM_BOXES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "feet_per_pixel": {"type": "number"},
+        "rooms": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "name": {"type": "string"},
+                    "type": {"type": "string"},
+                    "bbox": BOX_SCHEMA
+                },
+                "required": ["id", "name", "type", "bbox"]
+            }
+        }
+    },
+    "required": ["rooms"]
+}
+
+# Fine stage: the geometry of each room, measured on a numbered crop around it
+ROOM_GEOMETRY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "crop": {"type": "integer"},
+        "calculated_area": {"type": "number"},
+        "shape_type": {"type": "string", "enum": ["rect", "circle", "polygon"]},
+        "coords": COORDS_SCHEMA,
+        "points": {"type": "array", "items": POINT_SCHEMA},
+        "walls": {"type": "array", "items": WALL_SCHEMA}
+    },
+    "required": ["crop", "calculated_area", "shape_type", "walls"]
+}
+
+ROOM_GEOMETRIES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "rooms": {"type": "array", "items": ROOM_GEOMETRY_SCHEMA}
+    },
+    "required": ["rooms"]
+}
+
+VALIDATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "result": {"type": "boolean"},
+        "rooms": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["result"]
+}
+
+
+# --- 3. LOCAL VALIDATION ---
+_TYPE_CHECKS = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+}
+
+
+def validate_response(data, schema, path="$"):
+    """
+    Checks parsed model output against one of the schemas above.
+
+    Only the subset of JSON Schema used in this module is supported
+    (type, properties, required, items, enum).
+
+    Args:
+        data: The parsed JSON value.
+        schema (dict): The schema to check against.
+        path (str): Location prefix used in error messages.
+
+    Returns:
+        list: Human readable error strings. Empty if the data is valid.
+    """
+    errors = []
+
+    expected = schema.get("type")
+    if expected and not _TYPE_CHECKS[expected](data):
+        return [f"{path}: expected {expected}, got {type(data).__name__}"]
+
+    if "enum" in schema and data not in schema["enum"]:
+        errors.append(f"{path}: {data!r} is not one of {schema['enum']}")
+
+    if expected == "object":
+        for key in schema.get("required", []):
+            if key not in data:
+                errors.append(f"{path}: missing required field '{key}'")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in data:
+                errors.extend(validate_response(data[key], sub_schema, f"{path}.{key}"))
+
+    if expected == "array" and "items" in schema:
+        for i, item in enumerate(data):
+            errors.extend(validate_response(item, schema["items"], f"{path}[{i}]"))
+
+    return errors
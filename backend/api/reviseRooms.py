@@ -0,0 +1,326 @@
+from http.server import BaseHTTPRequestHandler
+import json
+import os
+import email
+import sys
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from email.policy import default
+from dotenv import load_dotenv
+from PIL import Image
+import io
+import hashlib
+
+# --- 1. SETUP PATHS & IMPORTS ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+from geminiService import call_gemini_api, build_image_part, get_coalescing_metrics, get_scheduler_metrics
+from requestScheduler import AdmissionRejected
+from responseSchemas import DETECTION_SCHEMA
+from analysisStore import LABEL_FIELDS, load_analysis, load_reference_image, save_analysis, save_reference_image
+from perceptualHashIndex import compute_dhash
+from revisionDiff import (align_revision, box_intersects, changed_regions, diff_rooms,
+                          reference_to_new, transform_room)
+from wallRefinement import refine_rooms, room_bbox
+from detectionPrompts import MODEL_TYPE, USER_PROMPT
+from roomCategories import category_for_type, summarize_categories
+from requestProfiler import profiled
+from requestDeadline import Deadline, DeadlineExceeded
+
+load_dotenv()
+
+# --- 2. CONFIGURATION ---
+ANALYSIS_KIND = "reviseRooms"
+MAX_CONCURRENT_CROPS = 4
+GEOMETRY_REFINEMENT_SECONDS = 2     # wall snapping is skipped with less of the deadline left
+
+CROP_PROMPT_NOTE = (
+    "This image is a crop of a larger floor plan. Report coordinates in pixels of this crop, "
+    "with (0,0) at its top-left corner. Only report rooms whose walls are visible in the crop."
+)
+
+
+class handler(BaseHTTPRequestHandler):
+    """
+    Re-analyses a new revision of a previously analysed plan.
+
+    POST multipart form data with the new 'file' and 'previousAnalysisId'.
+    Only regions whose pixels changed are sent to the model; rooms elsewhere
+    are carried over. The response holds the merged rooms plus a room-level
+    diff (added, removed, resized, retyped).
+    """
+
+    # --- CORS SUPPORT ---
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', '*')
+        self.end_headers()
+
+    # --- POST REQUEST ---
+    @profiled
+    def do_POST(self):
+        # Time budget from X-Request-Timeout-Ms or the platform limit, checked by every stage
+        deadline = Deadline.from_headers(self.headers)
+        try:
+            # 1. Parse Input
+            content_length = int(self.headers.get('Content-Length', 0))
+            if content_length == 0:
+                self.send_error(400, "No data received")
+                return
+
+            body = self.rfile.read(content_length)
+            content_type = self.headers.get('Content-Type', '')
+
+            headers = b'Content-Type: ' + content_type.encode('utf-8') + b'\r\n'
+            msg = email.message_from_bytes(headers + b'\r\n' + body, policy=default)
+
+            file_content = None
+            previous_id = None
+            labels = {}
+            for part in msg.walk():
+                field = part.get_param('name', header='content-disposition')
+                if part.get_filename():
+                    file_content = part.get_payload(decode=True)
+                elif field == 'previousAnalysisId':
+                    previous_id = part.get_content().strip()
+                elif field in LABEL_FIELDS:
+                    labels[field] = part.get_content().strip()
+
+            if not file_content or not previous_id:
+                self._send_json({"error": "Both 'file' and 'previousAnalysisId' are required"}, 400)
+                return
+
+            # 2. Load the previous revision
+            previous = load_analysis(previous_id)
+            if previous is None:
+                self._send_json({"error": f"Unknown analysis {previous_id}"}, 404)
+                return
+            labels = dict(previous.get("labels") or {}, **labels)
+            reference = load_reference_image(previous_id)
+            if reference is None:
+                self._send_json({"error": "Previous analysis has no stored image; run a full analysis instead"}, 409)
+                return
+
+            try:
+                image = Image.open(io.BytesIO(file_content))
+                image.load()
+            except Exception as e:
+                self._send_json({"error": f"Could not read image: {e}"}, 400)
+                return
+            image_width, image_height = image.size
+
+            # 3. Align the new image onto the previous one and find what changed
+            alignment = align_revision(reference, image)
+            if alignment is None:
+                self._send_json({"error": "New image does not have the same framing as the previous revision"}, 422)
+                return
+
+            regions = self._regions_in_new_frame(changed_regions(reference, alignment["aligned"]), alignment)
+            old_rooms = self._previous_rooms_in_new_frame(previous, reference, alignment)
+
+            affected = [r for r in old_rooms if room_bbox(r) and any(box_intersects(room_bbox(r), g) for g in regions)]
+            carried = [r for r in old_rooms if not any(r is a for a in affected)]
+            print(f"Revision of {previous_id}: {len(regions)} changed regions, "
+                  f"{len(affected)} affected rooms, {len(carried)} carried over")
+
+            # 4. Re-detect only the changed regions, in parallel
+            crop_rooms, unresolved = self._detect_in_regions(image, regions, affected, self._estimate_ft_per_px(old_rooms), deadline)
+            if unresolved:
+                # Regions the deadline cut off keep their previous rooms, unless another crop re-detected them
+                deadline.skip(f"re-detection of {len(unresolved)} changed regions", "deadline reached")
+                redetected = {id(old) for old, _new in diff_rooms(affected, crop_rooms)["matches"]}
+                stale = [r for r in affected if id(r) not in redetected and any(box_intersects(room_bbox(r), g) for g in unresolved)]
+                affected = [r for r in affected if not any(r is st for st in stale)]
+                carried += stale
+            if crop_rooms and deadline.allows("geometry refinement", GEOMETRY_REFINEMENT_SECONDS):
+                try:
+                    refine_rooms(image, crop_rooms)
+                except Exception as e:
+                    print(f"Geometry refinement failed: {e}")
+
+            # 5. Diff and merge
+            diff = diff_rooms(affected, crop_rooms)
+            next_id = max([r.get("id", 0) for r in old_rooms] + [0]) + 1
+            merged = list(carried)
+            for old, new in diff["matches"]:
+                new["id"] = old.get("id")
+                if "category" in old and str(old.get("type", "")).lower() == str(new.get("type", "")).lower():
+                    new["category"] = old["category"]
+                merged.append(new)
+            for new in diff["added"]:
+                new["id"] = next_id
+                next_id += 1
+                merged.append(new)
+
+            # Categorized plans stay categorized: rooms that are new or changed type are looked up again
+            categorized = "category_summary" in previous["result"]
+            if categorized:
+                for room in merged:
+                    if "category" not in room:
+                        room["category"] = category_for_type(room.get("type"))
+
+            data = {
+                "rooms": sorted(merged, key=lambda r: r.get("id", 0)),
+                "imageMetadata": {'width': image_width, 'height': image_height},
+                "revision": {
+                    "previousAnalysisId": previous_id,
+                    "changedRegions": regions,
+                    "modelCalls": len(regions),
+                    "diff": {
+                        "added": [{"id": r["id"], "name": r.get("name"), "type": r.get("type")} for r in diff["added"]],
+                        "removed": [{"id": r.get("id"), "name": r.get("name"), "type": r.get("type")} for r in diff["removed"]],
+                        "resized": diff["resized"],
+                        "retyped": diff["retyped"],
+                        "unchanged": len(carried)
+                    }
+                }
+            }
+
+            if categorized:
+                summarize_categories(data)
+
+            if deadline.skipped:
+                # Partial revisions are not stored; a retry with more time gets the full revision
+                data["incomplete"] = True
+                data["deadline"] = deadline.summary()
+                self._send_json(data, 200, {"Cache-Control": "no-store"})
+                return
+
+            image_info = {
+                "sha256": hashlib.sha256(file_content).hexdigest(),
+                "phash": compute_dhash(image),
+                "width": image_width,
+                "height": image_height
+            }
+            self._send_json(self._store_analysis(data, image_info, image, labels), 200)
+
+        except AdmissionRejected as e:
+            print(f"Admission rejected: {e}")
+            self._send_json({"error": str(e), "retry_after": e.retry_after}, 429,
+                            {"Retry-After": str(e.retry_after), "Access-Control-Expose-Headers": "Retry-After"})
+
+        except Exception as e:
+            if deadline.expired():
+                # Answer now rather than late; the client can retry with a longer X-Request-Timeout-Ms
+                print(f"Error at deadline: {e}")
+                self._send_json({"error": str(DeadlineExceeded("revision", deadline)), "incomplete": True,
+                                 "deadline": deadline.summary()}, 504, {"Cache-Control": "no-store"})
+                return
+            print(f"Server Error: {e}")
+            import traceback
+            traceback.print_exc()
+            self._send_json({"error": str(e)}, 500)
+
+    # --- HELPERS ---
+    def _regions_in_new_frame(self, regions, alignment):
+        to_new = reference_to_new(alignment)
+        mapped = []
+        for region in regions:
+            x0, y0 = to_new(region["x"], region["y"])
+            x1, y1 = to_new(region["x"] + region["w"], region["y"] + region["h"])
+            mapped.append({"x": round(x0), "y": round(y0), "w": round(x1 - x0), "h": round(y1 - y0)})
+        return mapped
+
+    def _previous_rooms_in_new_frame(self, previous, reference, alignment):
+        # previous upload px -> reference px -> new upload px
+        prev_scale_x = reference.width / previous["image"]["width"]
+        prev_scale_y = reference.height / previous["image"]["height"]
+        to_new = reference_to_new(alignment)
+        sx, sy = alignment["scale"]
+        fn = lambda x, y: to_new(x * prev_scale_x, y * prev_scale_y)
+        return [transform_room(room, fn, prev_scale_x / sx, prev_scale_y / sy)
+                for room in previous["result"].get("rooms", [])]
+
+    def _estimate_ft_per_px(self, rooms):
+        """Plan scale from the previous rect rooms, since a crop may not show the scale bar."""
+        ratios = []
+        for room in rooms:
+            coords = room.get("coords") or {}
+            if room.get("shape_type") == "rect" and coords.get("w") and coords.get("h") and room.get("calculated_area"):
+                ratios.append((room["calculated_area"] / (coords["w"] * coords["h"])) ** 0.5)
+        return statistics.median(ratios) if ratios else None
+
+    def _detect_in_regions(self, image, regions, affected, ft_per_px, deadline):
+        """Rooms found in the changed regions, and the regions the deadline left undetected."""
+        # USER_PROMPT stays a part of its own so it can be served from the prompt cache
+        crop_note = CROP_PROMPT_NOTE
+        if ft_per_px:
+            crop_note += f" Use this scale, measured on the full plan: 1 pixel = {ft_per_px:.4f} ft."
+
+        def detect(region):
+            # Grow the crop to cover every old room it touches, so those rooms are seen whole
+            boxes = [(region["x"], region["y"], region["w"], region["h"])]
+            boxes += [room_bbox(r) for r in affected if box_intersects(room_bbox(r), region)]
+            left = max(0, int(min(b[0] for b in boxes)))
+            top = max(0, int(min(b[1] for b in boxes)))
+            right = min(image.width, int(max(b[0] + b[2] for b in boxes)) + 1)
+            bottom = min(image.height, int(max(b[1] + b[3] for b in boxes)) + 1)
+
+            buffer = io.BytesIO()
+            image.crop((left, top, right, bottom)).save(buffer, format="PNG")
+            messages_payload = [
+                {
+                    "role": "user",
+                    "content": [
+                        { "type": "text", "text": USER_PROMPT },
+                        { "type": "text", "text": crop_note },
+                        build_image_part(buffer.getvalue(), "image/png")
+                    ]
+                }
+            ]
+            try:
+                response = call_gemini_api(
+                    model=MODEL_TYPE,
+                    messages=messages_payload,
+                    response_schema=DETECTION_SCHEMA,
+                    schema_name="room_detection",
+                    timeout=deadline.timeout("region re-detection")
+                )
+            except Exception as e:
+                if isinstance(e, DeadlineExceeded) or deadline.expired():
+                    return None
+                raise
+            rooms = json.loads(response).get("rooms", [])
+            return [transform_room(r, lambda x, y: (x + left, y + top), 1, 1) for r in rooms]
+
+        if not regions:
+            return [], []
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CROPS) as pool:
+            results = list(pool.map(detect, regions))
+        unresolved = [region for region, batch in zip(regions, results) if batch is None]
+        results = [batch for batch in results if batch is not None]
+
+        # A room straddling two crops can come back twice; keep the first copy
+        rooms = []
+        for room in (r for batch in results for r in batch):
+            if not any(diff_rooms([room], [other])["matches"] for other in rooms):
+                rooms.append(room)
+        return rooms, unresolved
+
+    def _store_analysis(self, data, image_info, image=None, labels=None):
+        # Storing is best effort; the client still gets its result if the disk is unavailable
+        try:
+            record = save_analysis(ANALYSIS_KIND, data, image_info, labels)
+            data["analysisId"] = record["id"]
+            # Lets this client read (getAnalysis) and correct (correctRooms) what it uploaded
+            data["analysisKey"] = record["access_key"]
+            data["version"] = record["version"]
+            if image is not None:
+                save_reference_image(record["id"], image)
+        except OSError as e:
+            print(f"Could not store analysis: {e}")
+        return data
+
+    def _send_json(self, data, status_code, extra_headers=None):
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(json.dumps(data).encode('utf-8'))
+
+    def do_GET(self):
+        self._send_json({"status": "Room Revision API is online", "coalescing": get_coalescing_metrics(), "scheduler": get_scheduler_metrics()}, 200)
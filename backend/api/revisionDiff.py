@@ -0,0 +1,229 @@
+"""
+Image and room diffing between two revisions of the same floor plan.
+
+align_revision() registers the new image onto the previous analysis'
+reference image (resize + phase-correlation translation), changed_regions()
+turns the pixel difference into a few changed bounding boxes, and
+diff_rooms() matches rooms across revisions by IoU.
+
+Coordinate frames:
+    previous  - pixels of the previously analysed upload (old room coords)
+    reference - pixels of the stored reference image (downsampled previous)
+    new       - pixels of the new upload (coords we return)
+"""
+import numpy as np
+from PIL import Image
+
+from wallRefinement import binarize, bbox_iou, room_bbox
+
+# --- 1. CONFIGURATION ---
+MAX_ASPECT_RATIO_DRIFT = 0.05   # revisions must have (nearly) the same framing
+ALIGN_MAX_SIDE = 512            # phase correlation runs on a small copy
+INK_TOLERANCE_PX = 2            # ignore ink that moved by less than this (antialiasing, jitter)
+CELL_SIZE = 16                  # px, diff cells in the reference frame
+MIN_CHANGED_PIXELS = 12         # per cell
+MERGE_DISTANCE_CELLS = 3        # changed cells closer than this belong to one region
+REGION_PADDING_CELLS = 4        # context added around each region before cropping
+
+MATCH_MIN_IOU = 0.3
+RESIZE_MAX_IOU = 0.9            # matched rooms below this IoU count as resized
+RESIZE_MIN_AREA_CHANGE = 0.05
+
+
+# --- 2. ALIGNMENT ---
+def _phase_correlation(a, b):
+    """Translation t (dx, dy) such that b(p + t) ~= a(p)."""
+    fa = np.fft.fft2(a - a.mean())
+    fb = np.fft.fft2(b - b.mean())
+    cross = fb * np.conj(fa)
+    cross /= np.abs(cross) + 1e-9
+    response = np.abs(np.fft.ifft2(cross))
+    dy, dx = np.unravel_index(np.argmax(response), response.shape)
+    height, width = a.shape
+    if dy > height // 2:
+        dy -= height
+    if dx > width // 2:
+        dx -= width
+    return float(dx), float(dy)
+
+
+def align_revision(reference, new_image):
+    """
+    Registers the new upload onto the reference image.
+
+    Args:
+        reference (PIL.Image.Image): Stored grayscale reference of the previous revision.
+        new_image (PIL.Image.Image): The new upload.
+
+    Returns:
+        dict: {"aligned": new image in the reference frame (grayscale PIL),
+        "scale": (sx, sy) new -> reference, "shift": (dx, dy) in reference px},
+        or None if the two images do not have the same framing.
+    """
+    ref_w, ref_h = reference.size
+    new_w, new_h = new_image.size
+    drift = abs((new_w / new_h) / (ref_w / ref_h) - 1)
+    if drift > MAX_ASPECT_RATIO_DRIFT:
+        return None
+
+    resized = new_image.convert("L").resize((ref_w, ref_h))
+
+    factor = min(1.0, ALIGN_MAX_SIDE / max(ref_w, ref_h))
+    small_size = (max(1, round(ref_w * factor)), max(1, round(ref_h * factor)))
+    a = np.asarray(reference.resize(small_size), dtype=np.float32)
+    b = np.asarray(resized.resize(small_size), dtype=np.float32)
+    dx, dy = _phase_correlation(a, b)
+    dx, dy = dx / factor, dy / factor
+
+    aligned = resized.transform((ref_w, ref_h), Image.AFFINE, (1, 0, dx, 0, 1, dy), fillcolor=255)
+    return {"aligned": aligned, "scale": (ref_w / new_w, ref_h / new_h), "shift": (dx, dy)}
+
+
+def reference_to_new(alignment):
+    """Returns a function mapping reference (x, y) to new-image (x, y)."""
+    (sx, sy), (dx, dy) = alignment["scale"], alignment["shift"]
+    return lambda x, y: ((x + dx) / sx, (y + dy) / sy)
+
+
+# --- 3. CHANGED REGIONS ---
+def _dilate(mask, radius):
+    out = mask.copy()
+    for _ in range(radius):
+        out[1:, :] |= out[:-1, :].copy()
+        out[:-1, :] |= out[1:, :].copy()
+        out[:, 1:] |= out[:, :-1].copy()
+        out[:, :-1] |= out[:, 1:].copy()
+    return out
+
+
+def _label_cells(cells):
+    """4-connected components of a small boolean grid. Returns lists of (row, col)."""
+    seen = np.zeros_like(cells)
+    components = []
+    for start in zip(*np.nonzero(cells)):
+        if seen[start]:
+            continue
+        seen[start] = True
+        stack, members = [start], []
+        while stack:
+            r, c = stack.pop()
+            members.append((r, c))
+            for nr, nc in ((r + 1, c), (r - 1, c), (r, c + 1), (r, c - 1)):
+                if 0 <= nr < cells.shape[0] and 0 <= nc < cells.shape[1] and cells[nr, nc] and not seen[nr, nc]:
+                    seen[nr, nc] = True
+                    stack.append((nr, nc))
+        components.append(members)
+    return components
+
+
+def changed_regions(reference, aligned):
+    """
+    Bounding boxes (reference frame) of areas whose ink changed.
+
+    Returns:
+        list: {"x", "y", "w", "h"} boxes, padded for context. Empty if nothing changed.
+    """
+    ink_a, _ = binarize(reference, max(reference.size))
+    ink_b, _ = binarize(aligned, max(aligned.size))
+    changed = (ink_a & ~_dilate(ink_b, INK_TOLERANCE_PX)) | (ink_b & ~_dilate(ink_a, INK_TOLERANCE_PX))
+
+    height, width = changed.shape
+    rows, cols = height // CELL_SIZE, width // CELL_SIZE
+    if rows == 0 or cols == 0:
+        return []
+    counts = changed[:rows * CELL_SIZE, :cols * CELL_SIZE].reshape(rows, CELL_SIZE, cols, CELL_SIZE).sum(axis=(1, 3))
+    changed_cells = counts >= MIN_CHANGED_PIXELS
+    if not changed_cells.any():
+        return []
+
+    # Merge nearby changes so one edit becomes one region
+    merged = _dilate(changed_cells, MERGE_DISTANCE_CELLS)
+    regions = []
+    for members in _label_cells(merged):
+        # Only keep the part of the component that actually changed, then pad
+        hits = [(r, c) for r, c in members if changed_cells[r, c]]
+        if not hits:
+            continue
+        r0 = max(0, min(r for r, _ in hits) - REGION_PADDING_CELLS)
+        r1 = min(rows, max(r for r, _ in hits) + 1 + REGION_PADDING_CELLS)
+        c0 = max(0, min(c for _, c in hits) - REGION_PADDING_CELLS)
+        c1 = min(cols, max(c for _, c in hits) + 1 + REGION_PADDING_CELLS)
+        regions.append({"x": int(c0 * CELL_SIZE), "y": int(r0 * CELL_SIZE),
+                        "w": int((c1 - c0) * CELL_SIZE), "h": int((r1 - r0) * CELL_SIZE)})
+    return regions
+
+
+# --- 4. ROOM GEOMETRY ---
+def transform_room(room, fn, scale_x, scale_y):
+    """Copy of a room with every coordinate mapped through fn(x, y); sizes scaled."""
+    room = dict(room)
+    coords = room.get("coords")
+    if coords:
+        coords = dict(coords)
+        if "x" in coords and "y" in coords:
+            coords["x"], coords["y"] = (round(v, 1) for v in fn(coords["x"], coords["y"]))
+        if "cx" in coords and "cy" in coords:
+            coords["cx"], coords["cy"] = (round(v, 1) for v in fn(coords["cx"], coords["cy"]))
+        if "w" in coords:
+            coords["w"] = round(coords["w"] * scale_x, 1)
+        if "h" in coords:
+            coords["h"] = round(coords["h"] * scale_y, 1)
+        if "r" in coords:
+            coords["r"] = round(coords["r"] * (scale_x + scale_y) / 2, 1)
+        room["coords"] = coords
+    if room.get("points"):
+        room["points"] = [[round(v, 1) for v in fn(x, y)] for x, y in room["points"]]
+    return room
+
+
+def box_intersects(bbox, region):
+    x, y, w, h = bbox
+    return x < region["x"] + region["w"] and region["x"] < x + w and y < region["y"] + region["h"] and region["y"] < y + h
+
+
+# --- 5. ROOM DIFF ---
+def diff_rooms(old_rooms, new_rooms):
+    """
+    Greedy IoU assignment between two room lists (same coordinate frame).
+
+    Returns:
+        dict: added / removed rooms, resized / retyped summaries (keyed by the old
+        room id, which a revision keeps), and matched pairs
+        as (old, new) tuples.
+    """
+    pairs = []
+    for i, old in enumerate(old_rooms):
+        old_box = room_bbox(old)
+        for j, new in enumerate(new_rooms):
+            new_box = room_bbox(new)
+            if old_box and new_box:
+                iou = bbox_iou(old_box, new_box)
+                if iou >= MATCH_MIN_IOU:
+                    pairs.append((iou, i, j))
+
+    matched_old, matched_new, matches = set(), set(), []
+    for iou, i, j in sorted(pairs, reverse=True):
+        if i in matched_old or j in matched_new:
+            continue
+        matched_old.add(i)
+        matched_new.add(j)
+        matches.append((iou, old_rooms[i], new_rooms[j]))
+
+    resized, retyped = [], []
+    for iou, old, new in matches:
+        old_area, new_area = old.get("calculated_area") or 0, new.get("calculated_area") or 0
+        area_change = abs(new_area - old_area) / old_area if old_area else 0.0
+        if iou < RESIZE_MAX_IOU or area_change > RESIZE_MIN_AREA_CHANGE:
+            resized.append({"id": old.get("id"), "name": new.get("name"), "iou": round(iou, 3),
+                            "previous_area": old_area, "area": new_area})
+        if str(old.get("type", "")).lower() != str(new.get("type", "")).lower():
+            retyped.append({"id": old.get("id"), "name": new.get("name"),
+                            "previous_type": old.get("type"), "type": new.get("type")})
+
+    return {
+        "added": [new_rooms[j] for j in range(len(new_rooms)) if j not in matched_new],
+        "removed": [old_rooms[i] for i in range(len(old_rooms)) if i not in matched_old],
+        "resized": resized,
+        "retyped": retyped,
+        "matches": [(old, new) for _iou, old, new in matches]
+    }
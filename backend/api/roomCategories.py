@@ -0,0 +1,144 @@
+"""
+Assigns each detected room one of the compliance space categories.
+
+Room types the model returns (e.g. 'gym', 'office') are looked up in
+FIXED_RULES, then in the mappings learned from user corrections (see
+categoryMappings.py). Types found in neither are left uncategorized for the
+user to fix, so the same plan always gets the same categories.
+"""
+from categoryMappings import learned_category, normalize_type
+
+# --- 1. CATEGORIES ---
+CAT_PFSA          = "PFSA Space"
+CAT_NON_QUALIFIED = "Non Qualified Space"
+CAT_COMMON        = "Common Space"
+CAT_SHARED        = "Shared Space"
+
+CATEGORIES = [CAT_PFSA, CAT_NON_QUALIFIED, CAT_COMMON, CAT_SHARED]
+
+FIXED_RULES = {
+    # -- Non Qualified Space (Vertical penetrations, structural, hygiene) --
+    "bathroom":     CAT_NON_QUALIFIED,
+    "restroom":     CAT_NON_QUALIFIED,
+    "toilet":       CAT_NON_QUALIFIED,
+    "wc":           CAT_NON_QUALIFIED,
+    "stairs":       CAT_NON_QUALIFIED,
+    "stairwell":    CAT_NON_QUALIFIED,
+    "elevator":     CAT_NON_QUALIFIED,
+    "lift":         CAT_NON_QUALIFIED,
+    "shaft":        CAT_NON_QUALIFIED,
+    "mechanical":   CAT_NON_QUALIFIED,
+    "electrical":   CAT_NON_QUALIFIED,
+    "utility":      CAT_NON_QUALIFIED,
+    "storage":      CAT_NON_QUALIFIED,
+    "closet":       CAT_NON_QUALIFIED,
+    "janitor":      CAT_NON_QUALIFIED,
+    "garage":       CAT_NON_QUALIFIED,
+    "parking":      CAT_NON_QUALIFIED,
+    "terrace":      CAT_NON_QUALIFIED, 
+    "balcony":      CAT_NON_QUALIFIED,
+
+    # -- Common Space (Circulation, entry) --
+    "corridor":     CAT_COMMON,
+    "hallway":      CAT_COMMON,
+    "hall":         CAT_COMMON,
+    "vestibule":    CAT_COMMON,
+    "lobby":        CAT_COMMON,
+    "entry":        CAT_COMMON,
+    "entrance":     CAT_COMMON,
+    "foyer":        CAT_COMMON,
+    "reception":    CAT_COMMON,
+    "waiting":      CAT_COMMON,
+    "atrium":       CAT_COMMON,
+    "courtyard":    CAT_COMMON, # Assigned here as general circulation/amenity
+
+    # -- Shared Space (Amenities available to all tenants/employees) --
+    "gym":          CAT_SHARED,
+    "fitness":      CAT_SHARED,
+    "exercise":     CAT_SHARED,
+    "cafeteria":    CAT_SHARED,
+    "kitchen":      CAT_SHARED,
+    "pantry":       CAT_SHARED,
+    "breakroom":    CAT_SHARED,
+    "lounge":       CAT_SHARED,
+    "conference":   CAT_SHARED,
+    "meeting":      CAT_SHARED,
+    "library":      CAT_SHARED,
+    "mailroom":     CAT_SHARED,
+    "copy":         CAT_SHARED,
+
+    # -- PFSA Space (Primary Functional / Work Areas) --
+    "office":       CAT_PFSA,
+    "workstation":  CAT_PFSA,
+    "cubicle":      CAT_PFSA,
+    "desk":         CAT_PFSA,
+    "open office":  CAT_PFSA,
+    "lab":          CAT_PFSA,
+    "classroom":    CAT_PFSA,
+    "workspace":    CAT_PFSA
+}
+
+
+# --- 2. ASSIGNMENT ---
+def category_for_type(room_type):
+    """Category for a room type, or None if neither a fixed rule nor an approved mapping covers it."""
+    normalized = normalize_type(room_type)
+    if FIXED_RULES.get(normalized) in CATEGORIES:
+        return FIXED_RULES[normalized]
+    return learned_category(normalized)
+
+
+def assign_categories(data):
+    """
+    Sets room["category"] on every room and adds data["category_summary"].
+    Rooms a user already categorized (category_source "user", e.g. carried
+    over from a corrected analysis reused for a re-upload) keep their category.
+
+    Args:
+        data (dict): Detection response with a "rooms" list. Modified in place.
+
+    Returns:
+        dict: The same data.
+    """
+    # We use a set to ensure we only look up each 'type' once
+    unique_types = set(room.get("type") for room in data.get("rooms", []))
+    type_category_map = {r_type: category_for_type(r_type) for r_type in unique_types}
+
+    for room in data.get("rooms", []):
+        if room.get("category_source") == "user" and room.get("category") in CATEGORIES:
+            continue
+        room["category"] = type_category_map.get(room.get("type"))
+
+    return summarize_categories(data)
+
+
+def summarize_categories(data):
+    """
+    Sets data["category_summary"] from the categories already on the rooms
+    (e.g. after a user corrected them).
+
+    Returns:
+        dict: The same data.
+    """
+    category_totals = { cat: 0 for cat in CATEGORIES }
+    uncategorized_sq_ft = 0
+    type_category_map = {}
+    uncategorized_types = set()
+
+    for room in data.get("rooms", []):
+        category = room.get("category")
+        if category in category_totals:
+            category_totals[category] += (room.get("calculated_area") or 0)
+            type_category_map.setdefault(room.get("type"), category)
+        else:
+            uncategorized_sq_ft += (room.get("calculated_area") or 0)
+            if room.get("type"):
+                uncategorized_types.add(room.get("type"))
+
+    data["category_summary"] = {
+        "totals_sq_ft": category_totals,
+        "uncategorized_sq_ft": uncategorized_sq_ft,
+        "uncategorized_types": sorted(uncategorized_types),
+        "type_assignments": type_category_map # Optional: helpful for debugging
+    }
+    return data
@@ -0,0 +1,78 @@
+"""
+Request coalescing ("single-flight") for identical concurrent calls.
+
+The first caller for a key runs the function. Callers that arrive with the
+same key while it is still running wait for it and share its result, or
+re-raise its error, instead of making their own call.
+
+Coalescing is per process: it only merges requests served by the same
+instance.
+"""
+import threading
+
+# Waiters give up after this many seconds; the leader's call keeps running
+DEFAULT_WAIT_TIMEOUT = 120
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._metrics = {"calls": 0, "executed": 0, "coalesced": 0, "waiter_timeouts": 0}
+
+    def do(self, key, fn, timeout=DEFAULT_WAIT_TIMEOUT):
+        """
+        Runs fn() once per key at a time.
+
+        Args:
+            key (str): Identifies identical work.
+            fn (callable): Zero-argument function doing the work.
+            timeout (float): Seconds a waiter will wait for the in-flight call.
+
+        Returns:
+            The result of fn(), possibly computed for another caller.
+
+        Raises:
+            TimeoutError: If this caller was waiting and the in-flight call
+                did not finish within timeout.
+        """
+        with self._lock:
+            self._metrics["calls"] += 1
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self._metrics["executed"] += 1
+            else:
+                self._metrics["coalesced"] += 1
+
+        if is_leader:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(timeout):
+            with self._lock:
+                self._metrics["waiter_timeouts"] += 1
+            raise TimeoutError(f"Timed out after {timeout}s waiting for in-flight call {key}")
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def metrics(self):
+        """Counters since startup: calls, executed, coalesced, waiter_timeouts, in_flight."""
+        with self._lock:
+            return dict(self._metrics, in_flight=len(self._calls))
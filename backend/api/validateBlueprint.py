@@ -1,15 +1,24 @@
 from http.server import BaseHTTPRequestHandler, HTTPServer
 import json
 import os
-import base64
 import email
+import io
 import sys
+import hashlib
 from email.policy import default
+from PIL import Image
 from openai import OpenAI
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
-from geminiService import call_gemini_api
+from geminiService import call_gemini_api, build_image_part, get_coalescing_metrics, get_scheduler_metrics
+from requestScheduler import AdmissionRejected, PRIORITY_INTERACTIVE
+from responseSchemas import VALIDATION_SCHEMA
+from blueprintPrefilter import classify_upload
+from responseCache import (cache_response, get_cached_response, get_response_cache_metrics, make_cache_key,
+                           prompt_version, send_cacheable_json, send_json_body)
+from requestProfiler import profiled
+from requestDeadline import Deadline, DeadlineExceeded
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -24,12 +33,12 @@ USER_PROMPT = (
     "Output Instructions:\n"
     "- If ANY of the above criteria are missing, the 'result' must be false.\n"
     "- If the result is true, provide the list of detected room types in the 'rooms' field.\n"
-    "- If the result is false, the 'rooms' field should be an empty list [].\n"
-    "- Strictly output ONLY valid JSON. Do not include markdown formatting (like ```json), explanations, or any other text.\n\n"
-    "Required JSON Structure:\n"
-    "{\"result\": boolean}"
+    "- If the result is false, the 'rooms' field should be an empty list []."
 )
 
+# Part of the cache key: cached results are only valid for the prompt that produced them
+PROMPT_VERSION = prompt_version(USER_PROMPT)
+
 class handler(BaseHTTPRequestHandler):
 
    # --- CORS SUPPORT ---
@@ -41,7 +50,10 @@ class handler(BaseHTTPRequestHandler):
         self.end_headers()
 
     # --- POST REQUEST ---
+    @profiled
     def do_POST(self):
+        # Time budget from X-Request-Timeout-Ms or the platform limit
+        deadline = Deadline.from_headers(self.headers)
         try:
             # 1. Read the length of the uploaded data
             content_length = int(self.headers.get('Content-Length', 0))
@@ -75,8 +87,33 @@ class handler(BaseHTTPRequestHandler):
                 self._send_json({"error": "No file found in request"}, 400)
                 return
 
-            # 4. Prepare data for Gemini
-            base64_image = base64.b64encode(file_content).decode('utf-8')
+            # Repeat uploads are answered from the server-side copy
+            force = self.headers.get('X-Force-Analysis') == '1'
+            cache_key = make_cache_key(hashlib.sha256(file_content).hexdigest(), "validateBlueprint", MODEL_TYPE, PROMPT_VERSION)
+            if not force:
+                cached = get_cached_response(cache_key)
+                if cached is not None:
+                    send_json_body(self, cached)
+                    return
+
+            # 4. Local prefilter: reject obvious non-blueprints without a model call.
+            # Pillow cannot rasterize PDFs, so those always go on to the model.
+            try:
+                image = Image.open(io.BytesIO(file_content))
+                image.load()
+            except Exception as e:
+                print(f"Prefilter skipped, could not decode image: {e}")
+                image = None
+
+            if image is not None:
+                prefilter = classify_upload(image)
+                print(f"Prefilter: {prefilter['verdict']} ({prefilter['reason']}) {prefilter['features']}")
+                if prefilter["verdict"] == "reject":
+                    self._send_result({"result": False, "prefilter": prefilter}, cache_key)
+                    return
+
+            # 5. Prepare data for Gemini (uploaded-file handle, or inline base64 as fallback)
+            image_part = build_image_part(file_content, mime_type)
 
             messages_payload = [
                 {
@@ -86,43 +123,68 @@ class handler(BaseHTTPRequestHandler):
                             "type": "text",
                             "text": USER_PROMPT
                         },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:{mime_type};base64,{base64_image}"
-                            }
-                        }
+                        image_part
                     ]
                 }
             ]
 
-            # 4. Call the Service
+            # 6. Call the Service
             # We pass the Model Name and the Messages as requested
             gemini_response = call_gemini_api(
                 model=MODEL_TYPE, 
-                messages=messages_payload
+                messages=messages_payload,
+                response_schema=VALIDATION_SCHEMA,
+                schema_name="blueprint_validation",
+                priority=PRIORITY_INTERACTIVE,  # the UI blocks on this call
+                timeout=deadline.timeout("blueprint validation")
             )
             
             # Ensure it is valid JSON before sending
             try:
                 data = json.loads(gemini_response)
-                self._send_json(data, 200)
+                self._send_result(data, cache_key)
             except json.JSONDecodeError:
                 # Fallback if model returns text instead of JSON
                 self._send_json({"result": "true" in gemini_response.lower()}, 200)
 
+        except DeadlineExceeded as e:
+            self._send_deadline_exceeded(e)
+
+        except AdmissionRejected as e:
+            print(f"Admission rejected: {e}")
+            self._send_json({"error": str(e), "retry_after": e.retry_after}, 429,
+                            {"Retry-After": str(e.retry_after), "Access-Control-Expose-Headers": "Retry-After"})
+
         except Exception as e:
+            if deadline.expired():
+                # Most likely the model call cut off by its timeout; answer now rather than late
+                print(f"Error at deadline: {e}")
+                self._send_deadline_exceeded(DeadlineExceeded("blueprint validation", deadline))
+                return
             print(f"Server Error: {e}")
             self._send_json({"error": str(e)}, 500)
 
     # --- HELPER TO SEND JSON ---
-    def _send_json(self, data, status_code):
+    def _send_deadline_exceeded(self, e):
+        print(f"Deadline exceeded: {e}")
+        self._send_json({"error": str(e), "incomplete": True, "deadline": e.deadline.summary()}, 504,
+                        {"Cache-Control": "no-store"})
+
+    def _send_result(self, data, cache_key):
+        body = json.dumps(data).encode('utf-8')
+        cache_response(cache_key, body)
+        send_json_body(self, body)
+
+    def _send_json(self, data, status_code, extra_headers=None):
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
         self.wfile.write(json.dumps(data).encode('utf-8'))
 
     # --- HEALTH CHECK ---
     def do_GET(self):
-        self._send_json({"status": "API is online"}, 200)
\ No newline at end of file
+        send_cacheable_json(self, {"status": "API is online", "coalescing": get_coalescing_metrics(),
+                                   "scheduler": get_scheduler_metrics(), "response_cache": get_response_cache_metrics()}, None, "health")
\ No newline at end of file
@@ -0,0 +1,384 @@
+"""
+Local geometry refinement for detected rooms.
+
+Model coordinates are often tens of pixels off. After detection we:
+
+1. Binarize the plan (Otsu threshold).
+2. Extract horizontal and vertical wall segments: pixels that belong to an
+   unbroken ink run of at least MIN_WALL_LENGTH, grouped into wall lines
+   by projecting onto rows / columns.
+3. Snap each axis-aligned room edge (rect sides, polygon edges) to the
+   nearest wall line within SNAP_TOLERANCE that actually covers that edge,
+   and rescale the room's calculated_area and wall lengths by how much the
+   snap changed its pixel area and edge lengths.
+4. Segment enclosed free space into rooms with a run-based connected
+   component pass, and report how well each model room agrees with the
+   segment under its centre.
+
+Everything is vectorized NumPy on a copy of at most ANALYSIS_MAX_SIDE px,
+so a plan takes well under a second. Circles are left untouched.
+"""
+import bisect
+import time
+
+import numpy as np
+
+# --- 1. CONFIGURATION ---
+ANALYSIS_MAX_SIDE = 2000
+MIN_WALL_LENGTH_FRACTION = 0.015     # of the longest side
+SNAP_TOLERANCE_PX = 40               # in original image pixels
+SNAP_TOLERANCE_FRACTION = 0.02       # ...or this share of the longest side, whichever is larger
+MIN_EDGE_COVERAGE = 0.5              # share of the room edge a wall must cover to snap to it
+AXIS_ALIGNED_SLOPE = 0.1             # polygon edges flatter than this are treated as axis aligned
+
+SEGMENT_MAX_SIDE = 600               # segmentation runs on a smaller copy
+DOOR_GAP_FRACTION = 0.015            # walls grow by this share of the side, closing doorways up to twice that
+MIN_SEGMENT_AREA_FRACTION = 0.0002
+
+
+# --- 2. BINARIZATION & WALL LINES ---
+def _otsu_threshold(gray):
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    weights = hist / hist.sum()
+    levels = np.arange(256)
+    cum_weight = np.cumsum(weights)
+    cum_mean = np.cumsum(weights * levels)
+    total_mean = cum_mean[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        between = (total_mean * cum_weight - cum_mean) ** 2 / (cum_weight * (1 - cum_weight))
+    if np.all(np.isnan(between)):
+        return -1  # single grey level, nothing to separate
+    # Levels up to and including the threshold are the dark class
+    return int(np.nanargmax(between))
+
+
+def binarize(image, max_side=ANALYSIS_MAX_SIDE):
+    """
+    Returns:
+        tuple: (ink mask as a bool array, scale from original to mask pixels)
+    """
+    gray = image.convert("L")
+    scale = min(1.0, max_side / max(gray.size))
+    if scale < 1.0:
+        gray = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))))
+    pixels = np.asarray(gray, dtype=np.uint8)
+    return pixels <= _otsu_threshold(pixels), scale
+
+
+def _long_runs(ink, length):
+    """Pixels that are part of an unbroken run of at least `length` along axis 1."""
+    height, width = ink.shape
+    if width < length:
+        return np.zeros_like(ink)
+    counts = np.zeros((height, width + 1), dtype=np.int32)
+    np.cumsum(ink, axis=1, out=counts[:, 1:])
+    full = (counts[:, length:] - counts[:, :-length]) == length    # window [j, j+length) fully inked
+
+    # Mark every pixel covered by at least one full window
+    starts = np.zeros((height, width + 1), dtype=np.int32)
+    np.cumsum(np.pad(full, ((0, 0), (0, length - 1))), axis=1, out=starts[:, 1:])
+    covered = starts[:, length:] - starts[:, :-length]
+    return np.pad(covered > 0, ((0, 0), (length - 1, 0)))[:, :width]
+
+
+def _group_lines(mask):
+    """
+    Groups consecutive rows of a run mask into wall lines.
+
+    Returns:
+        list: (centre row, coverage bool array over columns), sorted by centre.
+    """
+    has_run = mask.any(axis=1)
+    lines = []
+    row = 0
+    rows = len(has_run)
+    while row < rows:
+        if not has_run[row]:
+            row += 1
+            continue
+        end = row
+        while end + 1 < rows and has_run[end + 1]:
+            end += 1
+        lines.append(((row + end) / 2, mask[row:end + 1].any(axis=0)))
+        row = end + 1
+    return lines
+
+
+def extract_wall_lines(ink):
+    """
+    Returns:
+        dict: {"horizontal": [(y, x_coverage)], "vertical": [(x, y_coverage)]}
+    """
+    length = max(5, int(max(ink.shape) * MIN_WALL_LENGTH_FRACTION))
+    return {
+        "horizontal": _group_lines(_long_runs(ink, length)),
+        "vertical": _group_lines(_long_runs(ink.T, length))
+    }
+
+
+# --- 3. SNAPPING ---
+def _snap(lines, position, span_start, span_end, tolerance):
+    """Nearest line to `position` within tolerance that covers the span, else None."""
+    if not lines:
+        return None
+    centres = [line[0] for line in lines]
+    lo = bisect.bisect_left(centres, position - tolerance)
+    hi = bisect.bisect_right(centres, position + tolerance)
+
+    start, end = int(max(0, min(span_start, span_end))), int(max(span_start, span_end))
+    best = None
+    for centre, coverage in lines[lo:hi]:
+        span = coverage[start:end + 1]
+        if span.size == 0 or span.mean() < MIN_EDGE_COVERAGE:
+            continue
+        if best is None or abs(centre - position) < abs(best - position):
+            best = centre
+    return best
+
+
+def _snap_rect(coords, lines, scale, tolerance):
+    x, y, w, h = (coords[k] * scale for k in ("x", "y", "w", "h"))
+    top = _snap(lines["horizontal"], y, x, x + w, tolerance)
+    bottom = _snap(lines["horizontal"], y + h, x, x + w, tolerance)
+    left = _snap(lines["vertical"], x, y, y + h, tolerance)
+    right = _snap(lines["vertical"], x + w, y, y + h, tolerance)
+
+    new_top = y if top is None else top
+    new_bottom = y + h if bottom is None else bottom
+    new_left = x if left is None else left
+    new_right = x + w if right is None else right
+    if new_bottom <= new_top or new_right <= new_left:
+        return None, 0
+
+    snapped = {
+        "x": round(new_left / scale, 1),
+        "y": round(new_top / scale, 1),
+        "w": round((new_right - new_left) / scale, 1),
+        "h": round((new_bottom - new_top) / scale, 1)
+    }
+    return snapped, sum(edge is not None for edge in (top, bottom, left, right))
+
+
+def _snap_polygon(points, lines, scale, tolerance):
+    scaled = [[px * scale, py * scale] for px, py in points]
+    snapped = [list(p) for p in scaled]
+    edges = 0
+    for i in range(len(scaled)):
+        (x0, y0), (x1, y1) = scaled[i], scaled[(i + 1) % len(scaled)]
+        dx, dy = abs(x1 - x0), abs(y1 - y0)
+        if dy <= AXIS_ALIGNED_SLOPE * dx:
+            target = _snap(lines["horizontal"], (y0 + y1) / 2, x0, x1, tolerance)
+            if target is not None:
+                snapped[i][1] = snapped[(i + 1) % len(scaled)][1] = target
+                edges += 1
+        elif dx <= AXIS_ALIGNED_SLOPE * dy:
+            target = _snap(lines["vertical"], (x0 + x1) / 2, y0, y1, tolerance)
+            if target is not None:
+                snapped[i][0] = snapped[(i + 1) % len(scaled)][0] = target
+                edges += 1
+    return [[round(px / scale, 1), round(py / scale, 1)] for px, py in snapped], edges
+
+
+def _outline(room):
+    """Corner points of a rect or polygon room; rect sides in wall order (top, right, bottom, left)."""
+    if room.get("shape_type") == "rect":
+        x, y, w, h = room_bbox(room)
+        return [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+    return room["points"]
+
+
+def _polygon_area(points):
+    xs, ys = np.array([p[0] for p in points], dtype=float), np.array([p[1] for p in points], dtype=float)
+    return abs(np.dot(xs, np.roll(ys, -1)) - np.dot(ys, np.roll(xs, -1))) / 2
+
+
+def _edge_lengths(points):
+    return [float(np.hypot(x1 - x0, y1 - y0)) for (x0, y0), (x1, y1) in zip(points, points[1:] + points[:1])]
+
+
+def _rescale_measurements(room, before, after):
+    """
+    Scales the model's calculated_area and wall lengths by how much snapping
+    changed the outline, so they keep describing the geometry they belong to.
+
+    Returns:
+        float: The area scale applied, or None if the old outline had no area.
+    """
+    old_area = _polygon_area(before)
+    if old_area <= 0:
+        return None
+    area_scale = _polygon_area(after) / old_area
+    if isinstance(room.get("calculated_area"), (int, float)):
+        room["calculated_area"] = round(room["calculated_area"] * area_scale, 1)
+
+    # Wall n runs along edge n - 1 of the outline
+    old_lengths, new_lengths = _edge_lengths(before), _edge_lengths(after)
+    for wall in room.get("walls") or []:
+        if not isinstance(wall, dict) or not isinstance(wall.get("length"), (int, float)):
+            continue
+        edge = wall.get("sequence_order")
+        if isinstance(edge, int) and 1 <= edge <= len(old_lengths) and old_lengths[edge - 1] > 0:
+            wall["length"] = round(wall["length"] * new_lengths[edge - 1] / old_lengths[edge - 1], 2)
+    return round(area_scale, 3)
+
+
+# --- 4. ROOM SEGMENTATION ---
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def segment_rooms(image):
+    """
+    Connected components of free space enclosed by walls.
+
+    Walls are thickened first so doorways do not join neighbouring rooms.
+    Components are found on horizontal runs (union-find over runs, not
+    pixels), which keeps it fast in pure NumPy + Python.
+
+    Returns:
+        list: {"bbox": {"x", "y", "w", "h"}, "area_px": int} in original
+        image pixels, largest first. The exterior (touching the border)
+        is excluded.
+    """
+    ink, scale = binarize(image, SEGMENT_MAX_SIDE)
+    height, width = ink.shape
+
+    # Close doorways: grow the walls by `gap` in every direction
+    gap = max(1, int(max(height, width) * DOOR_GAP_FRACTION))
+    walls = ink.copy()
+    for _ in range(gap):
+        walls[1:, :] |= walls[:-1, :].copy()
+        walls[:-1, :] |= walls[1:, :].copy()
+        walls[:, 1:] |= walls[:, :-1].copy()
+        walls[:, :-1] |= walls[:, 1:].copy()
+    free = ~walls
+
+    # Horizontal runs of free space
+    edges = np.diff(np.pad(free, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    _rows, run_ends = np.nonzero(edges == -1)
+    parent = list(range(len(run_rows)))
+
+    # Union runs that overlap a run in the previous row
+    row_index = np.searchsorted(run_rows, np.arange(height + 1))
+    for row in range(1, height):
+        a, a_end = row_index[row - 1], row_index[row]
+        b, b_end = row_index[row], row_index[row + 1]
+        while a < a_end and b < b_end:
+            if run_starts[a] < run_ends[b] and run_starts[b] < run_ends[a]:
+                ra, rb = _find(parent, a), _find(parent, b)
+                if ra != rb:
+                    parent[rb] = ra
+            if run_ends[a] < run_ends[b]:
+                a += 1
+            else:
+                b += 1
+
+    components = {}
+    for i in range(len(run_rows)):
+        root = _find(parent, i)
+        row, start, end = int(run_rows[i]), int(run_starts[i]), int(run_ends[i])
+        comp = components.setdefault(root, [width, height, 0, 0, 0])
+        comp[0], comp[1] = min(comp[0], start), min(comp[1], row)
+        comp[2], comp[3] = max(comp[2], end), max(comp[3], row + 1)
+        comp[4] += end - start
+
+    min_area = MIN_SEGMENT_AREA_FRACTION * height * width
+    segments = []
+    for x0, y0, x1, y1, area in components.values():
+        if area < min_area or x0 == 0 or y0 == 0 or x1 == width or y1 == height:
+            continue
+        # Undo the dilation, which shrank every room by `gap` on each side
+        segments.append({
+            "bbox": {
+                "x": round((x0 - gap) / scale, 1),
+                "y": round((y0 - gap) / scale, 1),
+                "w": round((x1 - x0 + 2 * gap) / scale, 1),
+                "h": round((y1 - y0 + 2 * gap) / scale, 1)
+            },
+            "area_px": int(area / (scale * scale))
+        })
+    return sorted(segments, key=lambda s: -s["area_px"])
+
+
+def room_bbox(room):
+    """(x, y, w, h) with w, h >= 0, even when the model returned a negative width, height or radius."""
+    coords = room.get("coords") or {}
+    if room.get("shape_type") == "rect" and all(k in coords for k in ("x", "y", "w", "h")):
+        x, y, w, h = coords["x"], coords["y"], coords["w"], coords["h"]
+        return min(x, x + w), min(y, y + h), abs(w), abs(h)
+    if room.get("shape_type") == "circle" and all(k in coords for k in ("cx", "cy", "r")):
+        r = abs(coords["r"])
+        return coords["cx"] - r, coords["cy"] - r, 2 * r, 2 * r
+    if room.get("points"):
+        xs, ys = [p[0] for p in room["points"]], [p[1] for p in room["points"]]
+        return min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)
+    return None
+
+
+def bbox_iou(a, b):
+    """IoU of two (x, y, w, h) boxes."""
+    ix = max(0, min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0]))
+    iy = max(0, min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1]))
+    intersection = ix * iy
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+# --- 5. ENTRY POINT ---
+def refine_rooms(image, rooms):
+    """
+    Snaps room geometry to detected walls, in place, and cross-checks each
+    room against the connected-component segmentation.
+
+    Each room gets a "geometry_refinement" entry with the number of snapped
+    edges, the factor its calculated_area was rescaled by (None when
+    nothing moved) and the IoU with the segment under the room's centre.
+
+    Returns:
+        dict: Summary (rooms snapped, segments found, elapsed ms).
+    """
+    start = time.perf_counter()
+    ink, scale = binarize(image)
+    lines = extract_wall_lines(ink)
+    tolerance = max(SNAP_TOLERANCE_PX, SNAP_TOLERANCE_FRACTION * max(image.size)) * scale
+
+    segments = segment_rooms(image)
+
+    snapped_rooms = 0
+    for room in rooms:
+        edges = 0
+        shape = room.get("shape_type")
+        coords = room.get("coords") or {}
+        if shape == "rect" and all(k in coords for k in ("x", "y", "w", "h")):
+            before = _outline(room)
+            snapped, edges = _snap_rect(coords, lines, scale, tolerance)
+            if snapped:
+                room["coords"] = dict(coords, **snapped)
+        elif shape == "polygon" and len(room.get("points") or []) >= 3:
+            before = _outline(room)
+            room["points"], edges = _snap_polygon(room["points"], lines, scale, tolerance)
+        snapped_rooms += edges > 0
+
+        area_scale = _rescale_measurements(room, before, _outline(room)) if edges else None
+        check = {"snapped_edges": edges, "area_scale": area_scale, "segment_iou": None}
+        bbox = room_bbox(room)
+        if bbox:
+            cx, cy = bbox[0] + bbox[2] / 2, bbox[1] + bbox[3] / 2
+            # Smallest segment first, so nested rooms win over their surroundings
+            for segment in reversed(segments):
+                s = segment["bbox"]
+                if s["x"] <= cx <= s["x"] + s["w"] and s["y"] <= cy <= s["y"] + s["h"]:
+                    check["segment_iou"] = round(bbox_iou(bbox, (s["x"], s["y"], s["w"], s["h"])), 3)
+                    break
+        room["geometry_refinement"] = check
+
+    return {
+        "snapped_rooms": snapped_rooms,
+        "wall_lines": len(lines["horizontal"]) + len(lines["vertical"]),
+        "segments": len(segments),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
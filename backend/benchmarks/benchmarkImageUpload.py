@@ -0,0 +1,85 @@
+"""
+Benchmark: inline base64 data URLs vs. uploaded-file handles.
+
+Measures, per request, the serialized request body size (what goes out to the
+model API) and the peak Python memory used to build and serialize it. Uses the
+"local" upload mode as a stand-in for the Gemini Files API, so no API key or
+network is needed.
+
+    python backend/benchmarks/benchmarkImageUpload.py --image ./plans/floor1.png --requests 5
+"""
+import argparse
+import io
+import json
+import mimetypes
+import os
+import sys
+import tempfile
+import tracemalloc
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "..", "api"))
+import geminiService
+from detectionPrompts import USER_PROMPT
+
+
+def synthetic_plan():
+    """A large grayscale PNG, for when no image is given."""
+    from PIL import Image, ImageDraw
+    image = Image.new("L", (4000, 3000), 255)
+    draw = ImageDraw.Draw(image)
+    for i in range(0, 4000, 250):
+        draw.line([(i, 0), (i, 3000)], fill=0, width=4)
+        draw.line([(0, i), (4000, i)], fill=0, width=4)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue(), "image/png"
+
+
+def measure_request(file_content, mime_type):
+    tracemalloc.start()
+    messages_payload = [
+        {
+            "role": "user",
+            "content": [
+                { "type": "text", "text": USER_PROMPT },
+                geminiService.build_image_part(file_content, mime_type)
+            ]
+        }
+    ]
+    body = json.dumps({"model": "benchmark", "messages": messages_payload})
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(body.encode('utf-8')), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--image", help="Floor plan image (a synthetic plan is used if omitted)")
+    parser.add_argument("--requests", type=int, default=5, help="Requests (re-analyses) of the same image")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            file_content = f.read()
+        mime_type = mimetypes.guess_type(args.image)[0] or "image/jpeg"
+    else:
+        file_content, mime_type = synthetic_plan()
+
+    print(f"Image: {len(file_content) / 1024:.0f} KiB ({mime_type}), {args.requests} requests\n")
+    print(f"{'mode':<8} {'request':>8} {'body KiB':>10} {'peak mem KiB':>13}")
+
+    geminiService.LOCAL_UPLOAD_DIR = tempfile.mkdtemp(prefix="ocelot-bench-")
+    for mode in ("inline", "local"):
+        geminiService.IMAGE_UPLOAD_MODE = mode
+        geminiService._upload_handles.clear()
+        total_bytes = 0
+        for i in range(args.requests):
+            body_bytes, peak = measure_request(file_content, mime_type)
+            total_bytes += body_bytes
+            print(f"{mode:<8} {i + 1:>8} {body_bytes / 1024:>10.1f} {peak / 1024:>13.1f}")
+        print(f"{mode:<8} {'total':>8} {total_bytes / 1024:>10.1f}\n")
+
+
+if __name__ == "__main__":
+    main()
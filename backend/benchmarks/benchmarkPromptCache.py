@@ -0,0 +1,125 @@
+"""
+Benchmark: inline prompt vs. cached prompt prefix (PROMPT_CACHE_MODE).
+
+Runs detection requests through geminiService against a local stand-in model
+that bills and "prefills" only the prompt tokens it has not cached, so no
+API key or network is needed. Reports uncached/cached prompt tokens and
+latency per request, and checks that a lost cache handle falls back to the
+inline prompt.
+
+    python backend/benchmarks/benchmarkPromptCache.py --requests 20
+
+The stand-in's costs are assumptions (see StandInModel); use
+evaluateModels.py for real latency once caching is on in production.
+"""
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "..", "api"))
+import geminiService
+from detectionPrompts import MODEL_TYPE, USER_PROMPT
+
+
+class StandInModel:
+    """
+    Mimics client.chat.completions.create() closely enough for geminiService.
+
+    Prompt tokens are estimated at ~4 characters per token plus a fixed
+    IMAGE_TOKENS per image. Prefill takes PREFILL_SECONDS_PER_1K_TOKENS for
+    uncached tokens and CACHED_PREFILL_FACTOR of that for cached ones.
+    """
+    IMAGE_TOKENS = 258
+    PREFILL_SECONDS_PER_1K_TOKENS = 0.08
+    CACHED_PREFILL_FACTOR = 0.1
+    COMPLETION = '{"rooms": []}'
+
+    def __init__(self, lose_handle_after=None):
+        self.calls = 0
+        self.lose_handle_after = lose_handle_after
+        self.lost = set()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _cached_text(self, name):
+        for entry in geminiService._prompt_caches.values():
+            if entry["name"] == name:
+                return entry["text"]
+        return None
+
+    def create(self, model, messages, response_format=None, extra_body=None):
+        self.calls += 1
+        uncached = 0
+        for message in messages:
+            for part in message["content"]:
+                uncached += self.IMAGE_TOKENS if part["type"] == "image_url" else len(part["text"]) // 4
+
+        cached = 0
+        name = ((extra_body or {}).get("extra_body") or {}).get("google", {}).get("cached_content")
+        if name:
+            if self.lose_handle_after is not None and self.calls == self.lose_handle_after + 1:
+                self.lost.add(name)
+            text = None if name in self.lost else self._cached_text(name)
+            if text is None:
+                error = RuntimeError(f"CachedContent not found: {name}")
+                error.status_code = 404
+                raise error
+            cached = len(text) // 4
+
+        time.sleep((uncached + cached * self.CACHED_PREFILL_FACTOR) / 1000 * self.PREFILL_SECONDS_PER_1K_TOKENS)
+        prompt_tokens = uncached + cached
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=len(self.COMPLETION) // 4,
+                                total_tokens=prompt_tokens + len(self.COMPLETION) // 4,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=cached))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.COMPLETION))], usage=usage)
+
+
+def run(mode, requests, lose_handle_after=None):
+    geminiService.PROMPT_CACHE_MODE = mode
+    geminiService._prompt_caches.clear()
+    stand_in = StandInModel(lose_handle_after)
+    geminiService.client = stand_in
+
+    image_part = {"type": "image_url", "image_url": {"url": "data:image/png;base64," + base64.b64encode(b"plan").decode("ascii")}}
+    messages_payload = [{"role": "user", "content": [{ "type": "text", "text": USER_PROMPT }, image_part]}]
+
+    stats = {"uncached": [], "cached": [], "latency": [], "failures": 0}
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            _content, usage = geminiService.call_gemini_api_with_usage(MODEL_TYPE, messages_payload)
+        except Exception as e:
+            print(f"[{mode}] call failed: {e}")
+            stats["failures"] += 1
+            continue
+        stats["latency"].append(time.perf_counter() - start)
+        stats["cached"].append(usage.get("cached_tokens", 0))
+        stats["uncached"].append(usage["prompt_tokens"] - usage.get("cached_tokens", 0))
+    stats["upstream_calls"] = stand_in.calls
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20, help="Detection requests per mode")
+    args = parser.parse_args()
+
+    print(f"USER_PROMPT: {len(USER_PROMPT)} chars (~{len(USER_PROMPT) // 4} tokens), {args.requests} requests\n")
+    runs = {
+        "inline": run("off", args.requests),
+        "cached": run("local", args.requests),
+        # The stand-in forgets the handle half way; every request must still succeed
+        "cached, handle lost": run("local", args.requests, lose_handle_after=args.requests // 2),
+    }
+    print(f"\n{'mode':<20} {'calls':>6} {'fail':>5} {'uncached tok':>13} {'cached tok':>11} {'latency ms':>11}")
+    for label, stats in runs.items():
+        print(f"{label:<20} {stats['upstream_calls']:>6} {stats['failures']:>5} {statistics.mean(stats['uncached']):>13.0f} "
+              f"{statistics.mean(stats['cached']):>11.0f} {statistics.mean(stats['latency']) * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
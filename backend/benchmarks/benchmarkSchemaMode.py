@@ -0,0 +1,168 @@
+"""
+Benchmark: legacy JSON-example prompt vs. structured-output schema mode.
+
+Reports prompt tokens, latency and parse-failure rate for room detection.
+
+    # Prompt size only (no API key needed)
+    python backend/benchmarks/benchmarkSchemaMode.py
+
+    # Live run against Gemini, 3 trials per image and mode
+    python backend/benchmarks/benchmarkSchemaMode.py --images ./plans --trials 3
+
+A response counts as a parse failure if it is not valid JSON or does not
+match DETECTION_SCHEMA.
+"""
+import argparse
+import base64
+import json
+import mimetypes
+import os
+import statistics
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "..", "api"))
+from responseSchemas import DETECTION_SCHEMA, validate_response
+from detectionPrompts import MODEL_TYPE, USER_PROMPT
+
+# The example that used to be pasted into USER_PROMPT before schema mode.
+LEGACY_EXAMPLE = {
+    "rooms": [
+        {
+            "id": 1, "name": "Gymnasium", "type": "gym", "calculated_area": 10000,
+            "shape_type": "rect", "coords": {"x": 520, "y": 250, "w": 450, "h": 560},
+            "walls": [
+                {"sequence_order": 1, "length": 92, "unit": "ft"},
+                {"sequence_order": 2, "length": 112, "unit": "ft"},
+                {"sequence_order": 3, "length": 92, "unit": "ft"},
+                {"sequence_order": 4, "length": 112, "unit": "ft"}
+            ]
+        },
+        {
+            "id": 2, "name": "Lounge", "type": "lounge", "calculated_area": 314,
+            "shape_type": "circle", "coords": {"cx": 400, "cy": 450, "r": 60},
+            "walls": [
+                {"sequence_order": 1, "length": 62.8, "unit": "ft", "note": "circumference"}
+            ]
+        },
+        {
+            "id": 3, "name": "Vestibule", "type": "vestibule", "calculated_area": 500,
+            "shape_type": "polygon", "points": [[360, 820], [460, 910], [500, 870], [400, 780]],
+            "walls": [
+                {"sequence_order": 1, "length": 25, "unit": "ft"},
+                {"sequence_order": 2, "length": 20, "unit": "ft"},
+                {"sequence_order": 3, "length": 25, "unit": "ft"},
+                {"sequence_order": 4, "length": 20, "unit": "ft"}
+            ]
+        }
+    ]
+}
+
+LEGACY_PROMPT = (
+    USER_PROMPT + "\n\n"
+    "JSON Schema: Adhere strictly to this JSON structure:\n"
+    + json.dumps(LEGACY_EXAMPLE, indent=2) + "\n\n"
+    "Return ONLY valid JSON, no markdown formatting, no code blocks, no explanatory text."
+)
+
+MODES = {
+    "legacy": {"prompt": LEGACY_PROMPT, "schema": None},
+    "schema": {"prompt": USER_PROMPT, "schema": DETECTION_SCHEMA},
+}
+
+
+def estimate_tokens(text):
+    """Rough token estimate (~4 characters per token) for offline comparison."""
+    return len(text) // 4
+
+
+def is_parse_failure(content):
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return True
+    return bool(validate_response(data, DETECTION_SCHEMA))
+
+
+def run_live(image_paths, trials):
+    from geminiService import call_gemini_api_with_usage
+
+    results = {mode: {"prompt_tokens": [], "latency": [], "failures": 0, "calls": 0} for mode in MODES}
+
+    for path in image_paths:
+        with open(path, "rb") as f:
+            base64_image = base64.b64encode(f.read()).decode('utf-8')
+        mime_type = mimetypes.guess_type(path)[0] or "image/jpeg"
+
+        for mode, config in MODES.items():
+            messages_payload = [
+                {
+                    "role": "user",
+                    "content": [
+                        { "type": "text", "text": config["prompt"] },
+                        {
+                            "type": "image_url",
+                            "image_url": { "url": f"data:{mime_type};base64,{base64_image}" }
+                        }
+                    ]
+                }
+            ]
+
+            for _ in range(trials):
+                stats = results[mode]
+                stats["calls"] += 1
+                start = time.perf_counter()
+                try:
+                    content, usage = call_gemini_api_with_usage(
+                        model=MODEL_TYPE,
+                        messages=messages_payload,
+                        response_schema=config["schema"],
+                        schema_name="room_detection"
+                    )
+                except Exception as e:
+                    print(f"[{mode}] {os.path.basename(path)}: call failed: {e}")
+                    stats["failures"] += 1
+                    continue
+
+                stats["latency"].append(time.perf_counter() - start)
+                if usage.get("prompt_tokens") is not None:
+                    stats["prompt_tokens"].append(usage["prompt_tokens"])
+                if is_parse_failure(content):
+                    stats["failures"] += 1
+
+    return results
+
+
+def print_report(results):
+    print(f"\n{'mode':<8} {'calls':>6} {'prompt tok (mean)':>18} {'latency p50 (s)':>16} {'latency max (s)':>16} {'parse fail %':>13}")
+    for mode, stats in results.items():
+        tokens = statistics.mean(stats["prompt_tokens"]) if stats["prompt_tokens"] else float("nan")
+        p50 = statistics.median(stats["latency"]) if stats["latency"] else float("nan")
+        worst = max(stats["latency"]) if stats["latency"] else float("nan")
+        fail_rate = 100.0 * stats["failures"] / stats["calls"] if stats["calls"] else float("nan")
+        print(f"{mode:<8} {stats['calls']:>6} {tokens:>18.0f} {p50:>16.2f} {worst:>16.2f} {fail_rate:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="Directory of floor plan images for a live run")
+    parser.add_argument("--trials", type=int, default=1, help="Calls per image and mode")
+    args = parser.parse_args()
+
+    print("Text prompt size (estimated tokens, excluding the image):")
+    for mode, config in MODES.items():
+        print(f"  {mode:<8} {len(config['prompt']):>6} chars  ~{estimate_tokens(config['prompt'])} tokens")
+
+    if not args.images:
+        return
+
+    image_paths = sorted(
+        os.path.join(args.images, name) for name in os.listdir(args.images)
+        if (mimetypes.guess_type(name)[0] or "").startswith("image/")
+    )
+    print_report(run_live(image_paths, args.trials))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+"""
+Evaluate prompt / model variants for room detection against a golden corpus.
+
+Corpus layout: every image has a JSON file with the same name holding the
+expected rooms, in the same shape the detection endpoints return (pixel
+geometry of that image, calculated_area in sq ft, category):
+
+    corpus/
+      plan-a.png   plan-a.json   {"rooms": [{"name": ..., "shape_type": "rect", "coords": {...},
+      plan-b.jpg   plan-b.json               "calculated_area": 120, "category": "PFSA Space"}, ...]}
+
+    # Live run of the current detectRoomsV2 model and prompt, recording responses
+    python backend/benchmarks/evaluateModels.py --corpus ./corpus --record ./cassettes --out current.json
+
+    # Compare against a cheaper model with a rewritten prompt
+    python backend/benchmarks/evaluateModels.py --corpus ./corpus --record ./cassettes \\
+        --variant pro=gemini-3-pro-preview --variant lite=gemini-2.5-flash-lite:prompts/short.txt
+
+    # Coarse-to-fine detection (what detectRoomsV2 runs by default) with a cheaper refine model
+    python backend/benchmarks/evaluateModels.py --corpus ./corpus --c2f-variant flash-c2f=gemini-2.5-flash
+
+    # Re-score recorded responses without calling the API, and check for regressions
+    python backend/benchmarks/evaluateModels.py --corpus ./corpus --replay ./cassettes --baseline current.json
+
+Without variants, the current detectRoomsV2 setup is evaluated both ways:
+"current" (one call on the whole plan) and "current-c2f" (coarseToFine,
+which the endpoints only use with COARSE_TO_FINE=1, falling back to the
+single call the way they do). Coarse-to-fine
+runs make several calls, so they report latency but no token counts.
+
+Rooms are matched to golden rooms by bounding-box IoU. Categories are
+scored after running predictions through roomCategories.assign_categories,
+the same step categorizeRooms applies. Recordings are keyed by pipeline,
+model, prompt, image and trial, so editing a prompt never replays stale
+responses and every trial keeps its own response.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "..", "api"))
+from responseSchemas import DETECTION_SCHEMA, validate_response
+from detectionPrompts import MODEL_TYPE, USER_PROMPT
+from coarseToFine import COARSE_TO_FINE_VERSION
+from roomCategories import assign_categories
+from wallRefinement import bbox_iou, room_bbox
+
+# Higher is better for these; lower is better for the rest of REGRESSION_METRICS
+HIGHER_IS_BETTER = {"recall", "precision", "f1", "category_accuracy"}
+REGRESSION_METRICS = ["recall", "precision", "f1", "category_accuracy", "area_error_median"]
+
+
+# --- 1. CORPUS & VARIANTS ---
+def load_corpus(corpus_dir):
+    samples = []
+    for name in sorted(os.listdir(corpus_dir)):
+        mime_type = mimetypes.guess_type(name)[0] or ""
+        if not mime_type.startswith("image/"):
+            continue
+        label_path = os.path.join(corpus_dir, os.path.splitext(name)[0] + ".json")
+        if not os.path.exists(label_path):
+            print(f"Skipping {name}: no {os.path.basename(label_path)}")
+            continue
+        with open(os.path.join(corpus_dir, name), "rb") as f:
+            content = f.read()
+        with open(label_path) as f:
+            golden = json.load(f)["rooms"]
+        samples.append({"name": name, "mime_type": mime_type, "content": content,
+                        "sha256": hashlib.sha256(content).hexdigest(), "golden": golden})
+    return samples
+
+
+def parse_variant(spec):
+    """'label=model' or 'label=model:prompt_file' -> {"label", "model", "prompt"}."""
+    label, _, rest = spec.partition("=")
+    model, _, prompt_path = rest.partition(":")
+    if not label or not model:
+        raise argparse.ArgumentTypeError(f"Variant must look like label=model[:prompt_file], got '{spec}'")
+    prompt = USER_PROMPT
+    if prompt_path:
+        with open(prompt_path) as f:
+            prompt = f.read()
+    return {"label": label, "model": model, "prompt": prompt, "pipeline": "single"}
+
+
+def parse_c2f_variant(spec):
+    """'label=model' -> coarse-to-fine variant refining with model (prompts are coarseToFine's own)."""
+    label, _, model = spec.partition("=")
+    if not label or not model:
+        raise argparse.ArgumentTypeError(f"Coarse-to-fine variant must look like label=model, got '{spec}'")
+    return {"label": label, "model": model, "prompt": COARSE_TO_FINE_VERSION, "pipeline": "coarse-to-fine"}
+
+
+# --- 2. RECORD / REPLAY ---
+def cassette_path(cassette_dir, variant, sample, trial):
+    parts = [variant["pipeline"], variant["model"], variant["prompt"], sample["sha256"], str(trial)]
+    key = hashlib.sha256("\0".join(parts).encode("utf-8"))
+    return os.path.join(cassette_dir, f"{key.hexdigest()[:24]}.json")
+
+
+def _single_call(variant, sample):
+    from geminiService import call_gemini_api_with_usage
+
+    messages_payload = [
+        {
+            "role": "user",
+            "content": [
+                { "type": "text", "text": variant["prompt"] },
+                {
+                    "type": "image_url",
+                    "image_url": { "url": f"data:{sample['mime_type']};base64,{base64.b64encode(sample['content']).decode('utf-8')}" }
+                }
+            ]
+        }
+    ]
+    return call_gemini_api_with_usage(
+        model=variant["model"],
+        messages=messages_payload,
+        response_schema=DETECTION_SCHEMA,
+        schema_name="room_detection"
+    )
+
+
+def _coarse_to_fine(variant, sample):
+    import io
+    from PIL import Image
+    from coarseToFine import detect_coarse_to_fine
+    from geminiService import build_image_part
+
+    image = Image.open(io.BytesIO(sample["content"]))
+    # Whatever COARSE_TO_FINE says, so the evaluation can decide whether to turn it on
+    result = detect_coarse_to_fine(image, build_image_part(sample["content"], sample["mime_type"]), variant["model"],
+                                   enabled=True)
+    if result is None:
+        # The endpoint falls back to one call on the whole plan; so does the evaluation
+        content, usage = _single_call(dict(variant, prompt=USER_PROMPT), sample)
+        return content, dict(usage, fallback=True)
+    return json.dumps({"rooms": result["rooms"]}), {}
+
+
+def run_one(variant, sample, trial=0, record_dir=None, replay_dir=None):
+    """Returns {"content", "usage", "latency", "error"} for one run of a variant, live or replayed."""
+    if replay_dir:
+        path = cassette_path(replay_dir, variant, sample, trial)
+        if not os.path.exists(path):
+            return {"content": None, "usage": {}, "latency": None, "error": "not recorded"}
+        with open(path) as f:
+            return json.load(f)
+
+    start = time.perf_counter()
+    try:
+        run = _coarse_to_fine if variant["pipeline"] == "coarse-to-fine" else _single_call
+        content, usage = run(variant, sample)
+        result = {"content": content, "usage": usage, "latency": time.perf_counter() - start, "error": None}
+    except Exception as e:
+        # Failed calls are not recorded, so a replay retries them live next time
+        return {"content": None, "usage": {}, "latency": time.perf_counter() - start, "error": str(e)}
+
+    if record_dir:
+        os.makedirs(record_dir, exist_ok=True)
+        with open(cassette_path(record_dir, variant, sample, trial), "w") as f:
+            json.dump(dict(result, model=variant["model"], pipeline=variant["pipeline"], image=sample["name"],
+                           trial=trial), f)
+    return result
+
+
+# --- 3. SCORING ---
+def match_rooms(predicted, golden, min_iou):
+    """Greedy one-to-one matching by bbox IoU. Returns [(predicted_room, golden_room, iou)]."""
+    pairs = []
+    for i, p in enumerate(predicted):
+        p_box = room_bbox(p)
+        for j, g in enumerate(golden):
+            g_box = room_bbox(g)
+            if p_box and g_box:
+                iou = bbox_iou(p_box, g_box)
+                if iou >= min_iou:
+                    pairs.append((iou, i, j))
+    used_p, used_g, matches = set(), set(), []
+    for iou, i, j in sorted(pairs, reverse=True):
+        if i not in used_p and j not in used_g:
+            used_p.add(i)
+            used_g.add(j)
+            matches.append((predicted[i], golden[j], iou))
+    return matches
+
+
+def score_response(content, golden, min_iou):
+    try:
+        data = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        return None
+    if validate_response(data, DETECTION_SCHEMA):
+        return None
+
+    # Categorize the way categorizeRooms does
+    predicted = assign_categories({"rooms": data.get("rooms", [])})["rooms"]
+    matches = match_rooms(predicted, golden, min_iou)
+
+    area_errors, correct_categories = [], 0
+    for p, g, _iou in matches:
+        if g.get("calculated_area"):
+            area_errors.append(abs((p.get("calculated_area") or 0) - g["calculated_area"]) / g["calculated_area"])
+        if p.get("category") == g.get("category"):
+            correct_categories += 1
+    return {"predicted": len(predicted), "golden": len(golden), "matched": len(matches),
+            "area_errors": area_errors, "correct_categories": correct_categories}
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(variant, runs, prices):
+    scores = [r["score"] for r in runs if r["score"]]
+    predicted = sum(s["predicted"] for s in scores)
+    golden = sum(s["golden"] for s in scores)
+    matched = sum(s["matched"] for s in scores)
+    area_errors = [e for s in scores for e in s["area_errors"]]
+    latencies = [r["latency"] for r in runs if r["latency"] is not None and not r["error"]]
+    prompt_tokens = [r["usage"].get("prompt_tokens") or 0 for r in runs if r["usage"].get("total_tokens")]
+    completion_tokens = [r["usage"].get("completion_tokens") or 0 for r in runs if r["usage"].get("total_tokens")]
+
+    recall = matched / golden if golden else None
+    precision = matched / predicted if predicted else None
+    summary = {
+        "model": variant["model"],
+        "pipeline": variant["pipeline"],
+        "prompt_sha256": hashlib.sha256(variant["prompt"].encode("utf-8")).hexdigest()[:12],
+        "calls": len(runs),
+        "failures": len(runs) - len(scores),
+        "recall": recall,
+        "precision": precision,
+        "f1": 2 * recall * precision / (recall + precision) if recall and precision else None,
+        "area_error_median": statistics.median(area_errors) if area_errors else None,
+        "area_error_mean": statistics.mean(area_errors) if area_errors else None,
+        "category_accuracy": sum(s["correct_categories"] for s in scores) / matched if matched else None,
+        "latency_p50": _percentile(latencies, 0.5),
+        "latency_p90": _percentile(latencies, 0.9),
+        "latency_max": max(latencies) if latencies else None,
+        "prompt_tokens_mean": statistics.mean(prompt_tokens) if prompt_tokens else None,
+        "completion_tokens_mean": statistics.mean(completion_tokens) if completion_tokens else None,
+        "cost_per_call_usd": None
+    }
+    price = prices.get(variant["model"])
+    if price and prompt_tokens:
+        summary["cost_per_call_usd"] = (summary["prompt_tokens_mean"] * price["input"]
+                                        + summary["completion_tokens_mean"] * price["output"]) / 1e6
+    return summary
+
+
+# --- 4. REPORT ---
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else "-"
+
+
+def print_report(report):
+    print(f"\n{'variant':<12} {'calls':>5} {'fail':>4} {'recall':>7} {'prec':>7} {'f1':>7} {'area err':>9} "
+          f"{'cat acc':>8} {'p50 s':>7} {'p90 s':>7} {'in tok':>8} {'out tok':>8} {'$/call':>8}")
+    for label, s in report["variants"].items():
+        print(f"{label:<12} {s['calls']:>5} {s['failures']:>4} {_fmt(s['recall'], '>7.3f')} {_fmt(s['precision'], '>7.3f')} "
+              f"{_fmt(s['f1'], '>7.3f')} {_fmt(s['area_error_median'], '>9.1%')} {_fmt(s['category_accuracy'], '>8.1%')} "
+              f"{_fmt(s['latency_p50'], '>7.2f')} {_fmt(s['latency_p90'], '>7.2f')} {_fmt(s['prompt_tokens_mean'], '>8.0f')} "
+              f"{_fmt(s['completion_tokens_mean'], '>8.0f')} {_fmt(s['cost_per_call_usd'], '>8.4f')}")
+
+
+def compare(report, baseline, tolerance, latency_tolerance):
+    """Prints metric deltas against a baseline report. Returns the list of regressions."""
+    regressions = []
+    print("\nChange vs baseline:")
+    for label, current in report["variants"].items():
+        previous = baseline["variants"].get(label)
+        if previous is None:
+            print(f"  {label}: not in baseline")
+            continue
+        deltas = []
+        for metric in REGRESSION_METRICS + ["latency_p50"]:
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None:
+                continue
+            deltas.append(f"{metric} {new - old:+.3f}")
+            if metric == "latency_p50":
+                worse = old > 0 and new > old * (1 + latency_tolerance)
+            elif metric in HIGHER_IS_BETTER:
+                worse = new < old - tolerance
+            else:
+                worse = new > old + tolerance
+            if worse:
+                regressions.append(f"{label}: {metric} {old:.3f} -> {new:.3f}")
+        print(f"  {label}: " + ", ".join(deltas))
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="Directory of images with golden <name>.json labels")
+    parser.add_argument("--variant", action="append", type=parse_variant,
+                        help="label=model[:prompt_file]; one call on the whole plan. Repeatable")
+    parser.add_argument("--c2f-variant", action="append", type=parse_c2f_variant,
+                        help="label=model; coarse-to-fine detection refining with model. Repeatable")
+    parser.add_argument("--trials", type=int, default=1, help="Calls per image and variant")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel calls")
+    parser.add_argument("--iou", type=float, default=0.5, help="Minimum bbox IoU for a room to count as found")
+    parser.add_argument("--record", help="Directory to save responses to")
+    parser.add_argument("--replay", help="Directory of recorded responses; no API calls are made")
+    parser.add_argument("--prices", help="JSON file: {model: {\"input\": usd_per_1m_tokens, \"output\": usd_per_1m_tokens}}")
+    parser.add_argument("--out", help="Write the report as JSON")
+    parser.add_argument("--baseline", help="Previous JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Allowed absolute drop in quality metrics")
+    parser.add_argument("--latency-tolerance", type=float, default=0.2, help="Allowed relative increase in p50 latency")
+    args = parser.parse_args()
+
+    variants = (args.variant or []) + (args.c2f_variant or [])
+    if not variants:
+        variants = [parse_variant(f"current={MODEL_TYPE}"), parse_c2f_variant(f"current-c2f={MODEL_TYPE}")]
+    prices = {}
+    if args.prices:
+        with open(args.prices) as f:
+            prices = json.load(f)
+
+    samples = load_corpus(args.corpus)
+    if not samples:
+        print("No labeled images found.")
+        return
+
+    # 1. Run every (variant, image, trial) in parallel
+    jobs = [(v, s, t) for v in variants for s in samples for t in range(args.trials)]
+    progress = {"done": 0}
+    progress_lock = threading.Lock()
+
+    def job(item):
+        variant, sample, trial = item
+        result = run_one(variant, sample, trial, args.record, args.replay)
+        result["score"] = score_response(result["content"], sample["golden"], args.iou) if not result.get("error") else None
+        with progress_lock:
+            progress["done"] += 1
+            status = result.get("error") or ("ok" if result["score"] else "invalid response")
+            print(f"[{progress['done']}/{len(jobs)}] {variant['label']} {sample['name']} #{trial + 1}: {status}")
+        return variant["label"], result
+
+    runs = {v["label"]: [] for v in variants}
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for label, result in pool.map(job, jobs):
+            runs[label].append(result)
+
+    # 2. Summarize and compare
+    report = {
+        "created_at": time.time(),
+        "corpus": {"images": len(samples), "rooms": sum(len(s["golden"]) for s in samples)},
+        "iou_threshold": args.iou,
+        "replayed": bool(args.replay),
+        "variants": {v["label"]: summarize(v, runs[v["label"]], prices) for v in variants}
+    }
+    print_report(report)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.tolerance, args.latency_tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
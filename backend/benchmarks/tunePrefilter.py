@@ -0,0 +1,117 @@
+"""
+Tune blueprintPrefilter thresholds against a labeled corpus.
+
+Expected layout (any image format Pillow can open):
+
+    corpus/
+      blueprint/   valid floor plans
+      other/       everything that should be rejected
+
+    python backend/benchmarks/tunePrefilter.py --corpus ./corpus
+
+Prints how the current THRESHOLDS perform, then grid-searches the reject
+thresholds for the setting that rejects the most non-blueprints while keeping
+false rejects of real blueprints at or below --max-false-reject.
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+from PIL import Image
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "..", "api"))
+from blueprintPrefilter import THRESHOLDS, classify_features, compute_prefilter_features
+
+SEARCH_SPACE = {
+    "blank_max_edge_density": [0.001, 0.002, 0.004],
+    "colour_min_saturated_fraction": [0.4, 0.5, 0.6],
+    "photo_max_orientation_ratio": [0.3, 0.35, 0.4, 0.45],
+    "dense_max_whitespace_fraction": [0.2, 0.3, 0.4],
+}
+
+
+def load_corpus(corpus_dir):
+    samples = []
+    for label in ("blueprint", "other"):
+        folder = os.path.join(corpus_dir, label)
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            try:
+                with Image.open(path) as image:
+                    start = time.perf_counter()
+                    features = compute_prefilter_features(image)
+                    elapsed_ms = (time.perf_counter() - start) * 1000
+            except Exception as e:
+                print(f"Skipping {path}: {e}")
+                continue
+            samples.append({"path": path, "label": label, "features": features, "ms": elapsed_ms})
+    return samples
+
+
+def evaluate(samples, thresholds):
+    counts = {"false_rejects": 0, "true_rejects": 0, "blueprints": 0, "others": 0, "false_reject_paths": []}
+    for sample in samples:
+        verdict, _reason = classify_features(sample["features"], thresholds)
+        if sample["label"] == "blueprint":
+            counts["blueprints"] += 1
+            if verdict == "reject":
+                counts["false_rejects"] += 1
+                counts["false_reject_paths"].append(sample["path"])
+        else:
+            counts["others"] += 1
+            if verdict == "reject":
+                counts["true_rejects"] += 1
+    return counts
+
+
+def print_counts(title, counts):
+    false_rate = counts["false_rejects"] / counts["blueprints"] if counts["blueprints"] else 0.0
+    reject_rate = counts["true_rejects"] / counts["others"] if counts["others"] else 0.0
+    print(f"{title}: rejected {counts['true_rejects']}/{counts['others']} non-blueprints ({reject_rate:.0%}), "
+          f"false rejects {counts['false_rejects']}/{counts['blueprints']} ({false_rate:.1%})")
+    for path in counts["false_reject_paths"]:
+        print(f"    false reject: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="Directory with blueprint/ and other/ subfolders")
+    parser.add_argument("--max-false-reject", type=float, default=0.0, help="Allowed false-reject rate (0..1)")
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus)
+    if not samples:
+        print("No images found.")
+        return
+
+    timings = sorted(s["ms"] for s in samples)
+    print(f"{len(samples)} images, feature extraction p50 {timings[len(timings) // 2]:.1f} ms, max {timings[-1]:.1f} ms")
+    print_counts("Current thresholds", evaluate(samples, THRESHOLDS))
+
+    best = None
+    keys = list(SEARCH_SPACE)
+    for values in itertools.product(*(SEARCH_SPACE[k] for k in keys)):
+        thresholds = dict(THRESHOLDS, **dict(zip(keys, values)))
+        counts = evaluate(samples, thresholds)
+        false_rate = counts["false_rejects"] / counts["blueprints"] if counts["blueprints"] else 0.0
+        if false_rate > args.max_false_reject:
+            continue
+        if best is None or counts["true_rejects"] > best[1]["true_rejects"]:
+            best = (thresholds, counts)
+
+    if best is None:
+        print("No threshold setting meets the false-reject limit.")
+        return
+
+    print_counts("Best thresholds", best[1])
+    print("\nTHRESHOLDS = {")
+    for key, value in best[0].items():
+        print(f"    \"{key}\": {value},")
+    print("}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Shared setup for the backend unit tests.
+
+The API modules import each other by bare name (Vercel puts backend/api on
+the path), so the tests do the same. Every test gets its own analysis store
+directory.
+"""
+import io
+import json
+import os
+import sys
+import tempfile
+from email.message import Message as HTTPMessage
+from unittest import mock
+
+API_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "api"))
+sys.path.insert(0, API_DIR)
+# Before any API module reads it at import time
+os.environ.setdefault("ANALYSIS_STORE_DIR", tempfile.mkdtemp(prefix="ocelot-tests-"))
+
+import pytest
+
+import analysisStore
+
+
+@pytest.fixture
+def store_dir(tmp_path, monkeypatch):
+    """Points the analysis store at an empty directory for one test."""
+    monkeypatch.setattr(analysisStore, "ANALYSIS_STORE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def save_at(timestamp, kind, result, labels=None):
+    """save_analysis() with created_at / updated_at pinned to timestamp."""
+    with mock.patch.object(analysisStore, "_last_commit", 0.0), \
+            mock.patch.object(analysisStore.time, "time", return_value=timestamp):
+        return analysisStore.save_analysis(kind, result, {}, labels)
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status, self.headers, self.body = status, headers, body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def call_handler(handler_class, method, path="/", headers=None, body=b""):
+    """Runs one request through a BaseHTTPRequestHandler subclass without a socket."""
+    handler = handler_class.__new__(handler_class)
+    headers = dict(headers or {})
+    if body:
+        headers.setdefault("Content-Length", str(len(body)))
+    handler.headers = HTTPMessage()
+    for name, value in headers.items():
+        handler.headers[name] = value
+    handler.path, handler.command = path, method
+    handler.rfile, handler.wfile = io.BytesIO(body), io.BytesIO()
+    sent = {"status": None, "headers": {}}
+    handler.send_response = lambda code, message=None: sent.update(status=code)
+    handler.send_header = lambda name, value: sent["headers"].__setitem__(name, value)
+    handler.end_headers = lambda: None
+    handler.send_error = lambda code, message=None: sent.update(status=code)
+    getattr(handler, f"do_{method}")()
+    return Response(sent["status"], sent["headers"], handler.wfile.getvalue())
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from PIL import Image
+
+import coarseToFine
+
+BOXES = {"rooms": [{"id": i, "name": f"Office{i}", "type": "office", "bbox": {"x": 20 + 100 * i, "y": 20, "w": 80, "h": 80}}
+                   for i in range(4)], "feet_per_pixel": 0.1}
+
+
+def refined(crop, x=24, y=24, w=80, h=80):
+    return {"crop": crop, "shape_type": "rect", "coords": {"x": x, "y": y, "w": w, "h": h},
+            "walls": [], "calculated_area": 64.0}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    """Stands in for call_gemini_api: coarse boxes, then whatever replies[...] holds per batch."""
+    replies = []
+
+    def call(model, messages, response_schema, schema_name, timeout=None):
+        if schema_name == "room_boxes":
+            return json.dumps(BOXES)
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return json.dumps({"rooms": reply})
+    monkeypatch.setattr(coarseToFine, "call_gemini_api", call)
+    monkeypatch.setattr(coarseToFine, "REFINE_MAX_CALLS", 1)
+    return replies
+
+
+def detect(**kwargs):
+    return coarseToFine.detect_coarse_to_fine(Image.new("L", (500, 200), 255), {"type": "text", "text": ""},
+                                              "gemini-3-pro-preview", **kwargs)
+
+
+def test_off_unless_enabled(model):
+    assert not coarseToFine.COARSE_TO_FINE_ENABLED   # COARSE_TO_FINE is opt-in
+    assert detect() is None
+
+
+def test_malformed_room_falls_back_alone(model):
+    bad = dict(refined(2), shape_type="polygon", points=[[1, 2, 3], [4]])
+    model.append([refined(1), bad, refined(3), {"crop": 4, "coords": "nonsense"}])
+    result = detect(enabled=True)
+
+    assert [room["refined"] for room in result["rooms"]] == [True, False, True, False]
+    assert result["coarseToFine"]["failed"] == 0
+    assert result["rooms"][1]["coords"] == {"x": 120.0, "y": 20.0, "w": 80.0, "h": 80.0}   # its coarse box
+
+
+def test_failed_call_counts_every_room(model):
+    model.append(TimeoutError("model call timed out"))
+    result = detect(enabled=True)
+    assert result["coarseToFine"]["failed"] == 4
+    assert not any(room["refined"] for room in result["rooms"])
+
+
+def test_batches_respect_call_and_room_limits(monkeypatch):
+    monkeypatch.setattr(coarseToFine, "REFINE_MAX_CALLS", 2)
+    boxes = list(range(15))
+    assert [len(b) for b in coarseToFine._batches(boxes, "gemini-3-pro-preview")] == [8, 7]
+    assert coarseToFine._batches(list(range(21)), "gemini-3-pro-preview") is None
@@ -0,0 +1,90 @@
+import json
+import threading
+
+import pytest
+
+import analysisStore
+import categoryMappings
+import correctRooms
+from conftest import call_handler
+from roomCategories import CAT_COMMON, CAT_PFSA, CAT_SHARED, assign_categories
+
+ROOMS = [{"id": 1, "type": "lounge", "category": CAT_PFSA, "calculated_area": 100}]
+
+
+@pytest.fixture
+def record(store_dir, monkeypatch):
+    monkeypatch.setattr(categoryMappings, "CATEGORY_MAPPINGS_PATH", str(store_dir / "category-mappings.json"))
+    monkeypatch.setattr(correctRooms, "CORRECTIONS_TOKEN", None)
+    return analysisStore.save_analysis("categorizeRooms", {"rooms": [dict(r) for r in ROOMS]}, {})
+
+
+def post(record, body, key=None):
+    headers = {"Content-Type": "application/json", "X-Analysis-Key": record["access_key"] if key is None else key}
+    return call_handler(correctRooms.handler, "POST", body=json.dumps(body).encode("utf-8"), headers=headers)
+
+
+def corrected(category=CAT_COMMON):
+    return [dict(ROOMS[0], category=category)]
+
+
+def test_correction_is_saved_and_counted(record):
+    response = post(record, {"analysisId": record["id"], "version": 1, "rooms": corrected()})
+    assert response.status == 200
+    assert response.json()["version"] == 2 and response.json()["corrections"] == 1
+    saved = analysisStore.load_analysis(record["id"])["result"]["rooms"][0]
+    assert saved["category"] == CAT_COMMON and saved["category_source"] == "user"
+    assert categoryMappings.list_mappings()[0]["votes"] == {CAT_COMMON: 1}
+
+
+def test_stale_version_is_rejected_without_votes(record):
+    assert post(record, {"analysisId": record["id"], "version": 1, "rooms": corrected()}).status == 200
+    response = post(record, {"analysisId": record["id"], "version": 1, "rooms": corrected(CAT_PFSA)})
+    assert response.status == 409 and response.json()["version"] == 2
+    assert categoryMappings.list_mappings()[0]["votes"] == {CAT_COMMON: 1}
+
+
+def test_concurrent_edits_of_one_version_save_once(record):
+    barrier = threading.Barrier(8)
+    real_load = analysisStore.load_analysis
+
+    def slow_update(*args):
+        barrier.wait(timeout=5)   # every request has passed its own checks before any saves
+        return real_update(*args)
+    real_update = analysisStore.update_analysis
+    correctRooms.update_analysis = slow_update
+    try:
+        statuses = []
+        threads = [threading.Thread(target=lambda: statuses.append(
+            post(record, {"analysisId": record["id"], "version": 1, "rooms": corrected()}).status)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        correctRooms.update_analysis = real_update
+    assert sorted(statuses) == [200] + [409] * 7
+    assert real_load(record["id"])["version"] == 2
+
+
+@pytest.mark.parametrize("rooms", [["not a room"], {"id": 1}, [None]])
+def test_malformed_rooms_are_a_400(record, rooms):
+    assert post(record, {"analysisId": record["id"], "rooms": rooms}).status == 400
+
+
+def test_wrong_key_is_a_401(record):
+    assert post(record, {"analysisId": record["id"], "rooms": corrected()}, key="guess").status == 401
+
+
+def test_bearer_token_works_without_the_key(record, monkeypatch):
+    monkeypatch.setattr(correctRooms, "CORRECTIONS_TOKEN", "s3cret")
+    response = call_handler(correctRooms.handler, "POST", headers={"Authorization": "Bearer s3cret"},
+                            body=json.dumps({"analysisId": record["id"], "rooms": corrected()}).encode("utf-8"))
+    assert response.status == 200
+
+
+def test_user_categories_survive_recategorization():
+    data = {"rooms": [dict(ROOMS[0], category=CAT_COMMON, category_source="user"), {"id": 2, "type": "lounge"}]}
+    rooms = assign_categories(data)["rooms"]
+    assert rooms[0]["category"] == CAT_COMMON
+    assert rooms[1]["category"] == CAT_SHARED   # the fixed rule for lounges
@@ -0,0 +1,78 @@
+import io
+import json
+import random
+
+import pytest
+from PIL import Image
+
+import categorizeRooms
+import detectionPipeline
+import detectRoomsV2
+from conftest import call_handler
+from requestScheduler import AdmissionRejected
+
+ROOMS = {"rooms": [{"id": 1, "name": "Office 1", "type": "office", "calculated_area": 120.0,
+                    "shape_type": "rect", "coords": {"x": 10, "y": 10, "w": 100, "h": 80}, "walls": []}]}
+
+
+def upload(labels=None):
+    """Multipart body with a fresh PNG, so neither the response cache nor reuse answers it."""
+    image = Image.new("RGB", (200, 150), tuple(random.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    fields = b"".join(b'--b\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n' % (k.encode(), v.encode())
+                      for k, v in (labels or {}).items())
+    return (fields + b'--b\r\nContent-Disposition: form-data; name="file"; filename="plan.png"\r\n'
+            b'Content-Type: image/png\r\n\r\n' + buffer.getvalue() + b'\r\n--b--\r\n')
+
+
+@pytest.fixture
+def model(store_dir, monkeypatch):
+    calls = []
+
+    def call_with_routing(**kwargs):
+        calls.append(kwargs)
+        if isinstance(model.reply, Exception):
+            raise model.reply
+        return json.dumps(model.reply)
+
+    model.reply, model.calls = ROOMS, calls
+    monkeypatch.setattr(detectionPipeline, "build_image_part", lambda content, mime: {"type": "image_url"})
+    monkeypatch.setattr(detectionPipeline, "find_reusable_analysis", lambda *args, **kwargs: None)
+    monkeypatch.setattr(detectionPipeline, "call_with_routing", call_with_routing)
+    return model
+
+
+def post(handler_class, body):
+    return call_handler(handler_class, "POST", headers={"Content-Type": "multipart/form-data; boundary=b"}, body=body)
+
+
+def test_categorize_adds_categories_and_repeat_uploads_hit_the_cache(model):
+    body = upload({"facility": "HQ"})
+    first = post(categorizeRooms.handler, body)
+    data = first.json()
+    assert first.status == 200 and data["analysisKey"] and data["version"] == 1
+    assert data["rooms"][0]["category"] and "category_summary" in data
+
+    second = post(categorizeRooms.handler, body)
+    assert second.json()["analysisId"] == data["analysisId"] and len(model.calls) == 1
+
+
+def test_detect_skips_categories_and_keys_its_cache_separately(model):
+    body = upload()
+    data = post(detectRoomsV2.handler, body).json()
+    assert "category" not in data["rooms"][0] and "category_summary" not in data
+    post(categorizeRooms.handler, body)
+    assert len(model.calls) == 2
+
+
+def test_admission_rejection_answers_429(model):
+    model.reply = AdmissionRejected("model busy", 7)
+    response = post(detectRoomsV2.handler, upload())
+    assert response.status == 429
+    assert response.headers["Retry-After"] == "7" and response.json()["retry_after"] == 7
+
+
+def test_upload_without_file_is_rejected(model):
+    response = post(categorizeRooms.handler, b'--b\r\nContent-Disposition: form-data; name="floor"\r\n\r\n1\r\n--b--\r\n')
+    assert response.status == 400 and not model.calls
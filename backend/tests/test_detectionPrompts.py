@@ -0,0 +1,15 @@
+import os
+import subprocess
+import sys
+
+from conftest import API_DIR
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(API_DIR), "benchmarks")
+
+
+def test_prompt_users_do_not_import_detection_handlers():
+    # A fresh interpreter, since this test session may already have imported the handlers
+    code = ("import sys; sys.path[:0] = [%r, %r]; import reviseRooms, evaluateModels; "
+            "print(sorted({'detectRoomsV2', 'categorizeRooms'} & set(sys.modules)))") % (API_DIR, BENCHMARKS_DIR)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip().splitlines()[-1] == "[]"
@@ -0,0 +1,36 @@
+import io
+
+import pyarrow.parquet
+import pytest
+
+import analysisExport
+import analysisStore
+import exportAnalyses
+from conftest import call_handler
+
+AUTH = {"Authorization": "Bearer s3cret"}
+
+
+@pytest.fixture
+def token(store_dir, monkeypatch):
+    monkeypatch.setattr(exportAnalyses, "EXPORT_TOKEN", "s3cret")
+    analysisStore.save_analysis("categorizeRooms", {"rooms": [{"id": 1, "name": "Office1", "type": "office",
+                                                               "calculated_area": 120.0}]}, {})
+
+
+def test_parquet_is_the_default(token):
+    response = call_handler(exportAnalyses.handler, "GET", "/api/exportAnalyses?table=rooms", AUTH)
+    assert response.status == 200
+    table = pyarrow.parquet.read_table(io.BytesIO(response.body))
+    assert table.num_rows == 1 and table.column("area_sq_ft").to_pylist() == [120.0]
+
+
+def test_missing_pyarrow_is_a_501_not_csv(token, monkeypatch):
+    monkeypatch.setattr(analysisExport, "pa", None)
+    monkeypatch.setattr(exportAnalyses, "available_formats", analysisExport.available_formats)
+    assert call_handler(exportAnalyses.handler, "GET", "/api/exportAnalyses?table=rooms", AUTH).status == 501
+    assert call_handler(exportAnalyses.handler, "GET", "/api/exportAnalyses?table=rooms&format=csv", AUTH).status == 200
+
+
+def test_no_token_configured_is_a_403(store_dir):
+    assert call_handler(exportAnalyses.handler, "GET", "/api/exportAnalyses?table=rooms", AUTH).status == 403
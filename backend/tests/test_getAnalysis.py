@@ -0,0 +1,42 @@
+import pytest
+
+import analysisStore
+import getAnalysis
+from conftest import call_handler
+
+
+@pytest.fixture
+def record(store_dir, monkeypatch):
+    monkeypatch.setattr(getAnalysis, "ANALYSIS_READ_TOKEN", None)
+    return analysisStore.save_analysis("categorizeRooms", {"rooms": []}, {})
+
+
+def get(record, **headers):
+    return call_handler(getAnalysis.handler, "GET", f"/api/getAnalysis?analysisId={record['id']}", headers)
+
+
+def test_key_reads_and_etag_revalidates_until_edit(record):
+    first = get(record, **{"X-Analysis-Key": record["access_key"]})
+    assert first.status == 200 and first.json()["version"] == 1
+    assert "access_key" not in first.json()
+
+    etag = first.headers["ETag"]
+    assert get(record, **{"X-Analysis-Key": record["access_key"], "If-None-Match": etag}).status == 304
+
+    analysisStore.update_analysis(record["id"], {"rooms": [{"id": 1}]})
+    again = get(record, **{"X-Analysis-Key": record["access_key"], "If-None-Match": etag})
+    assert again.status == 200 and again.json()["version"] == 2
+
+
+def test_without_key_or_token_is_a_401(record):
+    assert get(record).status == 401
+    assert get(record, **{"X-Analysis-Key": "guess"}).status == 401
+
+
+def test_read_token(record, monkeypatch):
+    monkeypatch.setattr(getAnalysis, "ANALYSIS_READ_TOKEN", "s3cret")
+    assert get(record, Authorization="Bearer s3cret").status == 200
+
+
+def test_unknown_id_is_a_404(store_dir):
+    assert call_handler(getAnalysis.handler, "GET", "/api/getAnalysis?analysisId=nope").status == 404
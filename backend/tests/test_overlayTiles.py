@@ -0,0 +1,69 @@
+import io
+
+import pytest
+from PIL import Image
+
+import analysisStore
+import overlayTiles
+from wallRefinement import room_bbox
+
+PLAN = {"width": 1024, "height": 512}
+
+
+def rect(room_id, x, y, w, h, category="PFSA Space"):
+    return {"id": room_id, "name": f"Room{room_id}", "shape_type": "rect", "category": category,
+            "coords": {"x": x, "y": y, "w": w, "h": h}}
+
+
+def record_with(rooms):
+    return {"id": "a", "version": 1, "image": PLAN, "result": {"rooms": rooms}}
+
+
+def render(rooms, z=2, x=0, y=0):
+    record = record_with(rooms)
+    png = overlayTiles.render_tile(record, overlayTiles.pyramid_info(record), "overlay", z, x, y)
+    return Image.open(io.BytesIO(png))
+
+
+def test_negative_size_rect_is_drawn_like_its_normalized_box():
+    flipped = render([rect(1, 100, 100, -60, -40)])
+    normal = render([rect(1, 40, 60, 60, 40)])
+    assert flipped.getbbox() is not None
+    assert flipped.tobytes() == normal.tobytes()
+    assert room_bbox(rect(1, 100, 100, -60, -40)) == (40, 60, 60, 40)
+
+
+def test_malformed_room_is_skipped_not_fatal():
+    broken = {"id": 2, "shape_type": "polygon", "points": [[1, 2, 3], [4]]}
+    tile = render([broken, rect(1, 40, 60, 60, 40)])
+    assert tile == render([rect(1, 40, 60, 60, 40)])
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = overlayTiles.TileCache(10 ** 6)
+    monkeypatch.setattr(overlayTiles, "_tile_cache", cache)
+    return cache
+
+
+def test_edit_keeps_only_tiles_away_from_the_changed_room(store_dir, cache):
+    record = analysisStore.save_analysis("categorizeRooms", {"rooms": [rect(1, 10, 10, 50, 50),
+                                                                      rect(2, 900, 400, 50, 50)]}, PLAN)
+    for tx in range(4):
+        overlayTiles.get_tile(record, "overlay", 2, tx, 0)
+        overlayTiles.get_tile(record, "overlay", 2, tx, 1)
+
+    edited = analysisStore.update_analysis(record["id"], {"rooms": [rect(1, 10, 10, 50, 50),
+                                                                   rect(2, 900, 400, 60, 50, "Common Space")]})
+    hits = [overlayTiles.get_tile(edited, "overlay", 2, tx, ty)[1] for ty in (0, 1) for tx in range(4)]
+    assert hits == [True, True, True, True, True, True, True, False]
+
+
+def test_lru_evicts_oldest_tiles_past_its_byte_budget():
+    cache = overlayTiles.TileCache(10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get("a")
+    cache.put("c", b"1234")
+    assert cache.get("b") is None and cache.get("a") == b"1234"
+    assert cache.metrics()["bytes"] == 8
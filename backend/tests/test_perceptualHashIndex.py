@@ -0,0 +1,77 @@
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+import analysisStore
+import perceptualHashIndex
+from perceptualHashIndex import BKTree, compute_dhash, find_reusable_analysis, hamming_distance
+
+
+def plan(extra_wall=False):
+    image = Image.new("L", (800, 600), 255)
+    draw = ImageDraw.Draw(image)
+    for box in [(50, 50, 400, 300), (400, 50, 750, 300), (50, 300, 750, 550)]:
+        draw.rectangle(box, outline=0, width=6)
+    if extra_wall:
+        draw.line((400, 300, 400, 550), fill=0, width=6)
+    return image
+
+
+def reencoded(image, size=None):
+    buffer = io.BytesIO()
+    (image.resize(size) if size else image).save(buffer, format="JPEG", quality=70)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+@pytest.fixture
+def index(store_dir, monkeypatch):
+    monkeypatch.setattr(perceptualHashIndex, "_index", None)
+    return perceptualHashIndex
+
+
+def store(image, labels=None):
+    info = {"sha256": "x", "phash": compute_dhash(image), "width": image.width, "height": image.height}
+    rooms = [{"id": 1, "shape_type": "rect", "coords": {"x": 50, "y": 50, "w": 350, "h": 250}}]
+    record = analysisStore.save_analysis("detectRoomsV2", {"rooms": rooms}, info, labels)
+    analysisStore.save_reference_image(record["id"], image)
+    return record
+
+
+def test_bk_tree_search_matches_brute_force():
+    rng = random.Random(7)
+    hashes = [f"{rng.getrandbits(64):016x}" for _ in range(300)]
+    tree = BKTree()
+    for i, phash in enumerate(hashes):
+        tree.add(phash, i)
+    query = hashes[0][:-1] + "0"
+    expected = sorted((hamming_distance(query, h), i) for i, h in enumerate(hashes) if hamming_distance(query, h) <= 12)
+    assert tree.search(query, 12) == expected
+
+
+def test_reencoded_plan_is_reused_rescaled(index):
+    record = store(plan())
+    reused = find_reusable_analysis(compute_dhash(reencoded(plan(), (400, 300))), reencoded(plan(), (400, 300)))
+    assert reused["reuse"]["source_analysis_id"] == record["id"]
+    assert reused["rooms"][0]["coords"] == {"x": 25.0, "y": 25.0, "w": 175.0, "h": 125.0}
+
+
+def test_changed_plan_or_other_floor_is_not_reused(index):
+    store(plan(), {"facility": "HQ", "floor": "1"})
+    changed = plan(extra_wall=True)
+    assert find_reusable_analysis(compute_dhash(changed), changed, {"facility": "HQ", "floor": "1"}) is None
+    assert find_reusable_analysis(compute_dhash(plan()), plan(), {"facility": "HQ", "floor": "2"}) is None
+
+
+def test_analyses_stored_by_other_instances_are_picked_up(index, monkeypatch):
+    assert find_reusable_analysis(compute_dhash(plan()), plan()) is None   # builds the (empty) index
+    # Another instance writing to the shared store: no listener runs here
+    monkeypatch.setattr(analysisStore, "_listeners", [])
+    record = store(plan())
+    monkeypatch.setattr(index, "CATCH_UP_INTERVAL", 0.0)
+    assert find_reusable_analysis(compute_dhash(plan()), plan())["reuse"]["source_analysis_id"] == record["id"]
+    # and an edit of an indexed analysis does not add it twice
+    analysisStore.update_analysis(record["id"], {"rooms": []})
+    index._get_index()
+    assert index._index.tree.size == 1
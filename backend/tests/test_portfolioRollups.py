@@ -0,0 +1,92 @@
+import pytest
+
+import portfolioRollups
+from conftest import save_at
+from portfolioRollups import PortfolioRollups, query_rollups
+
+JAN, MAR, MAR_LATER = 1767225600.0, 1772323200.0, 1772409600.0   # 2026-01-01, 2026-03-01, 2026-03-02
+FLOOR = {"region": "EU", "facility": "HQ", "floor": "1"}
+
+
+def categorized(area, category="Office"):
+    return {"rooms": [{"id": 1, "type": "office", "category": category, "calculated_area": area}],
+            "category_summary": {category: {"area": area}}}
+
+
+def detected(area):
+    return {"rooms": [{"id": 1, "type": "office", "calculated_area": area}]}
+
+
+@pytest.fixture
+def rollups(store_dir, monkeypatch):
+    monkeypatch.setattr(portfolioRollups, "SNAPSHOT_PATH", str(store_dir / "rollups.snapshot"))
+    monkeypatch.setattr(portfolioRollups, "JOURNAL_PATH", str(store_dir / "rollups.snapshot.journal"))
+    monkeypatch.setattr(portfolioRollups, "_rollups", None)
+    return portfolioRollups
+
+
+def by_period():
+    return {g["period"]: g["area_sq_ft"] for g in query_rollups(["period"])["groups"]}
+
+
+def test_each_month_keeps_its_latest_analysis(rollups):
+    save_at(JAN, "categorizeRooms", categorized(100), FLOOR)
+    save_at(MAR, "categorizeRooms", categorized(150), FLOOR)
+    save_at(MAR_LATER, "categorizeRooms", categorized(170), FLOOR)
+    assert by_period() == {"2026-01": 100.0, "2026-03": 170.0}
+
+
+def test_older_analysis_does_not_replace_newer_one_in_same_month(rollups):
+    query_rollups()
+    save_at(MAR_LATER, "categorizeRooms", categorized(170), FLOOR)
+    save_at(MAR, "categorizeRooms", categorized(150), FLOOR)
+    assert by_period() == {"2026-03": 170.0}
+
+
+def test_detection_only_analysis_leaves_categorized_floor_alone(rollups):
+    save_at(MAR, "categorizeRooms", categorized(150), FLOOR)
+    query_rollups()
+    save_at(MAR_LATER, "detectRoomsV2", detected(999), FLOOR)
+    save_at(MAR_LATER, "reviseRooms", detected(999), FLOOR)
+    assert by_period() == {"2026-03": 150.0}
+
+
+def test_unlabeled_analyses_are_not_counted(rollups):
+    save_at(MAR, "categorizeRooms", categorized(150))
+    save_at(MAR_LATER, "categorizeRooms", categorized(150))
+    assert query_rollups()["total"] == {"area_sq_ft": 0.0, "rooms": 0}
+
+
+def test_same_facility_in_two_regions_counts_twice(rollups):
+    save_at(MAR, "categorizeRooms", categorized(150), FLOOR)
+    save_at(MAR, "categorizeRooms", categorized(50), dict(FLOOR, region="US"))
+    groups = query_rollups(["region"])["groups"]
+    assert {g["region"]: g["area_sq_ft"] for g in groups} == {"EU": 150.0, "US": 50.0}
+
+
+def test_edit_swaps_contribution(rollups):
+    import analysisStore
+    record = save_at(MAR, "categorizeRooms", categorized(150), FLOOR)
+    query_rollups()
+    analysisStore.update_analysis(record["id"], categorized(80, "Storage"))
+    assert {g["category"]: g["area_sq_ft"] for g in query_rollups()["groups"]} == {"Storage": 80.0}
+
+
+def test_restart_replays_snapshot_and_journal(rollups, monkeypatch):
+    monkeypatch.setattr(rollups, "JOURNAL_COMPACT_LINES", 2)
+    query_rollups()
+    for i, facility in enumerate(["A", "B", "C"]):
+        save_at(MAR + i, "categorizeRooms", categorized(10), dict(FLOOR, facility=facility))
+    assert rollups._rollups.journal_lines == 1   # compacted after the second line
+
+    restored = PortfolioRollups.load()
+    assert restored.slots == rollups._rollups.slots
+    assert restored.table.query([])[0]["area_sq_ft"] == 30.0
+
+
+def test_snapshot_of_another_format_is_rebuilt(rollups, monkeypatch):
+    save_at(MAR, "categorizeRooms", categorized(150), FLOOR)
+    with open(rollups.SNAPSHOT_PATH, "w") as f:
+        f.write('{"watermark": 9e12, "slots": {"HQ|1|24314": {"analysis_id": "x", "created_at": 0, "cells": []}}}')
+    restored = PortfolioRollups.load()
+    assert restored.table.query([])[0]["area_sq_ft"] == 150.0
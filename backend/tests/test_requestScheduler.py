@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+import requestScheduler
+from requestScheduler import PRIORITY_BATCH, PRIORITY_INTERACTIVE, AdmissionRejected, RequestScheduler
+
+MODEL = "test-model"
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    # One token every 0.5s, no burst beyond one call
+    monkeypatch.setitem(requestScheduler.MODEL_RATE_LIMITS, MODEL, {"rate": 2.0, "burst": 1})
+    scheduler = RequestScheduler()
+    scheduler.acquire(MODEL)
+    return scheduler
+
+
+def overtake(scheduler):
+    """Queues an interactive call shortly after the caller, so it takes the next token first."""
+    def run():
+        time.sleep(0.05)
+        scheduler.acquire(MODEL, PRIORITY_INTERACTIVE)
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def test_estimated_wait_over_the_limit_is_rejected_up_front(scheduler, monkeypatch):
+    monkeypatch.setitem(requestScheduler.MAX_ESTIMATED_WAIT, PRIORITY_BATCH, 0.2)
+    with pytest.raises(AdmissionRejected) as rejected:
+        scheduler.acquire(MODEL, PRIORITY_BATCH)
+    assert rejected.value.retry_after == 1
+    assert scheduler.metrics()["rejected"] == 1 and scheduler.metrics()["queue_depth"] == 0
+
+
+def test_overtaken_call_gives_up_with_429_at_its_priority_limit(scheduler, monkeypatch):
+    monkeypatch.setitem(requestScheduler.MAX_ESTIMATED_WAIT, PRIORITY_BATCH, 0.7)
+    interactive = overtake(scheduler)
+    with pytest.raises(AdmissionRejected):
+        scheduler.acquire(MODEL, PRIORITY_BATCH)
+    interactive.join()
+    metrics = scheduler.metrics()
+    assert metrics["timed_out"] == 1 and metrics["admitted"] == 2 and metrics["queue_depth"] == 0
+
+
+def test_overtaken_call_times_out_at_the_callers_deadline(scheduler):
+    interactive = overtake(scheduler)
+    with pytest.raises(TimeoutError):
+        scheduler.acquire(MODEL, PRIORITY_BATCH, max_wait=0.7)
+    interactive.join()
+    assert scheduler.metrics()["timed_out"] == 1 and scheduler.metrics()["queue_depth"] == 0
+
+
+def test_queued_call_is_admitted_once_a_token_refills(scheduler):
+    waited = scheduler.acquire(MODEL, PRIORITY_BATCH, max_wait=2)
+    assert 0.3 <= waited <= 1.0
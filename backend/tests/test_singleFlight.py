@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from singleFlight import SingleFlight
+
+
+def start(target):
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=2.0):
+    end = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < end, "condition never became true"
+        time.sleep(0.005)
+
+
+def test_concurrent_callers_share_one_call():
+    flight, release, calls, results = SingleFlight(), threading.Event(), [], []
+
+    def work():
+        calls.append(1)
+        release.wait(2)
+        return "rooms"
+
+    threads = [start(lambda: results.append(flight.do("plan", work))) for _ in range(5)]
+    wait_for(lambda: flight.metrics()["calls"] == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert results == ["rooms"] * 5 and len(calls) == 1
+    assert flight.metrics() == {"calls": 5, "executed": 1, "coalesced": 4, "waiter_timeouts": 0, "in_flight": 0}
+    # Finished keys are forgotten, so the next call runs again
+    assert flight.do("plan", lambda: "again") == "again"
+
+
+def test_waiters_reraise_the_leaders_error():
+    flight, release, errors = SingleFlight(), threading.Event(), []
+
+    def fail():
+        release.wait(2)
+        raise ValueError("model down")
+
+    def call():
+        try:
+            flight.do("plan", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [start(call) for _ in range(3)]
+    wait_for(lambda: flight.metrics()["calls"] == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3 and len({id(e) for e in errors}) == 1
+
+
+def test_waiter_times_out_while_the_leader_keeps_running():
+    flight, release, results = SingleFlight(), threading.Event(), []
+    leader = start(lambda: results.append(flight.do("plan", lambda: release.wait(2) and "rooms")))
+    wait_for(lambda: flight.metrics()["in_flight"] == 1)
+    with pytest.raises(TimeoutError):
+        flight.do("plan", lambda: "unused", timeout=0.05)
+    release.set()
+    leader.join()
+    assert results == ["rooms"] and flight.metrics()["waiter_timeouts"] == 1
@@ -0,0 +1,62 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+from wallRefinement import _otsu_threshold, binarize, refine_rooms, segment_rooms
+
+
+def plan():
+    """Two 300x200 rooms side by side, joined by a doorway, inside an outer wall."""
+    image = Image.new("L", (700, 300), 255)
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((50, 50, 650, 250), outline=0, width=6)
+    draw.line((350, 50, 350, 250), fill=0, width=6)
+    draw.rectangle((345, 140, 356, 155), fill=255)    # doorway, narrower than twice the door gap
+    return image
+
+
+def test_otsu_separates_ink_from_paper():
+    pixels = np.array([[20] * 10 + [230] * 30], dtype=np.uint8)
+    threshold = _otsu_threshold(pixels)
+    assert 20 <= threshold < 230
+    assert _otsu_threshold(np.full((4, 4), 128, dtype=np.uint8)) == -1
+    ink, scale = binarize(plan())
+    assert scale == 1.0 and ink[50, 100] and not ink[150, 200]
+
+
+def test_segmentation_keeps_rooms_apart_across_a_doorway():
+    segments = segment_rooms(plan())
+    assert len(segments) == 2
+    for segment in segments:
+        box = segment["bbox"]
+        # Free space between the 6px walls is about 292 x 189
+        assert abs(box["w"] - 292) <= 6 and abs(box["h"] - 189) <= 6
+    assert sorted(round(s["bbox"]["x"]) for s in segments) == [56, 354]
+
+
+def test_snapping_rescales_area_and_walls():
+    room = {
+        "id": 1, "shape_type": "rect", "calculated_area": 300.0,
+        "coords": {"x": 70, "y": 70, "w": 260, "h": 160},    # 20px inside every wall
+        "walls": [{"sequence_order": n, "length": length, "unit": "ft"} for n, length in enumerate((26, 16, 26, 16), 1)]
+    }
+    summary = refine_rooms(plan(), [room])
+    coords = room["coords"]
+    assert summary["snapped_rooms"] == 1 and room["geometry_refinement"]["snapped_edges"] == 4
+    assert abs(coords["x"] - 52) <= 3 and abs(coords["x"] + coords["w"] - 350) <= 3
+    assert abs(coords["y"] - 52) <= 3 and abs(coords["y"] + coords["h"] - 250) <= 3
+
+    area_scale = coords["w"] * coords["h"] / (260 * 160)
+    assert room["geometry_refinement"]["area_scale"] == round(area_scale, 3)
+    assert room["calculated_area"] == round(300.0 * area_scale, 1)
+    assert room["walls"][0]["length"] == round(26 * coords["w"] / 260, 2)
+    assert room["walls"][1]["length"] == round(16 * coords["h"] / 160, 2)
+
+
+def test_polygon_snapping_rescales_area():
+    room = {"id": 2, "shape_type": "polygon", "calculated_area": 100.0, "walls": [],
+            "points": [[370, 70], [630, 70], [630, 230], [370, 230]]}
+    refine_rooms(plan(), [room])
+    xs, ys = [p[0] for p in room["points"]], [p[1] for p in room["points"]]
+    area_scale = (max(xs) - min(xs)) * (max(ys) - min(ys)) / (260 * 160)
+    assert room["geometry_refinement"]["snapped_edges"] == 4
+    assert abs(room["calculated_area"] - 100.0 * area_scale) <= 0.1
@@ -14,6 +14,7 @@ import CategoryAnnotatedView from './components/views/CategoryAnnotatedView';
 import ComplianceReport from './components/views/ComplianceReport';
 import StepIndicator from './components/common/StepIndicator';
 import { useReportGeneration } from './hooks/useReportGeneration';
+import { complianceApi } from './services/complianceApi';
 
 const App = () => {
   const [uploadedFile, setUploadedFile] = useState(null);
@@ -114,6 +115,11 @@ const App = () => {
 
   const handleReviewComplete = (editedRooms) => {
     setHasViewedAnnotations(true);
+    // Accepted rooms feed the learned category mappings; the report does not wait for it
+    if (result && result.analysisId && result.analysisKey) {
+      complianceApi.correctRooms(result, editedRooms)
+        .catch((err) => console.error("Saving corrections failed:", err));
+    }
     generateReport(uploadedFile, editedRooms);
   };
 
@@ -16,6 +16,9 @@ const CATEGORY_COLORS = {
   [CAT_UNKNOWN]: "rgba(156, 163, 175, 0.6)"       // Grey
 };
 
+// Categories a user can pick for a room (CAT_UNKNOWN clears it)
+const ASSIGNABLE_CATEGORIES = [CAT_PFSA, CAT_NON_QUALIFIED, CAT_COMMON, CAT_SHARED];
+
 const CategoryAnnotatedView = ({ 
   theme, 
   blueprintImage, 
@@ -38,6 +41,14 @@ const CategoryAnnotatedView = ({
   const [selectedRoomIndex, setSelectedRoomIndex] = useState(null);
   const [highlightedCategory, setHighlightedCategory] = useState(null);
   const [collapsedCategories, setCollapsedCategories] = useState({});
+  // Rooms as the user accepts them; category changes are sent back as corrections
+  const [rooms, setRooms] = useState(roomsData || []);
+  const [categoriesEdited, setCategoriesEdited] = useState(false);
+
+  useEffect(() => {
+    setRooms(roomsData || []);
+    setCategoriesEdited(false);
+  }, [roomsData]);
 
   const sidebarRefs = useRef({}); 
 
@@ -64,15 +75,15 @@ const CategoryAnnotatedView = ({
       [CAT_UNKNOWN]: []
     };
     
-    if (roomsData) {
-      roomsData.forEach((room, index) => {
+    if (rooms) {
+      rooms.forEach((room, index) => {
         const cat = room.category || CAT_UNKNOWN;
         const targetGroup = grouped[cat] ? cat : CAT_UNKNOWN;
         grouped[targetGroup].push({ ...room, originalIndex: index });
       });
     }
     return grouped;
-  }, [roomsData]);
+  }, [rooms]);
 
   // --- Effects ---
   useEffect(() => {
@@ -101,8 +112,16 @@ const CategoryAnnotatedView = ({
     return CATEGORY_COLORS[category] || CATEGORY_COLORS[CAT_UNKNOWN];
   };
 
+  const handleCategoryChange = (index, category) => {
+    setRooms(prev => prev.map((room, i) => (i === index ? { ...room, category: category || null } : room)));
+    setCategoriesEdited(true);
+  };
+
   const getCategoryTotal = (cat) => {
-    if (!categorySummary || !categorySummary.totals_sq_ft) return 0;
+    // Once the user re-categorizes a room the server's summary is stale; total the rooms instead
+    if (categoriesEdited || !categorySummary || !categorySummary.totals_sq_ft) {
+      return rooms.filter(room => room.category === cat).reduce((sum, room) => sum + (room.calculated_area || 0), 0);
+    }
     return categorySummary.totals_sq_ft[cat] || 0;
   };
 
@@ -177,8 +196,8 @@ const CategoryAnnotatedView = ({
 
         {/* Room List */}
         <div className="flex-1 overflow-y-auto p-4 space-y-4">
-          {Object.entries(roomsByCategory).map(([category, rooms]) => {
-             if (rooms.length === 0) return null;
+          {Object.entries(roomsByCategory).map(([category, categoryRooms]) => {
+             if (categoryRooms.length === 0) return null;
              const isCollapsed = collapsedCategories[category];
 
              return (
@@ -190,13 +209,13 @@ const CategoryAnnotatedView = ({
                     <div className="flex items-center gap-2">
                       {isCollapsed ? <ChevronRight size={16} /> : <ChevronDown size={16} />}
                       <span className="font-semibold text-sm text-gray-700">{category}</span>
-                      <span className="text-xs bg-gray-200 px-2 py-0.5 rounded-full text-gray-600">{rooms.length}</span>
+                      <span className="text-xs bg-gray-200 px-2 py-0.5 rounded-full text-gray-600">{categoryRooms.length}</span>
                     </div>
                  </div>
 
                  {!isCollapsed && (
                    <div className="divide-y divide-gray-100">
-                     {rooms.map((room) => {
+                     {categoryRooms.map((room) => {
                        const idx = room.originalIndex;
                        const isSelected = selectedRoomIndex === idx;
                        const roomColor = getCategoryColor(room.category);
@@ -218,6 +237,18 @@ const CategoryAnnotatedView = ({
                                 {room.calculated_area?.toLocaleString()} ft²
                               </span>
                             </div>
+
+                            <select
+                              value={room.category || ""}
+                              onClick={(e) => e.stopPropagation()}
+                              onChange={(e) => handleCategoryChange(idx, e.target.value)}
+                              className="w-full text-xs border border-gray-200 rounded px-1 py-0.5 mb-1 text-gray-700 bg-white"
+                            >
+                              <option value="">{CAT_UNKNOWN}</option>
+                              {ASSIGNABLE_CATEGORIES.map(cat => (
+                                <option key={cat} value={cat}>{cat}</option>
+                              ))}
+                            </select>
                             
                             {room.walls && (
                               <div className="grid grid-cols-3 gap-1 mt-2">
@@ -240,7 +271,7 @@ const CategoryAnnotatedView = ({
         </div>
 
         <div className="p-4 border-t border-gray-200 bg-gray-50">
-          <button className={`w-full py-3 rounded font-semibold shadow-sm ${theme.primaryButton} ${theme.primaryButtonText}`} onClick={onNext}>
+          <button className={`w-full py-3 rounded font-semibold shadow-sm ${theme.primaryButton} ${theme.primaryButtonText}`} onClick={() => onNext(rooms)}>
             Generate Final Report →
           </button>
         </div>
@@ -297,7 +328,7 @@ const CategoryAnnotatedView = ({
             style={{ display: 'block', maxWidth: '100%', maxHeight: '90vh', pointerEvents: 'none', filter: highlightedCategory ? 'grayscale(50%)' : 'none', transition: 'filter 0.3s' }} 
           />
           
-          {roomsData && (
+          {rooms && (
             <svg 
               viewBox={`0 0 ${referenceWidth} ${referenceHeight}`}
               preserveAspectRatio="none"
@@ -306,7 +337,7 @@ const CategoryAnnotatedView = ({
               <g transform={`translate(${viewTransform.x}, ${viewTransform.y}) scale(${viewTransform.scale})`}>
                 
                 {/* 1. DRAW SHAPES */}
-                {roomsData.map((room, idx) => {
+                {rooms.map((room, idx) => {
                   const geometry = getRoomGeometry(room);
                   if (!geometry) return null;
                   
@@ -344,7 +375,7 @@ const CategoryAnnotatedView = ({
                 })}
 
                 {/* 2. DRAW TEXT */}
-                {roomsData.map((room, idx) => {
+                {rooms.map((room, idx) => {
                   const geometry = getRoomGeometry(room);
                   if (!geometry) return null;
 
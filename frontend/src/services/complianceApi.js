@@ -134,6 +134,40 @@ export const complianceApi = {
     return response.json();
   },
 
+  /**
+   * Saves the rooms the user accepted, including changed categories
+   * @param {Object} analysis - analysisId, analysisKey and version from the analysis response
+   * @param {Array} rooms - The rooms as accepted in the review step
+   */
+  correctRooms: async (analysis, rooms) => {
+    const response = await fetch(`${API_BASE_URL}/correctRooms`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        // Issued with the analysis; lets this browser edit it without an admin token
+        'X-Analysis-Key': analysis.analysisKey
+      },
+      body: JSON.stringify({
+        analysisId: analysis.analysisId,
+        version: analysis.version,
+        rooms
+      }),
+    });
+
+    if (!response.ok) {
+      let errorMessage = `Could not save room corrections: ${response.statusText}`;
+      try {
+        const errorData = await response.json();
+        errorMessage = errorData.error || errorMessage;
+      } catch (e) {
+        // Response wasn't JSON
+      }
+      throw new Error(errorMessage);
+    }
+
+    return response.json();
+  },
+
   generateReport: async (file) => {
     // 1. Create a FormData object
     // This effectively builds a virtual form <form>...</form> in memory